@@ -2,30 +2,65 @@
 Pluggable agents for the orchestrator.
 Each agent is an async function: (Task, context: str) -> response: str
 
+LLM agents also expose `agent.stream(task, context)`, an async iterator of
+text chunks, so the orchestrator can write the reply while it is generated.
+
 Add your own agents by following this pattern.
 """
 
+import contextlib
 import httpx
 import json
 import os
-import shutil
-import subprocess
-import tempfile
 import logging
 from typing import Optional
 
+from cli_runner import CliRunner, CliTimeout, find_claude_cli
+from cli_pool import CliPool, CliPoolError
+from rate_limit import AdaptiveLimiter, RateLimited, parse_rate_limit_headers
+from prompt_cache import TokenUsage, message_content, system_blocks
+
 log = logging.getLogger("agents")
 
 
+def _slot(limiter: Optional[AdaptiveLimiter]):
+    """The limiter's concurrency slot, or nothing if the agent is unlimited."""
+    return limiter.slot() if limiter else contextlib.nullcontext()
+
+
+def _check_response(resp: httpx.Response, limiter: Optional[AdaptiveLimiter], provider: str):
+    """raise_for_status, turning 429/529 into RateLimited and feeding headers to the limiter."""
+    info = parse_rate_limit_headers(resp.headers)
+    if limiter:
+        limiter.observe(info)
+    if resp.status_code in (429, 529):
+        raise RateLimited(f"{provider} rate limited ({resp.status_code})", info.retry_after)
+    resp.raise_for_status()
+
+
+def _cli_rate_limited(output: str) -> bool:
+    text = output.lower()
+    return any(s in text for s in ("rate limit", "usage limit", "overloaded", " 429"))
+
+
 # ── CLAUDE AGENT ─────────────────────────────────────────
 
 def make_claude_agent(
     api_key: str,
     model: str = "claude-sonnet-4-20250514",
     system_prompt: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+    prompt_cache: bool = True,
+    usage: Optional[TokenUsage] = None,
 ):
     """
     Factory: creates an agent backed by Claude API.
+    Pass a long-lived `client` (see http_pool.HttpPool) to reuse connections,
+    and a shared `limiter` (see rate_limit.ProviderLimits) to adapt to 429s.
+    With `prompt_cache` the system prompt and the stable part of a
+    PromptContext are marked as cache breakpoints; token counts, including
+    cache reads and writes, are added to `usage`.
     
     Usage:
         agents.register("default", make_claude_agent(
@@ -42,126 +77,214 @@ def make_claude_agent(
         "Формат: plain text, без markdown заголовков. Кратко и по делу."
     )
 
-    async def agent(task, context: str) -> str:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": api_key,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-                json={
-                    "model": model,
-                    "max_tokens": 1024,
-                    "system": system_prompt or default_system,
-                    "messages": [
-                        {"role": "user", "content": context}
-                    ],
-                },
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            # Extract text from response
-            return data["content"][0]["text"]
+    url = "https://api.anthropic.com/v1/messages"
+    headers = {
+        "x-api-key": api_key,
+        "anthropic-version": "2023-06-01",
+        "content-type": "application/json",
+    }
+
+    def body(context: str, stream: bool = False) -> dict:
+        return {
+            "model": model,
+            "max_tokens": 1024,
+            "system": system_blocks(system_prompt or default_system, prompt_cache),
+            "messages": [
+                {"role": "user", "content": message_content(context, prompt_cache)}
+            ],
+            "stream": stream,
+        }
+
+    def record_usage(counts: dict):
+        log.debug("claude usage: %s", counts)
+        if usage is not None:
+            usage.record(model, counts)
+
+    async def call(http: httpx.AsyncClient, context: str) -> str:
+        async with _slot(limiter):
+            resp = await http.post(url, headers=headers, json=body(context))
+            _check_response(resp, limiter, "anthropic")
+        data = resp.json()
+        record_usage(data.get("usage", {}))
+        # Extract text from response
+        return data["content"][0]["text"]
+
+    async def stream_call(http: httpx.AsyncClient, context: str):
+        # Server-sent events; text arrives in content_block_delta events
+        async with _slot(limiter), http.stream(
+            "POST", url, headers=headers, json=body(context, stream=True),
+        ) as resp:
+            _check_response(resp, limiter, "anthropic")
+            counts = {}
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if event["type"] == "content_block_delta" and event["delta"]["type"] == "text_delta":
+                    yield event["delta"]["text"]
+                elif event["type"] in ("message_start", "message_delta"):
+                    # input and cache counts come first, output_tokens at the end
+                    counts.update(event.get("message", event).get("usage") or {})
+                elif event["type"] == "message_stop":
+                    record_usage(counts)
+                elif event["type"] == "error":
+                    error = event["error"]
+                    if error.get("type") in ("rate_limit_error", "overloaded_error"):
+                        raise RateLimited(f"anthropic: {error.get('message')}")
+                    raise RuntimeError(f"Claude stream error: {error.get('message')}")
 
+    async def agent(task, context: str) -> str:
+        if client is not None:
+            return await call(client, context)
+        async with httpx.AsyncClient(timeout=60.0) as http:
+            return await call(http, context)
+
+    async def stream(task, context: str):
+        if client is not None:
+            async for chunk in stream_call(client, context):
+                yield chunk
+            return
+        async with httpx.AsyncClient(timeout=60.0) as http:
+            async for chunk in stream_call(http, context):
+                yield chunk
+
+    agent.provider = "anthropic"
+    agent.model = model
+    agent.system_prompt = system_prompt or default_system
+    agent.stream = stream
     return agent
 
 
 # ── CLAUDE HEADLESS AGENT (claude -p CLI) ────────────────
 
-def _find_claude_cli() -> str:
-    path = shutil.which("claude")
-    if path:
-        return path
-    for candidate in [
-        os.path.expanduser("~/.nvm/versions/node/v23.11.0/bin/claude"),
-        "/usr/local/bin/claude",
-        "/usr/bin/claude",
-    ]:
-        if os.path.isfile(candidate):
-            return candidate
-    return "claude"
-
+HEADLESS_SYSTEM_PROMPT = (
+    "Ты агент-исполнитель в системе управления задачами. "
+    "Тебе приходит задача с контекстом. "
+    "Действуй конкретно: либо выполни задачу и покажи результат, "
+    "либо задай уточняющий вопрос (максимум один). "
+    "Формат: plain text, без markdown заголовков. Кратко и по делу."
+)
 
 def make_claude_headless_agent(
     model: str = "claude-sonnet-4-20250514",
     system_prompt: Optional[str] = None,
     timeout: int = 120,
     max_retries: int = 2,
+    runner: Optional[CliRunner] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
 ):
     """
     Factory: agent that calls `claude -p` CLI (headless mode).
     No API key needed — uses Claude Code's own auth.
+    Runs without blocking the event loop; pass a shared `runner` to cap
+    how many CLI processes all agents start at once.
     """
 
-    claude_bin = _find_claude_cli()
-
-    default_system = (
-        "Ты агент-исполнитель в системе управления задачами. "
-        "Тебе приходит задача с контекстом. "
-        "Действуй конкретно: либо выполни задачу и покажи результат, "
-        "либо задай уточняющий вопрос (максимум один). "
-        "Формат: plain text, без markdown заголовков. Кратко и по делу."
-    )
+    claude_bin = find_claude_cli()
+    runner = runner or CliRunner()
 
     async def agent(task, context: str) -> str:
-        prompt = context
-        sys_prompt = system_prompt or default_system
-
-        with tempfile.NamedTemporaryFile(
-            mode="w", suffix=".txt", delete=False, encoding="utf-8"
-        ) as f:
-            f.write(prompt)
-            prompt_file = f.name
-
-        try:
-            # Remove CLAUDECODE env var to allow nested invocation
-            env = {k: v for k, v in os.environ.items() if k != "CLAUDECODE"}
-
-            cmd = [
-                claude_bin, "-p",
-                "--model", model,
-                "--output-format", "text",
-                "--no-session-persistence",
-                "--system-prompt", sys_prompt,
-            ]
-
-            for attempt in range(max_retries):
-                try:
-                    result = subprocess.run(
-                        cmd,
-                        stdin=open(prompt_file, "r", encoding="utf-8"),
-                        capture_output=True,
-                        text=True,
-                        timeout=timeout,
-                        env=env,
-                    )
-                except subprocess.TimeoutExpired:
-                    log.warning("Claude CLI timeout (%ds), attempt %d/%d", timeout, attempt + 1, max_retries)
-                    if attempt < max_retries - 1:
-                        continue
-                    return f"[ОШИБКА] Таймаут CLI ({timeout}с)"
-
-                stdout = result.stdout.strip()
-                stderr = result.stderr.strip()
-                output = stdout or stderr
-
-                if result.returncode != 0:
-                    log.warning("Claude CLI error (exit %d): %s", result.returncode, output[:300])
-                    if attempt < max_retries - 1:
-                        continue
-                    raise RuntimeError(f"CLI exit {result.returncode}: {output[:200]}")
-
-                if not output:
-                    raise RuntimeError("Пустой ответ от CLI")
-
-                return output
-
-            return "[ОШИБКА] Все попытки исчерпаны"
-        finally:
-            os.unlink(prompt_file)
+        sys_prompt = system_prompt or HEADLESS_SYSTEM_PROMPT
+
+        # Remove CLAUDECODE env var to allow nested invocation
+        env = {k: v for k, v in os.environ.items() if k != "CLAUDECODE"}
+
+        cmd = [
+            claude_bin, "-p",
+            "--model", model,
+            "--output-format", "text",
+            "--no-session-persistence",
+            "--system-prompt", sys_prompt,
+        ]
+
+        for attempt in range(max_retries):
+            try:
+                async with _slot(limiter):
+                    result = await runner.run(cmd, input=context, timeout=timeout, env=env)
+                    if result.returncode != 0 and _cli_rate_limited(result.stdout + result.stderr):
+                        raise RateLimited(f"claude CLI: {(result.stderr or result.stdout).strip()[:200]}")
+            except CliTimeout:
+                log.warning("Claude CLI timeout (%ds), attempt %d/%d", timeout, attempt + 1, max_retries)
+                if attempt < max_retries - 1:
+                    continue
+                return f"[ОШИБКА] Таймаут CLI ({timeout}с)"
+
+            stdout = result.stdout.strip()
+            stderr = result.stderr.strip()
+            output = stdout or stderr
+
+            if result.returncode != 0:
+                log.warning("Claude CLI error (exit %d): %s", result.returncode, output[:300])
+                if attempt < max_retries - 1:
+                    continue
+                raise RuntimeError(f"CLI exit {result.returncode}: {output[:200]}")
+
+            if not output:
+                raise RuntimeError("Пустой ответ от CLI")
+
+            return output
+
+        return "[ОШИБКА] Все попытки исчерпаны"
+
+    agent.provider = "claude-cli"
+    agent.model = model
+    agent.system_prompt = system_prompt or HEADLESS_SYSTEM_PROMPT
+    return agent
+
+
+def make_claude_pool_agent(
+    pool: CliPool,
+    timeout: int = 120,
+    max_retries: int = 2,
+    limiter: Optional[AdaptiveLimiter] = None,
+):
+    """
+    Factory: headless agent served by a warm CliPool instead of a fresh
+    `claude -p` per call. Model and system prompt are set on the pool.
+
+    Usage:
+        pool = CliPool(model="claude-sonnet-4-20250514",
+                       system_prompt=HEADLESS_SYSTEM_PROMPT, size=2)
+        agents.register("default", make_claude_pool_agent(pool))
+    """
 
+    async def agent(task, context: str) -> str:
+        for attempt in range(max_retries):
+            try:
+                async with _slot(limiter):
+                    try:
+                        output = (await pool.call(context, timeout=timeout)).strip()
+                    except CliPoolError as e:
+                        if _cli_rate_limited(str(e)):
+                            raise RateLimited(f"claude CLI: {e}") from e
+                        raise
+            except CliTimeout:
+                log.warning("Claude CLI timeout (%ds), attempt %d/%d", timeout, attempt + 1, max_retries)
+                if attempt < max_retries - 1:
+                    continue
+                return f"[ОШИБКА] Таймаут CLI ({timeout}с)"
+            except CliPoolError as e:
+                log.warning("Claude CLI worker error: %s", e)
+                if attempt < max_retries - 1:
+                    continue
+                raise
+
+            if not output:
+                raise RuntimeError("Пустой ответ от CLI")
+            return output
+
+        return "[ОШИБКА] Все попытки исчерпаны"
+
+    async def stream(task, context: str):
+        # No retries: chunks may already be on screen when a worker fails
+        async with _slot(limiter):
+            async for chunk in pool.stream(context, timeout=timeout):
+                yield chunk
+
+    agent.provider = "claude-cli"
+    agent.model = pool.model
+    agent.system_prompt = pool.system_prompt or ""
+    agent.stream = stream
     return agent
 
 
@@ -172,41 +295,81 @@ def make_yandexgpt_agent(
     folder_id: str,
     model: str = "yandexgpt-lite",
     system_prompt: Optional[str] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
 ):
     """
     Factory: agent backed by YandexGPT API.
     Useful for Russian-market tasks where latency to Yandex is lower.
+    Pass a long-lived `client` (see http_pool.HttpPool) to reuse connections,
+    and a shared `limiter` (see rate_limit.ProviderLimits) to adapt to quotas.
     """
 
     default_system = (
         "Ты агент-исполнитель. Выполняй задачи конкретно и кратко."
     )
 
-    async def agent(task, context: str) -> str:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(
-                "https://llm.api.cloud.yandex.net/foundationModels/v1/completion",
-                headers={
-                    "Authorization": f"Api-Key {api_key}",
-                    "Content-Type": "application/json",
-                },
-                json={
-                    "modelUri": f"gpt://{folder_id}/{model}",
-                    "completionOptions": {
-                        "stream": False,
-                        "temperature": 0.3,
-                        "maxTokens": 1024,
-                    },
-                    "messages": [
-                        {"role": "system", "text": system_prompt or default_system},
-                        {"role": "user", "text": context},
-                    ],
-                },
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            return data["result"]["alternatives"][0]["message"]["text"]
+    url = "https://llm.api.cloud.yandex.net/foundationModels/v1/completion"
+    headers = {
+        "Authorization": f"Api-Key {api_key}",
+        "Content-Type": "application/json",
+    }
+
+    def body(context: str, stream: bool = False) -> dict:
+        return {
+            "modelUri": f"gpt://{folder_id}/{model}",
+            "completionOptions": {
+                "stream": stream,
+                "temperature": 0.3,
+                "maxTokens": 1024,
+            },
+            "messages": [
+                {"role": "system", "text": system_prompt or default_system},
+                {"role": "user", "text": context},
+            ],
+        }
+
+    async def call(http: httpx.AsyncClient, context: str) -> str:
+        async with _slot(limiter):
+            resp = await http.post(url, headers=headers, json=body(context))
+            _check_response(resp, limiter, "yandex")
+        data = resp.json()
+        return data["result"]["alternatives"][0]["message"]["text"]
+
+    async def stream_call(http: httpx.AsyncClient, context: str):
+        # One JSON object per line, each carrying the full text so far
+        sent = 0
+        async with _slot(limiter), http.stream(
+            "POST", url, headers=headers, json=body(context, stream=True),
+        ) as resp:
+            _check_response(resp, limiter, "yandex")
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                text = json.loads(line)["result"]["alternatives"][0]["message"]["text"]
+                if len(text) > sent:
+                    yield text[sent:]
+                    sent = len(text)
 
+    async def agent(task, context: str) -> str:
+        if client is not None:
+            return await call(client, context)
+        async with httpx.AsyncClient(timeout=60.0) as http:
+            return await call(http, context)
+
+    async def stream(task, context: str):
+        if client is not None:
+            async for chunk in stream_call(client, context):
+                yield chunk
+            return
+        async with httpx.AsyncClient(timeout=60.0) as http:
+            async for chunk in stream_call(http, context):
+                yield chunk
+
+    agent.provider = "yandex"
+    agent.model = model
+    agent.system_prompt = system_prompt or default_system
+    agent.stream = stream
     return agent
 
 
@@ -236,14 +399,25 @@ def make_routing_agent(routes: dict):
         }))
     """
 
-    async def agent(task, context: str) -> str:
+    def pick(task):
         name_lower = task.item.name.lower()
         for keyword, sub_agent in routes.items():
             if keyword in name_lower:
-                return await sub_agent(task, context)
+                return sub_agent
 
         # Fallback: use first available
-        first = next(iter(routes.values()))
-        return await first(task, context)
+        return next(iter(routes.values()))
+
+    async def agent(task, context: str) -> str:
+        return await pick(task)(task, context)
+
+    async def stream(task, context: str):
+        sub_agent = pick(task)
+        if getattr(sub_agent, "stream", None):
+            async for chunk in sub_agent.stream(task, context):
+                yield chunk
+        else:
+            yield await sub_agent(task, context)
 
+    agent.stream = stream
     return agent
@@ -0,0 +1,216 @@
+"""
+Message Batches mode for GREEN tasks.
+
+GREEN tasks are done without a human in the loop, so nobody waits for
+them within the tick. Instead of one Messages call per task, they are
+collected across ticks and submitted as a single Anthropic Message Batch
+(half the token price, results usually within the hour). Every tick the
+open batches are polled; finished results go back to the orchestrator,
+which writes them through the normal GREEN path.
+
+Submitted batches and their task ids live in the state store, so a
+restart resumes polling instead of submitting the same tasks again.
+
+Usage:
+    batches = MessageBatchClient(api_key, client=http.client("anthropic"))
+    batcher = GreenBatcher(batches, store, model="claude-sonnet-4-20250514")
+    batcher.collect(task_id, context)
+    await batcher.submit_due()
+    for result in await batcher.poll():
+        ...
+        batcher.finish(result.task_id)
+"""
+
+import json
+import logging
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+from prompt_cache import system_blocks
+from state_store import StateStore
+
+log = logging.getLogger("batch_api")
+
+API_URL = "https://api.anthropic.com/v1"
+CUSTOM_ID = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
+
+
+class MessageBatchClient:
+    """Thin client for /v1/messages/batches."""
+
+    def __init__(self, api_key: str, base_url: str = API_URL, client: Optional[httpx.AsyncClient] = None):
+        self.base_url = base_url.rstrip("/")
+        self.client = client
+        self.headers = {
+            "x-api-key": api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json",
+        }
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if self.client is not None:
+            resp = await self.client.request(method, url, headers=self.headers, **kwargs)
+        else:
+            async with httpx.AsyncClient(timeout=60.0) as http:
+                resp = await http.request(method, url, headers=self.headers, **kwargs)
+        resp.raise_for_status()
+        return resp
+
+    async def create(self, requests: list[dict]) -> dict:
+        """Submit [{"custom_id", "params"}, ...]; returns the batch object."""
+        resp = await self._request("POST", f"{self.base_url}/messages/batches", json={"requests": requests})
+        return resp.json()
+
+    async def retrieve(self, batch_id: str) -> dict:
+        resp = await self._request("GET", f"{self.base_url}/messages/batches/{batch_id}")
+        return resp.json()
+
+    async def results(self, batch: dict) -> list[dict]:
+        """Result lines of an ended batch: [{"custom_id", "result"}, ...]."""
+        url = batch.get("results_url") or f"{self.base_url}/messages/batches/{batch['id']}/results"
+        resp = await self._request("GET", url)
+        return [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one task in an ended batch: a response or an error."""
+    task_id: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+
+
+def _result_of(task_id: str, line: Optional[dict]) -> BatchResult:
+    if line is None:
+        return BatchResult(task_id, error="missing from batch results")
+    result = line.get("result", {})
+    kind = result.get("type")
+    if kind == "succeeded":
+        blocks = result.get("message", {}).get("content", [])
+        text = "".join(b.get("text", "") for b in blocks if b.get("type") == "text")
+        if text.strip():
+            return BatchResult(task_id, response=text)
+        return BatchResult(task_id, error="empty response")
+    if kind == "errored":
+        error = result.get("error", {})
+        error = error.get("error", error)
+        return BatchResult(task_id, error=f"{error.get('type', 'error')}: {error.get('message', '')}")
+    return BatchResult(task_id, error=kind or "unknown result")
+
+
+class GreenBatcher:
+    """
+    Collects task contexts and submits them as one batch once there are
+    `min_size` of them or the oldest has waited `max_wait` seconds.
+    """
+
+    def __init__(
+        self,
+        client: MessageBatchClient,
+        store: StateStore,
+        model: str = "claude-sonnet-4-20250514",
+        system_prompt: Optional[str] = None,
+        max_tokens: int = 1024,
+        min_size: int = 10,
+        max_wait: float = 1800,
+    ):
+        self.client = client
+        self.store = store
+        self.model = model
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.min_size = min_size
+        self.max_wait = max_wait
+        self.stats: Counter = Counter()
+        self._collected: dict[str, tuple[float, str]] = {}   # task_id → (collected_at, context)
+        self._submitted: set[str] = set(store.batch_tasks())
+        if self._submitted:
+            log.info("Resuming %d open batches (%d tasks)", len(store.open_batches()), len(self._submitted))
+
+    def owns(self, task_id: str) -> bool:
+        """The task is waiting for a batch or is in one."""
+        return task_id in self._collected or task_id in self._submitted
+
+    def collect(self, task_id: str, context: str) -> bool:
+        if self.owns(task_id):
+            return False
+        if not CUSTOM_ID.match(task_id):
+            log.warning("Task id %r can't be a batch custom_id", task_id)
+            return False
+        self._collected[task_id] = (time.time(), context)
+        return True
+
+    def due(self) -> bool:
+        if not self._collected:
+            return False
+        oldest = min(at for at, _ in self._collected.values())
+        return len(self._collected) >= self.min_size or time.time() - oldest >= self.max_wait
+
+    def _params(self, context: str) -> dict:
+        params = {
+            "model": self.model,
+            "max_tokens": self.max_tokens,
+            "messages": [{"role": "user", "content": context}],
+        }
+        if self.system_prompt:
+            params["system"] = system_blocks(self.system_prompt)
+        return params
+
+    async def submit_due(self) -> Optional[str]:
+        """Submit the collected tasks if due; returns the batch id."""
+        if not self.due():
+            return None
+        task_ids = list(self._collected)
+        requests = [
+            {"custom_id": tid, "params": self._params(self._collected[tid][1])}
+            for tid in task_ids
+        ]
+        try:
+            batch = await self.client.create(requests)
+        except httpx.HTTPError as e:
+            # keep them collected; the next tick tries again
+            log.error("Batch submit failed (%d tasks): %s", len(task_ids), e)
+            self.stats["submit_errors"] += 1
+            return None
+        self.store.add_batch(batch["id"], task_ids)
+        self._submitted.update(task_ids)
+        for tid in task_ids:
+            del self._collected[tid]
+        self.stats["batches"] += 1
+        self.stats["submitted"] += len(task_ids)
+        log.info("Submitted batch %s with %d GREEN tasks", batch["id"], len(task_ids))
+        return batch["id"]
+
+    async def poll(self) -> list[BatchResult]:
+        """Results of every open batch that has ended, for tasks not yet finished."""
+        results = []
+        for batch_id in self.store.open_batches():
+            try:
+                batch = await self.client.retrieve(batch_id)
+                if batch.get("processing_status") != "ended":
+                    continue
+                lines = {line.get("custom_id"): line for line in await self.client.results(batch)}
+            except httpx.HTTPError as e:
+                log.warning("Polling batch %s failed: %s", batch_id, e)
+                continue
+            for tid in self.store.batch_tasks(batch_id):
+                results.append(_result_of(tid, lines.get(tid)))
+        self.stats["results"] += len(results)
+        return results
+
+    def finish(self, task_id: str):
+        """The task's result has been handled (written back or deferred)."""
+        self._submitted.discard(task_id)
+        self.store.finish_batch_item(task_id)
+
+    def snapshot(self) -> dict:
+        return {
+            "collected": len(self._collected),
+            "in_flight": len(self._submitted),
+            **self.stats,
+        }
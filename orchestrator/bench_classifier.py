@@ -0,0 +1,130 @@
+"""
+Benchmark: per-task substring loops vs the compiled TaskClassifier.
+
+Classifies synthetic task names and notes with the previous
+implementation (one `in` check per rule, status and assignee tag, text
+lowered twice) and with TaskClassifier, prints wall time and fails if any
+engine's result differs from the loop's, on the synthetic tasks and on
+overlapping keywords, competing tags and config overrides.
+
+Usage:
+    python bench_classifier.py
+    python bench_classifier.py --tasks 100000 --seed 1
+
+With pyahocorasick installed both engines are measured.
+"""
+
+import argparse
+import random
+import time
+from typing import Optional
+
+from keyword_matcher import AHOCORASICK_AVAILABLE
+from orchestrator import AUTONOMY_RULES, Autonomy, Classification, TaskClassifier
+
+WORDS = (
+    "добавить сделать проверить обновить отчёт клиент данные onboarding flow "
+    "лендинг письмо встреча бюджет план api backend frontend"
+).split()
+TAGS = ["#agent", "#dev-agent", "#human", "#status:backlog", "#status:review", "#automate", "#decide"]
+
+
+def legacy_classify(
+    name: str, note: Optional[str], rules: dict[str, Autonomy] = AUTONOMY_RULES
+) -> Classification:
+    """The previous Task.from_item + classify_autonomy, kept as a baseline."""
+    text = f"{name.lower()} {(note or '').lower()}"
+    status = "backlog"
+    for s in ["backlog", "in-progress", "review", "done", "blocked"]:
+        if f"#status:{s}" in text or f"#{s}" in text:
+            status = s
+            break
+    assignee = "unassigned"
+    if "#agent" in text or "#dev-agent" in text:
+        assignee = "agent"
+    elif "#human" in text:
+        assignee = "human"
+    autonomy = Autonomy.YELLOW
+    rules_text = f"{name} {note or ''}".lower()
+    for keyword, level in rules.items():
+        if keyword in rules_text:
+            autonomy = level
+            break
+    return Classification(autonomy, status, assignee)
+
+
+# Overlapping keywords, a tag against a keyword, competing status and
+# assignee tags, text that only matches across the name/note boundary
+EDGE_CASES = [
+    ("Рефакторинг и деплой", None),
+    ("Деплой после рефакторинга", None),
+    ("Ревью кода #automate", None),
+    ("#decide: тесты", "#automate"),
+    ("Статус по оплате", None),
+    ("#status:review #backlog", "#human #agent"),
+    ("#review-ready #in-progress", None),
+    ("#dev-agent #done", "#status:blocked"),
+    ("Просто задача", None),
+    ("ДЕПЛОЙ", "КОД"),
+    ("сбор", "информации"),
+    ("", None),
+]
+OVERRIDES = {"ревью кода": "yellow", "деплой": "green", "статус": None, "#automate": None}
+
+
+def check_equivalence(overrides: dict, tasks: list[tuple[str, Optional[str]]], automaton: bool):
+    classifier = TaskClassifier(overrides=overrides, automaton=automaton)
+    for name, note in tasks:
+        expected = legacy_classify(name, note, classifier.rules)
+        got = classifier.classify(name, note)
+        assert got == expected, f"{classifier.engine}: {name!r}/{note!r}: {got} != {expected}"
+
+
+def synthetic_tasks(count: int, rng: random.Random) -> list[tuple[str, Optional[str]]]:
+    keywords = [k for k in AUTONOMY_RULES if not k.startswith("#")]
+    tasks = []
+    for _ in range(count):
+        words = rng.choices(WORDS, k=rng.randint(3, 10))
+        words += rng.sample(keywords, k=rng.choice([0, 0, 1, 1, 2]))
+        words += rng.sample(TAGS, k=rng.randint(0, 3))
+        rng.shuffle(words)
+        note = " ".join(rng.choices(WORDS, k=rng.randint(5, 30))) if rng.random() < 0.4 else None
+        tasks.append((" ".join(words).capitalize(), note))
+    return tasks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Autonomy classifier benchmark")
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tasks = synthetic_tasks(args.tasks, random.Random(args.seed))
+    strategies = {"baseline": legacy_classify}
+    for automaton in ((True, False) if AHOCORASICK_AVAILABLE else (False,)):
+        t0 = time.perf_counter()
+        classifier = TaskClassifier(automaton=automaton)
+        build = time.perf_counter() - t0
+        print(f"{classifier.engine}: built in {build * 1000:.1f}ms")
+        strategies[f"classifier/{classifier.engine}"] = classifier.classify
+
+    print(f"{args.tasks} tasks")
+    print(f"{'strategy':<24} {'wall, s':>8} {'µs/task':>8}")
+    results = {}
+    for label, classify in strategies.items():
+        t0 = time.perf_counter()
+        results[label] = [classify(name, note) for name, note in tasks]
+        elapsed = time.perf_counter() - t0
+        print(f"{label:<24} {elapsed:>8.2f} {elapsed / args.tasks * 1e6:>8.2f}")
+
+    for label, result in list(results.items())[1:]:
+        differ = sum(old != new for old, new in zip(results["baseline"], result))
+        assert not differ, f"{label} disagrees with the baseline on {differ} tasks"
+    for automaton in ((True, False) if AHOCORASICK_AVAILABLE else (False,)):
+        check_equivalence({}, EDGE_CASES, automaton)
+        check_equivalence(OVERRIDES, EDGE_CASES + tasks[:1000], automaton)
+    print("results identical to the baseline")
+
+
+if __name__ == "__main__":
+    main()
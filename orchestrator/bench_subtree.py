@@ -0,0 +1,79 @@
+"""
+Benchmark: serial vs breadth-first concurrent WorkFlowyClient.get_subtree.
+
+Runs against a local FakeWorkFlowy server with simulated latency and prints
+request count and wall time per tree shape.
+
+Usage:
+    python bench_subtree.py
+    python bench_subtree.py --latency 0.05 --depth 5 --concurrency 1 8 32
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Optional
+
+from fake_workflowy import FakeWorkFlowy
+from rate_limit import TokenBucket
+from workflowy_client import WorkFlowyClient, WFItem
+
+
+SHAPES: dict[str, list[int]] = {
+    "wide (200×1)": [200, 1],
+    "backlog (200×3×2)": [200, 3, 2],
+    "bushy (20×4×4×3)": [20, 4, 4, 3],
+    "deep (5×2×2×2×2)": [5, 2, 2, 2, 2],
+}
+
+
+async def serial_subtree(wf: WorkFlowyClient, item_id: Optional[str], depth: int) -> list[WFItem]:
+    """The previous one-child-at-a-time recursion, kept as a baseline."""
+    children = await wf.list_children(item_id)
+    if depth > 1:
+        for child in children:
+            child.children = await serial_subtree(wf, child.id, depth - 1)
+    return children
+
+
+def count_nodes(items: list[WFItem]) -> int:
+    return sum(1 + count_nodes(i.children) for i in items)
+
+
+async def measure(fake: FakeWorkFlowy, root: str, depth: int, concurrency: Optional[int], rate: Optional[float]):
+    budget = TokenBucket(rate) if rate else None
+    async with WorkFlowyClient(
+        "bench", base_url=fake.base_url, max_concurrency=concurrency or 1, budget=budget,
+    ) as wf:
+        t0 = time.perf_counter()
+        if concurrency is None:
+            tree = await serial_subtree(wf, root, depth)
+        else:
+            tree = await wf.get_subtree(root, depth=depth)
+        elapsed = time.perf_counter() - t0
+        return count_nodes(tree), wf.request_count, elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="get_subtree benchmark")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated latency per request, s")
+    parser.add_argument("--depth", type=int, default=5, help="get_subtree depth")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rate", type=float, default=None, help="Per-host budget, req/s")
+    args = parser.parse_args()
+
+    print(f"latency={args.latency * 1000:.0f}ms depth={args.depth} rate={args.rate or '∞'}")
+    print(f"{'shape':<22} {'nodes':>6} {'strategy':<14} {'requests':>9} {'wall, s':>8}")
+
+    with FakeWorkFlowy(latency=args.latency) as fake:
+        for label, fanout in SHAPES.items():
+            root = fake.add(None, label)
+            fake.build_tree(fanout, root)
+            runs = [("serial", None)] + [(f"bfs c={c}", c) for c in args.concurrency]
+            for strategy, concurrency in runs:
+                nodes, requests, elapsed = await measure(fake, root, args.depth, concurrency, args.rate)
+                print(f"{label:<22} {nodes:>6} {strategy:<14} {requests:>9} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
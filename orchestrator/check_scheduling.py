@@ -0,0 +1,61 @@
+"""
+Check: a human waiting on a dialog reply is served before the backlog.
+
+Fills the work queue the way the scanner does while the only worker is
+busy: backlog tasks created hours and days ago (RED, YELLOW,
+#priority:urgent) and a dialog whose human replied a minute ago. When
+the worker frees up, the dialog must come out first, then the tasks by
+their boosted age. Exits non-zero if the order is wrong.
+
+Usage:
+    python check_scheduling.py
+"""
+
+import asyncio
+import time
+from datetime import datetime
+
+from dialog import Dialog, DialogMessage, DialogState, Speaker
+from orchestrator import Orchestrator, OrchestratorConfig, AgentRegistry, Task
+from workflowy_client import WFItem
+
+HOUR = 3600
+
+
+def task(task_id: str, name: str, age: float) -> Task:
+    created = datetime.fromtimestamp(time.time() - age)
+    return Task.from_item(WFItem(id=task_id, name=name, created_at=created, modified_at=created))
+
+
+def dialog(task_id: str, age: float) -> Dialog:
+    reply = DialogMessage("m-" + task_id, Speaker.HUMAN, "ответ", timestamp=datetime.fromtimestamp(time.time() - age))
+    return Dialog(task_id, "Задача с диалогом", [reply], DialogState.AWAITING_AGENT)
+
+
+async def main():
+    orch = Orchestrator(OrchestratorConfig(api_key="x", backlog_node_id="backlog"), AgentRegistry())
+    queue = orch._queue
+
+    queue.put(orch._work_item("task", "running", task("running", "Уже в работе #agent", 60)))
+    busy = await queue.get()   # the only worker is busy from here on
+
+    queue.put(orch._work_item("task", "yellow-2d", task("yellow-2d", "Аналитика #agent", 48 * HOUR)))
+    queue.put(orch._work_item("task", "red-3h", task("red-3h", "Деплой #agent", 3 * HOUR)))
+    queue.put(orch._work_item("task", "urgent-1d", task("urgent-1d", "Отчёт #agent #priority:urgent", 24 * HOUR)))
+    queue.put(orch._work_item("dialog", "dialog-1m", dialog("dialog-1m", 60)))
+
+    queue.done(busy)
+    order = []
+    while queue.depth:
+        item = await queue.get()
+        order.append(item.task_id)
+        queue.done(item)
+
+    expected = ["dialog-1m", "yellow-2d", "urgent-1d", "red-3h"]
+    print("served:", " → ".join(order))
+    assert order == expected, f"expected {expected}"
+    print("ok: the dialog goes ahead of the stale backlog")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,298 @@
+"""
+Warm pool of long-lived Claude CLI workers.
+
+Each `claude -p` call cold-starts Node and loads auth before any tokens
+move. The pool keeps `size` CLI processes started ahead of time in
+streaming JSON mode (--input-format/--output-format stream-json), hands
+each request to an idle worker and reads back its `result` event.
+
+A worker keeps one conversation for its lifetime, so it is retired after
+`recycle_after` calls (default 1: every request gets a fresh context)
+and a replacement is started in the background right away — the startup
+cost is paid while the previous request is running, not in front of the
+next one. Workers that fail or time out are killed and replaced too.
+
+Usage (async):
+    pool = CliPool(model="claude-sonnet-4-20250514", size=2)
+    text = await pool.call(prompt, timeout=120)
+    await pool.aclose()
+
+Usage (blocking scripts):
+    with SyncCliPool(model="claude-sonnet-4-20250514", size=2) as pool:
+        text = pool.call(prompt)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import Counter, deque
+from typing import AsyncIterator, Callable, Optional
+
+from cli_runner import CliTimeout, find_claude_cli, kill_process_group
+
+log = logging.getLogger("cli_pool")
+
+STREAM_LIMIT = 16 * 1024 * 1024   # a single result line can be large
+
+
+class CliPoolError(RuntimeError):
+    """The CLI reported an error or its worker died mid-request."""
+
+
+class _Worker:
+    """One CLI process speaking stream-json over stdin/stdout."""
+
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+        self.calls = 0
+        self._stderr = deque(maxlen=20)
+        self._drain = asyncio.create_task(self._drain_stderr())
+
+    @classmethod
+    async def spawn(cls, cmd: list[str], env: dict) -> "_Worker":
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            start_new_session=True,
+            limit=STREAM_LIMIT,
+        )
+        return cls(proc)
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def _drain_stderr(self):
+        async for line in self.proc.stderr:
+            self._stderr.append(line.decode("utf-8", errors="replace").rstrip())
+
+    async def ask(self, prompt: str, on_text: Optional[Callable[[str], None]] = None) -> dict:
+        """
+        Send one user message and return the CLI's `result` event.
+        `on_text` gets text deltas as they stream (partial-message events,
+        or whole assistant messages if the CLI doesn't send partials).
+        """
+        partial = False
+        message = {"type": "user", "message": {"role": "user", "content": prompt}}
+        self.proc.stdin.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+        await self.proc.stdin.drain()
+        while True:
+            line = await self.proc.stdout.readline()
+            if not line:
+                tail = " | ".join(self._stderr)[-300:]
+                raise CliPoolError(f"CLI worker exited (code {self.proc.returncode}): {tail}")
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            kind = event.get("type")
+            if kind == "result":
+                return event
+            if on_text is None:
+                continue
+            if kind == "stream_event":
+                delta = event.get("event", {}).get("delta", {})
+                if delta.get("type") == "text_delta":
+                    partial = True
+                    on_text(delta["text"])
+            elif kind == "assistant" and not partial:
+                for block in event.get("message", {}).get("content", []):
+                    if block.get("type") == "text":
+                        on_text(block["text"])
+
+    async def close(self, grace: float = 5.0):
+        """Let the process exit on EOF; kill its group if it lingers."""
+        if self.alive:
+            try:
+                self.proc.stdin.close()
+                await asyncio.wait_for(self.proc.wait(), grace)
+            except (asyncio.TimeoutError, ConnectionError):
+                await kill_process_group(self.proc, grace)
+        self._drain.cancel()
+
+    async def kill(self):
+        await kill_process_group(self.proc, grace=2.0)
+        self._drain.cancel()
+
+
+def _result_text(event: dict) -> str:
+    if event.get("is_error") or event.get("subtype", "success") != "success":
+        raise CliPoolError(f"CLI error: {str(event.get('result', event.get('subtype')))[:200]}")
+    return event.get("result", "")
+
+
+class CliPool:
+    """Fixed-size set of warm CLI workers shared by concurrent callers."""
+
+    def __init__(
+        self,
+        model: str = "claude-sonnet-4-20250514",
+        system_prompt: Optional[str] = None,
+        size: int = 2,
+        recycle_after: int = 1,
+        timeout: float = 120,
+        claude_bin: Optional[str] = None,
+        extra_args: Optional[list[str]] = None,
+    ):
+        self.model = model
+        self.system_prompt = system_prompt
+        self.size = size
+        self.recycle_after = max(1, recycle_after)
+        self.timeout = timeout
+        self.cmd = [
+            claude_bin or find_claude_cli(), "-p",
+            "--model", model,
+            "--input-format", "stream-json",
+            "--output-format", "stream-json",
+            "--verbose",
+            "--include-partial-messages",
+            "--no-session-persistence",
+        ]
+        if system_prompt:
+            self.cmd += ["--system-prompt", system_prompt]
+        self.cmd += extra_args or []
+        # Remove CLAUDECODE env var to allow nested invocation
+        self.env = {k: v for k, v in os.environ.items() if k != "CLAUDECODE"}
+        self.stats: Counter = Counter()
+        self._idle: Optional[asyncio.Queue] = None
+        self._background: set[asyncio.Task] = set()
+        self._closed = False
+
+    def _start(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._replace()
+
+    def _replace(self):
+        """Start a worker in the background and make it available when ready."""
+        if not self._closed:
+            self._in_background(self._spawn())
+
+    async def _spawn(self):
+        try:
+            worker = await _Worker.spawn(self.cmd, self.env)
+        except OSError as e:
+            # surfaced to a waiting caller instead of leaving it hanging
+            log.error("Cannot start CLI worker: %s", e)
+            self._idle.put_nowait(e)
+            return
+        self.stats["spawned"] += 1
+        self._idle.put_nowait(worker)
+
+    def _in_background(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def request(
+        self,
+        prompt: str,
+        timeout: Optional[float] = None,
+        on_text: Optional[Callable[[str], None]] = None,
+    ) -> dict:
+        """Run one prompt on an idle worker and return the raw `result` event."""
+        if self._closed:
+            raise CliPoolError("pool is closed")
+        self._start()
+        worker = await self._idle.get()
+        if isinstance(worker, Exception):
+            self._replace()
+            raise CliPoolError(f"cannot start CLI worker: {worker}")
+
+        timeout = timeout or self.timeout
+        try:
+            event = await asyncio.wait_for(worker.ask(prompt, on_text), timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self._in_background(worker.kill())
+            self._replace()
+            raise CliTimeout(f"CLI worker timed out after {timeout}s")
+        except BaseException:
+            self.stats["errors"] += 1
+            self._in_background(worker.kill())
+            self._replace()
+            raise
+
+        worker.calls += 1
+        self.stats["calls"] += 1
+        if worker.calls >= self.recycle_after or not worker.alive:
+            self.stats["recycled"] += 1
+            self._in_background(worker.close())
+            self._replace()
+        else:
+            self._idle.put_nowait(worker)
+        return event
+
+    async def call(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """Run one prompt and return the response text."""
+        return _result_text(await self.request(prompt, timeout))
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """Run one prompt and yield the response text as it is generated."""
+        chunks: asyncio.Queue = asyncio.Queue()
+        request = asyncio.create_task(self.request(prompt, timeout, on_text=chunks.put_nowait))
+        request.add_done_callback(lambda _: chunks.put_nowait(None))
+        try:
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+            _result_text(request.result())
+        finally:
+            if not request.done():
+                request.cancel()
+
+    async def aclose(self):
+        self._closed = True
+        for task in list(self._background):
+            await asyncio.gather(task, return_exceptions=True)
+        while self._idle is not None and not self._idle.empty():
+            worker = self._idle.get_nowait()
+            if isinstance(worker, _Worker):
+                await worker.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+
+class SyncCliPool:
+    """Blocking facade over CliPool for synchronous scripts: runs its own loop in a thread."""
+
+    def __init__(self, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self.pool = CliPool(**kwargs)
+        self._run(self._warm())
+
+    async def _warm(self):
+        self.pool._start()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def call(self, prompt: str, timeout: Optional[float] = None) -> str:
+        return self._run(self.pool.call(prompt, timeout))
+
+    @property
+    def stats(self) -> Counter:
+        return self.pool.stats
+
+    def close(self):
+        self._run(self.pool.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
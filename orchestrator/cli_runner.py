@@ -0,0 +1,116 @@
+"""
+Non-blocking subprocess runner for CLI agents.
+
+Runs commands with asyncio.create_subprocess_exec so a slow `claude -p`
+call no longer freezes the event loop. The prompt is streamed over
+stdin (no temp file), each child gets its own process group so a
+timeout kills the whole tree (node spawns helpers), and a semaphore
+caps how many CLI processes run at once.
+
+Usage:
+    runner = CliRunner(max_processes=4)
+    result = await runner.run(["claude", "-p"], input=prompt, timeout=120)
+    print(result.returncode, result.stdout)
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import signal
+from dataclasses import dataclass
+from typing import Optional
+
+log = logging.getLogger("cli_runner")
+
+
+def find_claude_cli() -> str:
+    """Full path to the claude CLI, so subprocesses don't depend on PATH."""
+    path = shutil.which("claude")
+    if path:
+        return path
+    for candidate in [
+        os.path.expanduser("~/.nvm/versions/node/v23.11.0/bin/claude"),
+        "/usr/local/bin/claude",
+        "/usr/bin/claude",
+    ]:
+        if os.path.isfile(candidate):
+            return candidate
+    return "claude"
+
+
+async def kill_process_group(proc: asyncio.subprocess.Process, grace: float = 5.0):
+    """SIGTERM the process group of `proc`, then SIGKILL it if it doesn't exit."""
+    if proc.returncode is not None:
+        return
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+        try:
+            await asyncio.wait_for(proc.wait(), grace)
+            return
+        except asyncio.TimeoutError:
+            log.warning("pid %d ignored %s", proc.pid, sig.name)
+
+
+class CliTimeout(Exception):
+    """The command ran longer than its timeout and was killed."""
+
+
+@dataclass
+class CliResult:
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+class CliRunner:
+    """Runs CLI commands concurrently, at most `max_processes` at a time."""
+
+    def __init__(self, max_processes: int = 4, kill_grace: float = 5.0):
+        self.max_processes = max_processes
+        self.kill_grace = kill_grace   # seconds between SIGTERM and SIGKILL
+        self._sem = asyncio.Semaphore(max_processes)
+        self.running = 0
+
+    async def run(
+        self,
+        cmd: list[str],
+        input: Optional[str] = None,
+        timeout: Optional[float] = None,
+        env: Optional[dict] = None,
+    ) -> CliResult:
+        """
+        Run `cmd`, write `input` to its stdin and collect its output.
+        Raises CliTimeout after killing the process group if it overruns.
+        """
+        async with self._sem:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env,
+                start_new_session=True,
+            )
+            self.running += 1
+            try:
+                data = input.encode("utf-8") if input is not None else None
+                stdout, stderr = await asyncio.wait_for(proc.communicate(data), timeout)
+            except asyncio.TimeoutError:
+                await kill_process_group(proc, self.kill_grace)
+                raise CliTimeout(f"{os.path.basename(cmd[0])} timed out after {timeout}s")
+            except BaseException:
+                # cancelled (e.g. shutdown) — don't leave orphans behind
+                await kill_process_group(proc, self.kill_grace)
+                raise
+            finally:
+                self.running -= 1
+
+        return CliResult(
+            returncode=proc.returncode,
+            stdout=stdout.decode("utf-8", errors="replace"),
+            stderr=stderr.decode("utf-8", errors="replace"),
+        )
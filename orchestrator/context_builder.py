@@ -0,0 +1,233 @@
+"""
+Token-budgeted dialog context.
+
+`Dialog.context_for_agent` flattens the whole fractal tree, so a deep
+thread makes the prompt grow without limit. The builder keeps the path
+from the root of the last thread to the active leaf verbatim — that is
+the conversation being answered — and spends the rest of the budget on
+the other branches. The oldest branches stay verbatim within
+`head_tokens`: that head doesn't change as the dialog grows, so it
+remains a cacheable prompt prefix (PromptContext.pinned). The rest goes
+to the most recent branches, verbatim or as one-line summaries, and
+what is left over in the middle is dropped behind a marker. The system
+prompt counts against the budget too. A dialog that fits in the budget
+is rendered exactly like context_for_agent.
+
+Summaries are cached per subtree, keyed by item id, latest modified time
+and size, so a pluggable (possibly expensive) summarizer runs once per
+change of a branch, not once per turn.
+
+Usage:
+    builder = ContextBuilder(max_tokens=8000)
+    context = builder.build(dialog, header="Task: ...\\n\\nDialog history:\\n",
+                            instruction="\\nRespond to the latest message.",
+                            system=agent.system_prompt)
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from dialog import Dialog, DialogMessage
+from prompt_cache import PromptContext
+from response_cache import estimate_tokens
+
+log = logging.getLogger("context_builder")
+
+Summarizer = Callable[[DialogMessage], str]
+
+
+def _subtree(msg: DialogMessage) -> list[DialogMessage]:
+    result = [msg]
+    for child in msg.children:
+        result += _subtree(child)
+    return result
+
+
+def elide(msg: DialogMessage, chars: int = 120) -> str:
+    """Default summary of a branch: its first message, cut, and the reply count."""
+    text = _cut(msg.text, chars)
+    replies = len(_subtree(msg)) - 1
+    return f"{text} [+{replies} replies collapsed]" if replies else text
+
+
+def _cut(text: str, chars: int) -> str:
+    if len(text) <= chars:
+        return text
+    return text[:max(0, chars - 1)].rstrip() + "…"
+
+
+def _cost(line: str) -> int:
+    return estimate_tokens(line) + 1   # + the newline
+
+
+def _line(msg: DialogMessage, indent: int, text: Optional[str] = None) -> str:
+    return f"{'  ' * indent}{msg.speaker.value} {msg.text if text is None else text}\n"
+
+
+class ContextBuilder:
+    """Renders dialog history into at most `max_tokens` (estimated) tokens."""
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = 8000,
+        summarize: Summarizer = elide,
+        path_min_chars: int = 200,
+        cache_size: int = 2048,
+        head_tokens: Optional[int] = None,
+    ):
+        self.max_tokens = max_tokens
+        # oldest branches kept verbatim; a quarter of the budget by default
+        self.head_tokens = head_tokens if head_tokens is not None else (max_tokens or 0) // 4
+        self.summarize = summarize
+        self.path_min_chars = path_min_chars   # older path messages are cut to this first
+        self.cache_size = cache_size
+        self._summaries: OrderedDict[tuple, str] = OrderedDict()
+        self.summary_hits = 0
+        self.summary_misses = 0
+        self.trimmed = 0
+
+    def build(self, dialog: Dialog, header: str = "", instruction: str = "", system: str = "") -> PromptContext:
+        """
+        Header + history lines (stable parts) and the instruction (volatile
+        part); `system` is the agent's system prompt, sent alongside.
+        """
+        units = []   # (msg, indent, on_path) in thread order; off-path units stand for whole branches
+        path = {m.item_id for m in dialog.active_path}
+
+        def walk(messages: list[DialogMessage], indent: int):
+            for msg in messages:
+                units.append((msg, indent, msg.item_id in path))
+                if msg.item_id in path:
+                    walk(msg.children, indent + 1)
+
+        walk(dialog.messages, 0)
+        full = [
+            _line(m, indent)
+            for msg, i, on_path in units
+            for m, indent in ([(msg, i)] if on_path else self._verbatim(msg, i))
+        ]
+        if self.max_tokens is None:
+            return PromptContext([header] + full, instruction)
+        budget = self.max_tokens - estimate_tokens(system) - _cost(header) - _cost(instruction)
+        if sum(map(_cost, full)) <= budget:
+            return PromptContext([header] + full, instruction)
+
+        self.trimmed += 1
+        lines, pinned = self._fit(units, budget)
+        log.info("  context for %s trimmed: ~%d → ~%d tokens", dialog.task_name[:40],
+                 sum(map(_cost, full)), sum(map(_cost, lines)))
+        return PromptContext([header] + lines, instruction, pinned=1 + pinned)
+
+    def _verbatim(self, msg: DialogMessage, indent: int) -> list[tuple[DialogMessage, int]]:
+        """(message, indent) for a message and everything under it."""
+        out = [(msg, indent)]
+        for child in msg.children:
+            out += self._verbatim(child, indent + 1)
+        return out
+
+    def _fit(self, units: list[tuple], budget: int) -> tuple[list[str], int]:
+        """History lines within budget, and how many leading lines are the fixed head."""
+        path_units = [(msg, indent) for msg, indent, on_path in units if on_path]
+        branches = [k for k, (_, _, on_path) in enumerate(units) if not on_path]
+
+        marker_cost = _cost(self._marker(len(branches))) if branches else 0
+
+        # Path first; if it alone is over budget, cut older path messages
+        path_lines = self._fit_path(path_units, budget - marker_cost)
+        left = budget - sum(map(_cost, path_lines))
+
+        # Head: the oldest branches verbatim within head_tokens. It doesn't
+        # depend on how long the dialog has grown, so the prefix stays put.
+        rendered: dict[int, list[str]] = {}
+        head_left = min(self.head_tokens, left)
+        for k in branches:
+            msg, indent, _ = units[k]
+            full = [_line(m, i) for m, i in self._verbatim(msg, indent)]
+            cost = sum(map(_cost, full))
+            if cost > head_left:
+                break
+            rendered[k] = full
+            head_left -= cost
+            left -= cost
+        head = set(rendered)
+        rest = [k for k in branches if k not in head]
+
+        # The rest summarized, newest first; what doesn't fit is dropped behind a marker
+        for k in reversed(rest):
+            msg, indent, _ = units[k]
+            summary = [_line(msg, indent, self._summary(msg))]
+            reserve = marker_cost if k != rest[0] else 0   # unless this completes the set
+            if _cost(summary[0]) + reserve > left:
+                break
+            rendered[k] = summary
+            left -= _cost(summary[0])
+        if len(rendered) < len(branches):
+            left -= marker_cost
+
+        # Upgrade the most recent branches back to verbatim while it fits
+        for k in reversed(rest):
+            if k not in rendered:
+                break
+            msg, indent, _ = units[k]
+            full = [_line(m, i) for m, i in self._verbatim(msg, indent)]
+            extra = sum(map(_cost, full)) - _cost(rendered[k][0])
+            if extra > left:
+                break
+            rendered[k] = full
+            left -= extra
+
+        lines = []
+        pinned = None   # lines before the first unit that isn't head
+        dropped = [k for k in branches if k not in rendered]
+        path_iter = iter(path_lines)
+        for k, (_, _, on_path) in enumerate(units):
+            if pinned is None and k not in head:
+                pinned = len(lines)
+            if on_path:
+                lines.append(next(path_iter))
+            elif k in rendered:
+                lines += rendered[k]
+            elif k == dropped[0]:
+                lines.append(self._marker(len(dropped)))
+        return lines, len(lines) if pinned is None else pinned
+
+    def _fit_path(self, path: list[tuple[DialogMessage, int]], budget: int) -> list[str]:
+        texts = [msg.text for msg, _ in path]
+
+        def lines():
+            return [_line(msg, indent, text) for (msg, indent), text in zip(path, texts)]
+
+        for limit in (self.path_min_chars, 0):
+            for k in range(len(path) - 1):   # oldest first; the leaf is what we answer
+                if sum(map(_cost, lines())) <= budget:
+                    return lines()
+                texts[k] = _cut(texts[k], limit) if limit else "…"
+        while sum(map(_cost, lines())) > budget and len(texts[-1]) > 1:
+            over = sum(map(_cost, lines())) - budget
+            chars_per_token = len(texts[-1]) / max(1, estimate_tokens(texts[-1]))
+            texts[-1] = _cut(texts[-1], max(1, len(texts[-1]) - max(1, int(over * chars_per_token))))
+        return lines()
+
+    @staticmethod
+    def _marker(count: int) -> str:
+        return f"[{count} earlier branches omitted]\n"
+
+    def _summary(self, msg: DialogMessage) -> str:
+        subtree = _subtree(msg)
+        latest = max(m.modified_at.timestamp() if m.modified_at else 0.0 for m in subtree)
+        key = (msg.item_id, latest, len(subtree))
+        if key in self._summaries:
+            self._summaries.move_to_end(key)
+            self.summary_hits += 1
+            return self._summaries[key]
+        self.summary_misses += 1
+        summary = self.summarize(msg)
+        self._summaries[key] = summary
+        if len(self._summaries) > self.cache_size:
+            self._summaries.popitem(last=False)
+        return summary
+
+    def snapshot(self) -> dict:
+        return {"trimmed": self.trimmed, "summary_hits": self.summary_hits,
+                "summary_misses": self.summary_misses}
@@ -17,13 +17,18 @@ Example tree:
             - 🤖 Готово: [ссылка]         ← agent resolves
 """
 
+import asyncio
 import json
-from dataclasses import dataclass
+import logging
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import Callable, Optional
 
 from workflowy_client import WorkFlowyClient, WFItem
+from stream_writer import ThrottledWriter
+
+log = logging.getLogger("dialog")
 
 
 class Speaker(Enum):
@@ -48,6 +53,7 @@ class DialogMessage:
     text: str
     timestamp: Optional[datetime] = None
     children: list["DialogMessage"] = None
+    modified_at: Optional[datetime] = None
 
     def __post_init__(self):
         if self.children is None:
@@ -69,6 +75,16 @@ class Dialog:
             return None
         return _deepest_leaf(self.messages[-1])
 
+    @property
+    def active_path(self) -> list[DialogMessage]:
+        """Messages from the root of the last thread down to the last message."""
+        path = []
+        msg = self.messages[-1] if self.messages else None
+        while msg is not None:
+            path.append(msg)
+            msg = msg.children[-1] if msg.children else None
+        return path
+
     @property
     def last_speaker(self) -> Optional[Speaker]:
         msg = self.last_message
@@ -142,6 +158,7 @@ def _parse_messages(items: list[WFItem]) -> list[DialogMessage]:
             text=_strip_prefix(item.name),
             timestamp=item.created_at,
             children=_parse_messages(item.sorted_children()),
+            modified_at=item.modified_at,
         )
         messages.append(msg)
     return messages
@@ -173,6 +190,68 @@ def _determine_state(messages: list[DialogMessage]) -> DialogState:
         return DialogState.AWAITING_AGENT
 
 
+@dataclass
+class DialogScan:
+    """Dialogs under a backlog, classified in one pass."""
+    pending: list[Dialog] = field(default_factory=list)   # awaiting agent
+    stale: list[Dialog] = field(default_factory=list)     # last message older than stale_hours
+    resolved: list[Dialog] = field(default_factory=list)
+    dialogs: list[Dialog] = field(default_factory=list)   # every task with a dialog
+
+
+def _build_dialog(task: WFItem, children_tree: list[WFItem]) -> Dialog:
+    """Parse a task's fetched subtree into a Dialog."""
+    # Filter: only dialog messages (prefixed with speaker emoji)
+    dialog_items = [
+        c for c in children_tree
+        if any(c.name.strip().startswith(s.value) for s in Speaker)
+    ]
+
+    messages = _parse_messages(dialog_items)
+    state = _determine_state(messages)
+
+    return Dialog(
+        task_id=task.id,
+        task_name=task.name,
+        messages=messages,
+        state=state,
+    )
+
+
+class DialogWatermarks:
+    """
+    Per-task modified_at watermarks, kept across ticks.
+
+    Remembers the dialog parsed under each task together with the task's
+    modified_at at that moment. While modified_at is unchanged, the cached
+    dialog is reused instead of re-fetching and re-parsing the subtree.
+    Our own writes invalidate the task explicitly.
+    """
+
+    def __init__(self):
+        self._seen: dict[str, tuple[datetime, Dialog]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, item: WFItem) -> Optional[Dialog]:
+        seen = self._seen.get(item.id)
+        if seen and item.modified_at is not None and seen[0] == item.modified_at:
+            self.hits += 1
+            return seen[1]
+        self.misses += 1
+        return None
+
+    def put(self, item: WFItem, dialog: Dialog):
+        if item.modified_at is not None:
+            self._seen[item.id] = (item.modified_at, dialog)
+
+    def invalidate(self, task_id: str):
+        self._seen.pop(task_id, None)
+
+    def clear(self):
+        self._seen.clear()
+
+
 class DialogManager:
     """
     Manages fractal dialog threads in WorkFlowy.
@@ -189,33 +268,33 @@ class DialogManager:
         # Agent starts a new thread on a task
         await dm.agent_start(task_item_id, "Взял задачу. Вопрос: ...")
         
-        # Find all dialogs awaiting agent action
-        pending = await dm.find_pending_dialogs(backlog_item_id)
+        # Classify every dialog under the backlog in one pass
+        scan = await dm.scan_dialogs(backlog_item_id)
+        scan.pending, scan.stale, scan.resolved
     """
 
-    def __init__(self, client: WorkFlowyClient):
+    def __init__(self, client: WorkFlowyClient, watermarks: Optional[DialogWatermarks] = None):
         self.wf = client
+        self.watermarks = watermarks
+
+    def _invalidate(self, task_id: str):
+        if self.watermarks:
+            self.watermarks.invalidate(task_id)
 
     async def read_dialog(self, task_id: str, depth: int = 5) -> Dialog:
         """Read the full dialog tree under a task node."""
         task = await self.wf.get_item(task_id)
         children_tree = await self.wf.get_subtree(task_id, depth=depth)
-        
-        # Filter: only dialog messages (prefixed with speaker emoji)
-        dialog_items = [
-            c for c in children_tree
-            if any(c.name.strip().startswith(s.value) for s in Speaker)
-        ]
-        
-        messages = _parse_messages(dialog_items)
-        state = _determine_state(messages)
-        
-        return Dialog(
-            task_id=task_id,
-            task_name=task.name,
-            messages=messages,
-            state=state,
-        )
+        return _build_dialog(task, children_tree)
+
+    async def _dialog_for(self, task: WFItem, depth: int) -> Dialog:
+        """Dialog under an already-listed task: one subtree fetch, or none if untouched."""
+        dialog = self.watermarks.get(task) if self.watermarks else None
+        if dialog is None:
+            dialog = _build_dialog(task, await self.wf.get_subtree(task.id, depth=depth))
+            if self.watermarks:
+                self.watermarks.put(task, dialog)
+        return dialog
 
     async def agent_reply(
         self,
@@ -229,21 +308,42 @@ class DialogManager:
         If reply_to is given, nests under that message (fractal branching).
         Otherwise, nests under the deepest leaf (continues the thread).
         """
-        if reply_to:
-            parent_id = reply_to
-        elif dialog.last_message:
-            parent_id = dialog.last_message.item_id
-        else:
-            parent_id = dialog.task_id
-
         formatted = f"{Speaker.AGENT.value} {text}"
         new_id = await self.wf.create_item(
-            parent_id=parent_id,
+            parent_id=self.reply_parent(dialog, reply_to),
             name=formatted,
             position="bottom",
         )
+        self._invalidate(dialog.task_id)
         return new_id
 
+    @staticmethod
+    def reply_parent(dialog: Dialog, reply_to: Optional[str] = None) -> str:
+        """Where agent_reply nests: reply_to, else the deepest leaf, else the task."""
+        if reply_to:
+            return reply_to
+        if dialog.last_message:
+            return dialog.last_message.item_id
+        return dialog.task_id
+
+    def stream_reply(
+        self,
+        task_id: str,
+        parent_id: str,
+        header: str = "",
+        min_interval: float = 2.0,
+        on_create: Optional[Callable[[str], None]] = None,
+    ) -> ThrottledWriter:
+        """
+        Writer for an agent message that is still being generated: the 🤖
+        node appears with the first text and is edited as the rest streams in.
+        """
+        self._invalidate(task_id)
+        return ThrottledWriter(
+            self.wf, parent_id, prefix=Speaker.AGENT.value,
+            header=header, min_interval=min_interval, on_create=on_create,
+        )
+
     async def agent_start(self, task_id: str, text: str) -> str:
         """Agent starts a new dialog thread on a task (top-level message)."""
         formatted = f"{Speaker.AGENT.value} {text}"
@@ -252,6 +352,7 @@ class DialogManager:
             name=formatted,
             position="bottom",
         )
+        self._invalidate(task_id)
         return new_id
 
     async def agent_branch(
@@ -281,38 +382,60 @@ class DialogManager:
             name=formatted,
             position="bottom",
         )
+        self._invalidate(dialog.task_id)
         return new_id
 
-    async def find_pending_dialogs(
+    async def scan_dialogs(
         self,
         parent_id: str,
         depth: int = 3,
-    ) -> list[Dialog]:
+        stale_hours: float = 24,
+    ) -> DialogScan:
         """
-        Scan children of parent_id for task nodes that have
-        dialogs awaiting agent action.
+        Fetch every open task's subtree under parent_id exactly once
+        and classify its dialog as pending, stale and/or resolved.
         """
         children = await self.wf.list_children(parent_id)
-        pending = []
+        tasks = [c for c in children if not c.is_completed]
+        dialogs = await asyncio.gather(
+            *(self._dialog_for(t, depth) for t in tasks),
+            return_exceptions=True,
+        )
 
-        for child in children:
-            # Skip completed tasks
-            if child.is_completed:
+        scan = DialogScan()
+        now = datetime.now()
+        for task, dialog in zip(tasks, dialogs):
+            if isinstance(dialog, Exception):
+                log.warning("Failed to read dialog under %s: %s", task.name[:40], dialog)
                 continue
-            # Check if this node has dialog messages
-            subtree = await self.wf.get_subtree(child.id, depth=depth)
-            has_dialog = any(
-                any(c.name.strip().startswith(s.value) for s in Speaker)
-                for c in subtree
-            )
-            if not has_dialog:
+            if not dialog.messages:
                 continue
+            scan.dialogs.append(dialog)
 
-            dialog = await self.read_dialog(child.id, depth=depth)
+            if dialog.state == DialogState.RESOLVED:
+                scan.resolved.append(dialog)
+                continue
             if dialog.state == DialogState.AWAITING_AGENT:
-                pending.append(dialog)
+                scan.pending.append(dialog)
+
+            last = dialog.last_message
+            if last and last.timestamp:
+                age_hours = (now - last.timestamp).total_seconds() / 3600
+                if age_hours > stale_hours:
+                    scan.stale.append(dialog)
+
+        return scan
 
-        return pending
+    async def find_pending_dialogs(
+        self,
+        parent_id: str,
+        depth: int = 3,
+    ) -> list[Dialog]:
+        """
+        Scan children of parent_id for task nodes that have
+        dialogs awaiting agent action.
+        """
+        return (await self.scan_dialogs(parent_id, depth=depth)).pending
 
     async def find_stale_dialogs(
         self,
@@ -321,22 +444,5 @@ class DialogManager:
         depth: int = 3,
     ) -> list[Dialog]:
         """Find dialogs where the last message is older than stale_hours."""
-        children = await self.wf.list_children(parent_id)
-        stale = []
-        now = datetime.now()
-
-        for child in children:
-            if child.is_completed:
-                continue
-            try:
-                dialog = await self.read_dialog(child.id, depth=depth)
-            except Exception:
-                continue
-
-            last = dialog.last_message
-            if last and last.timestamp:
-                age_hours = (now - last.timestamp).total_seconds() / 3600
-                if age_hours > stale_hours:
-                    stale.append(dialog)
-
-        return stale
+        scan = await self.scan_dialogs(parent_id, depth=depth, stale_hours=stale_hours)
+        return scan.stale
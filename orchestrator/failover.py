@@ -0,0 +1,221 @@
+"""
+Failover and hedged requests across agent backends.
+
+A role (e.g. "default") maps to an ordered list of backends — Claude API,
+headless CLI, YandexGPT. A call goes to the first healthy backend and
+fails over to the next on timeout, 5xx, rate limiting or a transport
+error; other errors (bad request, auth) are raised as is. With hedging,
+if the backend hasn't answered by its own p95 latency a second request
+goes to the next backend and whichever answers first wins.
+
+Per-backend latency and error counts over a sliding window decide the
+order: backends above `max_error_rate` are tried last, and with
+order_by="latency" healthy backends are sorted by median latency.
+
+Usage:
+    stats = BackendStats()
+    agents.register("default", make_failover_agent(
+        [("claude", claude), ("claude-cli", headless), ("yandex", yandex)],
+        stats, hedge=True,
+    ))
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import httpx
+
+from cli_pool import CliPoolError
+from cli_runner import CliTimeout
+from rate_limit import RateLimited
+
+log = logging.getLogger("failover")
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, float("inf"))
+
+
+class BackendFailed(Exception):
+    """A backend returned an error reply instead of raising."""
+
+
+def is_failover_error(error: BaseException) -> bool:
+    """Errors worth trying another backend for."""
+    if isinstance(error, (asyncio.TimeoutError, CliTimeout, CliPoolError, RateLimited, BackendFailed)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class BackendStats:
+    """Sliding-window latency and error record per backend name."""
+
+    def __init__(self, window: int = 200, min_samples: int = 5, max_error_rate: float = 0.5):
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self._samples: dict[str, deque] = {}
+        self.hedges = 0
+        self.failovers = 0
+
+    def record(self, name: str, seconds: float, ok: bool):
+        self._samples.setdefault(name, deque(maxlen=self.window)).append((seconds, ok))
+
+    def error_rate(self, name: str) -> float:
+        samples = self._samples.get(name)
+        if not samples:
+            return 0.0
+        return sum(not ok for _, ok in samples) / len(samples)
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """Latency percentile of successful calls; None until min_samples."""
+        latencies = sorted(s for s, ok in self._samples.get(name, ()) if ok)
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def healthy(self, name: str) -> bool:
+        samples = self._samples.get(name, ())
+        return len(samples) < self.min_samples or self.error_rate(name) <= self.max_error_rate
+
+    def order(self, names: list[str], by: str = "priority") -> list[str]:
+        """
+        Healthy backends first, unhealthy last; within each group keep the
+        configured priority, or sort by median latency with by="latency"
+        (backends without enough samples keep their place up front).
+        """
+        def key(item):
+            position, name = item
+            latency = self.percentile(name, 0.5) if by == "latency" else None
+            return (not self.healthy(name), latency if latency is not None else -1, position)
+        return [name for _, name in sorted(enumerate(names), key=key)]
+
+    def histogram(self, name: str) -> dict[str, int]:
+        counts = dict.fromkeys((f"<{b:g}s" for b in BUCKETS), 0)
+        for seconds, ok in self._samples.get(name, ()):
+            if ok:
+                bound = next(b for b in BUCKETS if seconds <= b)
+                counts[f"<{bound:g}s"] += 1
+        return {k: v for k, v in counts.items() if v}
+
+    def snapshot(self) -> dict[str, dict]:
+        out = {}
+        for name, samples in self._samples.items():
+            p50, p95 = self.percentile(name, 0.5), self.percentile(name, 0.95)
+            out[name] = {
+                "calls": len(samples),
+                "errors": round(self.error_rate(name), 2),
+                "p50": round(p50, 2) if p50 is not None else None,
+                "p95": round(p95, 2) if p95 is not None else None,
+                "histogram": self.histogram(name),
+            }
+        return out
+
+
+def make_failover_agent(
+    backends: list[tuple[str, Callable]],
+    stats: BackendStats,
+    hedge: bool = False,
+    order_by: str = "priority",
+    attempt_timeout: Optional[float] = None,
+):
+    """
+    Agent that tries `backends` (name, AgentFunc) in stats order, failing
+    over on retryable errors and optionally hedging slow calls.
+    """
+    funcs = dict(backends)
+    names = [name for name, _ in backends]
+
+    async def attempt(name: str, task, context: str) -> str:
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(funcs[name](task, context), attempt_timeout)
+            if response.startswith("[ОШИБКА]"):
+                raise BackendFailed(f"{name}: {response[:200]}")
+        except asyncio.CancelledError:
+            raise   # lost a hedge race; not the backend's fault
+        except Exception:
+            stats.record(name, time.monotonic() - started, ok=False)
+            raise
+        stats.record(name, time.monotonic() - started, ok=True)
+        return response
+
+    async def agent(task, context: str) -> str:
+        queue = stats.order(names, by=order_by)
+        running: dict[asyncio.Task, str] = {}
+        last_error: Optional[BaseException] = None
+
+        def launch():
+            name = queue.pop(0)
+            running[asyncio.create_task(attempt(name, task, context))] = name
+            return name
+
+        try:
+            current = launch()
+            while running:
+                hedge_after = None
+                if hedge and queue and len(running) == 1:
+                    hedge_after = stats.percentile(current, 0.95)
+                done, _ = await asyncio.wait(
+                    running, timeout=hedge_after, return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    stats.hedges += 1
+                    log.info("Hedging %s after %.1fs (p95)", current, hedge_after)
+                    current = launch()
+                    continue
+                for finished in done:
+                    name = running.pop(finished)
+                    error = finished.exception()
+                    if error is None:
+                        return finished.result()
+                    if not is_failover_error(error):
+                        raise error
+                    last_error = error
+                    log.warning("Backend %s failed (%s)%s", name, error,
+                                ", failing over" if queue or running else "")
+                    if queue and not running:
+                        stats.failovers += 1
+                        current = launch()
+            raise last_error
+        finally:
+            for pending in running:
+                pending.cancel()
+
+    async def stream(task, context: str):
+        # Fail over only before the first chunk; after that the reply is on screen
+        last_error: Optional[BaseException] = None
+        for name in stats.order(names, by=order_by):
+            func = funcs[name]
+            started = time.monotonic()
+            sent = False
+            try:
+                if getattr(func, "stream", None):
+                    async for chunk in func.stream(task, context):
+                        sent = True
+                        yield chunk
+                else:
+                    response = await attempt(name, task, context)
+                    sent = True
+                    yield response
+                    return
+            except Exception as e:
+                if getattr(func, "stream", None):
+                    stats.record(name, time.monotonic() - started, ok=False)
+                if sent or not is_failover_error(e):
+                    raise
+                last_error = e
+                stats.failovers += 1
+                log.warning("Backend %s failed before streaming (%s), failing over", name, e)
+                continue
+            stats.record(name, time.monotonic() - started, ok=True)
+            return
+        raise last_error
+
+    agent.stream = stream
+    agent.backends = names
+    return agent
@@ -0,0 +1,144 @@
+"""
+Local fake of the Anthropic Message Batches API, for manual testing.
+
+Serves /v1/messages/batches (create, retrieve, results) from memory.
+A batch stays "in_progress" for `process_after` seconds, then ends with
+a result per request from `respond(custom_id, params)`; custom ids in
+`fail_ids` come back as errored.
+
+Usage:
+    with FakeAnthropic(process_after=1.0) as fake:
+        batches = MessageBatchClient("test", base_url=fake.base_url)
+        ...
+        print(fake.requests)
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+def _echo(custom_id: str, params: dict) -> str:
+    return f"Готово: {params['messages'][-1]['content'][:80]}"
+
+
+class FakeAnthropic:
+    """In-memory message batches behind a threaded local HTTP server."""
+
+    def __init__(
+        self,
+        process_after: float = 0.0,
+        respond: Callable[[str, dict], str] = _echo,
+        fail_ids: Optional[set[str]] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.process_after = process_after
+        self.respond = respond
+        self.fail_ids = fail_ids or set()
+        self.batches: dict[str, dict] = {}
+        self.requests: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeAnthropic":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # ── ENDPOINTS ─────────────────────────────────────────
+
+    def _batch_object(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        ended = time.time() - batch["created"] >= self.process_after
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else len(batch["requests"])},
+            "results_url": f"{self.base_url}/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    def _result_line(self, request: dict) -> dict:
+        custom_id = request["custom_id"]
+        if custom_id in self.fail_ids:
+            result = {"type": "errored",
+                      "error": {"type": "error", "error": {"type": "api_error", "message": "fake failure"}}}
+        else:
+            text = self.respond(custom_id, request["params"])
+            result = {"type": "succeeded",
+                      "message": {"role": "assistant", "content": [{"type": "text", "text": text}]}}
+        return {"custom_id": custom_id, "result": result}
+
+    def handle(self, method: str, path: str, payload: dict) -> tuple[int, object]:
+        parts = path.strip("/").split("/")   # v1 messages batches [id [results]]
+        if parts[:3] != ["v1", "messages", "batches"]:
+            return 404, {"error": {"type": "not_found_error"}}
+        with self._lock:
+            if method == "POST" and len(parts) == 3:
+                self.requests["create"] += 1
+                batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+                self.batches[batch_id] = {"created": time.time(), "requests": payload["requests"]}
+                return 200, self._batch_object(batch_id)
+            if len(parts) < 4 or parts[3] not in self.batches:
+                return 404, {"error": {"type": "not_found_error"}}
+            batch_id = parts[3]
+            if len(parts) == 4:
+                self.requests["retrieve"] += 1
+                return 200, self._batch_object(batch_id)
+            self.requests["results"] += 1
+            if self._batch_object(batch_id)["processing_status"] != "ended":
+                return 404, {"error": {"type": "not_found_error", "message": "not ended"}}
+            requests = self.batches[batch_id]["requests"]
+        return 200, "\n".join(json.dumps(self._result_line(r), ensure_ascii=False) for r in requests)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method: str, payload: dict):
+                status, body = fake.handle(method, self.path, payload)
+                raw = (body if isinstance(body, str) else json.dumps(body)).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self._dispatch("POST", json.loads(self.rfile.read(length) or b"{}"))
+
+            def do_GET(self):
+                self._dispatch("GET", {})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,219 @@
+"""
+Local fake of the WorkFlowy Beta API, for benchmarks and manual testing.
+
+Serves the same /api/beta/ endpoints as the real thing from an in-memory
+tree, with optional per-request latency to emulate network round-trips.
+
+Usage:
+    with FakeWorkFlowy(latency=0.02) as fake:
+        fake.build_tree(fanout=[200, 3, 2])
+        async with WorkFlowyClient("test", base_url=fake.base_url) as wf:
+            ...
+        print(fake.request_count)
+"""
+
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class FakeWorkFlowy:
+    """In-memory WorkFlowy tree behind a threaded local HTTP server."""
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.nodes: dict[str, dict] = {}
+        self.children: dict[Optional[str], list[str]] = {None: []}
+        self.requests: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    # ── SERVER LIFECYCLE ──────────────────────────────────
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/beta"
+
+    @property
+    def request_count(self) -> int:
+        return sum(self.requests.values())
+
+    def start(self) -> "FakeWorkFlowy":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests.clear()
+
+    # ── TREE ──────────────────────────────────────────────
+
+    def add(
+        self,
+        parent_id: Optional[str],
+        name: str,
+        note: Optional[str] = None,
+        position: str = "bottom",
+    ) -> str:
+        item_id = str(uuid.uuid4())
+        now = int(time.time())
+        with self._lock:
+            siblings = self.children.setdefault(parent_id, [])
+            if position == "top":
+                siblings.insert(0, item_id)
+            else:
+                siblings.append(item_id)
+            self.children[item_id] = []
+            self.nodes[item_id] = {
+                "id": item_id,
+                "name": name,
+                "note": note,
+                "parent_id": parent_id,
+                "createdAt": now,
+                "modifiedAt": now,
+                "completedAt": None,
+                "data": {"layoutMode": "bullets"},
+            }
+        return item_id
+
+    def build_tree(self, fanout: list[int], parent_id: Optional[str] = None) -> list[str]:
+        """
+        Build a regular tree under parent_id: fanout[0] children,
+        each with fanout[1] children, and so on. Returns top-level ids.
+        """
+        if not fanout:
+            return []
+        ids = []
+        for i in range(fanout[0]):
+            item_id = self.add(parent_id, f"Node {len(self.nodes)} #agent")
+            self.build_tree(fanout[1:], item_id)
+            ids.append(item_id)
+        return ids
+
+    def _serialize(self, item_id: str, priority: int) -> dict:
+        return dict(self.nodes[item_id], priority=priority)
+
+    def _touch(self, item_id: str):
+        self.nodes[item_id]["modifiedAt"] = int(time.time())
+
+    # ── ENDPOINTS ─────────────────────────────────────────
+
+    def handle(self, endpoint: str, payload: dict) -> tuple[int, dict]:
+        with self._lock:
+            self.requests[endpoint] += 1
+            item_id = payload.get("item_id")
+            if item_id == "None":
+                item_id = None
+
+            if endpoint == "list-children":
+                if item_id is not None and item_id not in self.nodes:
+                    return 404, {"error": "not found"}
+                siblings = self.children[item_id]
+                return 200, {"items": [self._serialize(c, i) for i, c in enumerate(siblings)]}
+
+            if endpoint == "list-all":
+                return 200, {"items": [
+                    self._serialize(c, i)
+                    for siblings in self.children.values()
+                    for i, c in enumerate(siblings)
+                ]}
+
+            if endpoint != "create-item" and item_id not in self.nodes:
+                return 404, {"error": "not found"}
+
+            if endpoint == "get-item":
+                parent = self.nodes[item_id]["parent_id"]
+                return 200, {"item": self._serialize(item_id, self.children[parent].index(item_id))}
+
+            if endpoint == "edit-item":
+                for key in ("name", "note"):
+                    if key in payload:
+                        self.nodes[item_id][key] = payload[key]
+                self._touch(item_id)
+                return 200, {}
+
+            if endpoint == "complete-item":
+                self.nodes[item_id]["completedAt"] = int(time.time())
+                self._touch(item_id)
+                return 200, {}
+
+            if endpoint == "uncomplete-item":
+                self.nodes[item_id]["completedAt"] = None
+                self._touch(item_id)
+                return 200, {}
+
+            if endpoint == "delete-item":
+                self._delete(item_id)
+                return 200, {}
+
+        if endpoint == "create-item":
+            parent = payload.get("parent_id")
+            parent = None if parent == "None" else parent
+            if parent is not None and parent not in self.nodes:
+                return 404, {"error": "not found"}
+            new_id = self.add(parent, payload["name"], payload.get("note"), payload.get("position", "bottom"))
+            return 200, {"item_id": new_id}
+
+        return 404, {"error": f"unknown endpoint {endpoint}"}
+
+    def _delete(self, item_id: str):
+        for child in list(self.children.get(item_id, [])):
+            self._delete(child)
+        parent = self.nodes[item_id]["parent_id"]
+        self.children[parent].remove(item_id)
+        self.children.pop(item_id, None)
+        del self.nodes[item_id]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _dispatch(self, payload: dict):
+                if fake.latency:
+                    time.sleep(fake.latency)
+                endpoint = self.path.rstrip("/").rsplit("/", 1)[-1]
+                status, body = fake.handle(endpoint, payload)
+                raw = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                self._dispatch(payload)
+
+            def do_GET(self):
+                self._dispatch({})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,112 @@
+"""
+Long-lived, connection-pooled HTTP clients.
+
+One httpx.AsyncClient per upstream (WorkFlowy, Anthropic, YandexGPT),
+created once and closed on shutdown, so TCP+TLS setup is paid per
+connection rather than per task. HTTP/2 is used when the optional `h2`
+package is installed (pip install 'httpx[http2]').
+
+Usage:
+    async with HttpPool(PoolSettings(max_connections=20)) as http:
+        agent = make_claude_agent(key, client=http.client("anthropic"))
+        ...
+        log.info("http: %s", http.metrics())
+"""
+
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+log = logging.getLogger("http_pool")
+
+
+@dataclass
+class PoolSettings:
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 60.0
+    http2: bool = True
+    timeout: float = 60.0
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "PoolSettings":
+        return cls(**{k: v for k, v in cfg.items() if k in cls.__dataclass_fields__})
+
+
+class HttpPool:
+    """Owns one pooled AsyncClient per upstream name and counts their traffic."""
+
+    def __init__(self, settings: Optional[PoolSettings] = None):
+        self.settings = settings or PoolSettings()
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._stats: dict[str, Counter] = {}
+        if self.settings.http2 and not HTTP2_AVAILABLE:
+            log.info("h2 not installed, using HTTP/1.1 keep-alive")
+
+    def client(
+        self,
+        name: str,
+        max_connections: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.AsyncClient:
+        """The shared client for `name`, created on first use."""
+        if name in self._clients:
+            return self._clients[name]
+
+        s = self.settings
+        stats = self._stats[name] = Counter()
+
+        async def on_request(request: httpx.Request):
+            stats["requests"] += 1
+
+        async def on_response(response: httpx.Response):
+            stats["responses"] += 1
+            stats[response.http_version] += 1
+            if response.status_code >= 400:
+                stats["errors"] += 1
+
+        connections = max_connections or s.max_connections
+        self._clients[name] = httpx.AsyncClient(
+            http2=s.http2 and HTTP2_AVAILABLE,
+            timeout=timeout or s.timeout,
+            limits=httpx.Limits(
+                max_connections=connections,
+                max_keepalive_connections=min(connections, s.max_keepalive_connections),
+                keepalive_expiry=s.keepalive_expiry,
+            ),
+            event_hooks={"request": [on_request], "response": [on_response]},
+        )
+        return self._clients[name]
+
+    def metrics(self) -> dict[str, dict]:
+        """Per-client request/response/error counts, HTTP versions and open connections."""
+        out = {}
+        for name, client in self._clients.items():
+            stats = dict(self._stats[name])
+            stats["in_flight"] = stats.get("requests", 0) - stats.get("responses", 0)
+            # httpx doesn't expose pool state publicly; best effort
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            if pool is not None:
+                stats["connections"] = len(getattr(pool, "connections", []))
+            out[name] = stats
+        return out
+
+    async def aclose(self):
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
@@ -0,0 +1,43 @@
+"""
+Multi-keyword substring matching in one compiled pass.
+
+With pyahocorasick installed (`pip install pyahocorasick`) the keywords
+are compiled into an Aho–Corasick automaton that reports every
+occurrence in a single pass over the text, in C. Without it, the matcher
+falls back to one `keyword in text` check per keyword. Either way the
+result is the set of every keyword that occurs in the text.
+
+Usage:
+    matcher = KeywordMatcher(["#agent", "#status:done", "деплой"])
+    matcher.find("выкатить деплой #agent")   # {"#agent", "деплой"}
+"""
+
+from typing import Iterable
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+class KeywordMatcher:
+    """Finds which of a fixed set of keywords occur in a text."""
+
+    def __init__(self, keywords: Iterable[str], automaton: bool = AHOCORASICK_AVAILABLE):
+        self.keywords = sorted({k for k in keywords if k})
+        self._automaton = None
+        if automaton and self.keywords:
+            self._automaton = ahocorasick.Automaton()
+            for word in self.keywords:
+                self._automaton.add_word(word, word)
+            self._automaton.make_automaton()
+
+    @property
+    def engine(self) -> str:
+        return "aho-corasick" if self._automaton is not None else "loop"
+
+    def find(self, text: str) -> set[str]:
+        if self._automaton is not None:
+            return {word for _, word in self._automaton.iter(text)}
+        return {word for word in self.keywords if word in text}
@@ -0,0 +1,152 @@
+"""
+Task leases shared between orchestrator nodes.
+
+The work queue deduplicates tasks inside one process only; two
+orchestrators on the same backlog would both answer the same dialog.
+Before a worker runs an agent it claims the task: a lease held by its
+node id until `expires_at`, renewed by a heartbeat while the agent runs
+and released when the item is done. A lease that isn't renewed expires,
+so a crashed node's tasks are picked up by the others.
+
+A finished release also stamps `finished_at`. A claim made from a scan
+that started before that moment is refused: the node read the tree
+before the other node wrote its reply, and would answer the same message
+again. A node that finds its lease gone (renew fails) stops the task and
+writes nothing more; an item stopped half-way is released unfinished.
+
+SQLiteLeaseStore works for nodes sharing one SQLite file (one host, or a
+filesystem with working locks); MemoryLeaseStore is the in-process
+stand-in. Anything with the LeaseStore methods can be plugged in.
+Expiry uses each node's wall clock, so node clocks must be in sync.
+
+Usage:
+    leases = SQLiteLeaseStore("leases.db")
+    if leases.claim(task_id, "node-a", ttl=120, seen_at=scan_started):
+        ...   # leases.renew(task_id, "node-a", 120) every ttl/3
+        leases.release(task_id, "node-a", finished=True)
+"""
+
+import sqlite3
+import time
+from typing import Optional, Protocol
+
+
+class LeaseLost(Exception):
+    """The node no longer holds the task's lease; its work on the task stops."""
+
+
+class LeaseStore(Protocol):
+    def claim(self, task_id: str, owner: str, ttl: float, seen_at: Optional[float] = None) -> bool:
+        """Take or extend the lease unless another owner holds it or the task finished after seen_at."""
+
+    def renew(self, task_id: str, owner: str, ttl: float) -> bool:
+        """Extend a lease this owner still holds."""
+
+    def release(self, task_id: str, owner: str, finished: bool = True) -> None:
+        """Give the lease up; finished=True also records the finish time."""
+
+    def owner(self, task_id: str) -> Optional[str]:
+        """Current holder of an unexpired lease."""
+
+    def close(self) -> None: ...
+
+
+class MemoryLeaseStore:
+    """Leases in a dict: one process, or a stand-in for a shared store."""
+
+    def __init__(self):
+        self._leases: dict[str, list] = {}   # task_id → [owner, expires_at, finished_at]
+
+    def claim(self, task_id: str, owner: str, ttl: float, seen_at: Optional[float] = None) -> bool:
+        now = time.time()
+        lease = self._leases.setdefault(task_id, [None, 0.0, None])
+        holder, expires_at, finished_at = lease
+        if holder not in (None, owner) and expires_at > now:
+            return False
+        if seen_at is not None and finished_at is not None and finished_at >= seen_at:
+            return False
+        lease[0], lease[1] = owner, now + ttl
+        return True
+
+    def renew(self, task_id: str, owner: str, ttl: float) -> bool:
+        lease = self._leases.get(task_id)
+        if not lease or lease[0] != owner:
+            return False
+        lease[1] = time.time() + ttl
+        return True
+
+    def release(self, task_id: str, owner: str, finished: bool = True) -> None:
+        lease = self._leases.get(task_id)
+        if not lease or lease[0] != owner:
+            return
+        lease[0], lease[1] = None, 0.0
+        if finished:
+            lease[2] = time.time()
+
+    def owner(self, task_id: str) -> Optional[str]:
+        lease = self._leases.get(task_id)
+        return lease[0] if lease and lease[1] > time.time() else None
+
+    def close(self) -> None:
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    task_id     TEXT PRIMARY KEY,
+    owner       TEXT,
+    expires_at  REAL NOT NULL DEFAULT 0,
+    finished_at REAL
+);
+"""
+
+
+class SQLiteLeaseStore:
+    """
+    Leases in a SQLite file shared by every node. Each call is one
+    statement in autocommit mode, so claims are atomic across processes.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def claim(self, task_id: str, owner: str, ttl: float, seen_at: Optional[float] = None) -> bool:
+        now = time.time()
+        cursor = self._db.execute(
+            """
+            INSERT INTO leases (task_id, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(task_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE (leases.owner IS NULL OR leases.owner = excluded.owner OR leases.expires_at <= ?)
+              AND (? IS NULL OR leases.finished_at IS NULL OR leases.finished_at < ?)
+            """,
+            (task_id, owner, now + ttl, now, seen_at, seen_at),
+        )
+        return cursor.rowcount == 1
+
+    def renew(self, task_id: str, owner: str, ttl: float) -> bool:
+        cursor = self._db.execute(
+            "UPDATE leases SET expires_at = ? WHERE task_id = ? AND owner = ?",
+            (time.time() + ttl, task_id, owner),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, task_id: str, owner: str, finished: bool = True) -> None:
+        self._db.execute(
+            "UPDATE leases SET owner = NULL, expires_at = 0,"
+            " finished_at = CASE WHEN ? THEN ? ELSE finished_at END"
+            " WHERE task_id = ? AND owner = ?",
+            (finished, time.time(), task_id, owner),
+        )
+
+    def owner(self, task_id: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT owner FROM leases WHERE task_id = ? AND expires_at > ?", (task_id, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        self._db.close()
@@ -8,18 +8,32 @@ Setup:
 
 Or run once (no loop): python main.py --once
 Or generate digest:    python main.py --digest
+
+With a "tenants" list in the config, one process serves every backlog.
 """
 
 import asyncio
 import argparse
 import json
 import logging
+import os
 import sys
+from typing import Optional
 
 from orchestrator import Orchestrator, OrchestratorConfig, AgentRegistry
+from supervisor import FairSlots, Supervisor, TenantLogFilter
+from http_pool import HttpPool, PoolSettings
+from cli_runner import CliRunner
+from cli_pool import CliPool
+from response_cache import ResponseCache, cached_agent
+from rate_limit import ProviderLimits
+from batch_api import API_URL, MessageBatchClient
+from prompt_cache import TokenUsage
 from agents import (
+    HEADLESS_SYSTEM_PROMPT,
     make_claude_agent,
     make_claude_headless_agent,
+    make_claude_pool_agent,
     make_yandexgpt_agent,
     echo_agent,
     make_routing_agent,
@@ -39,59 +53,243 @@ def load_config(path: str = "config.json") -> dict:
         return json.load(f)
 
 
-def build_orchestrator(cfg: dict) -> Orchestrator:
-    """Wire everything together from config."""
+def build_cli_pool(cfg: dict) -> Optional[CliPool]:
+    """Warm CLI worker pool for the headless agent, if configured."""
+    llm_cfg = cfg.get("llm", {})
+    if llm_cfg.get("claude_api_key") or not llm_cfg.get("cli_pool_size"):
+        return None
+    return CliPool(
+        model=llm_cfg.get("claude_model", "claude-sonnet-4-20250514"),
+        system_prompt=llm_cfg.get("system_prompt") or HEADLESS_SYSTEM_PROMPT,
+        size=llm_cfg["cli_pool_size"],
+        recycle_after=llm_cfg.get("cli_recycle_after", 1),
+        timeout=llm_cfg.get("cli_timeout", 120),
+    )
 
-    # Orchestrator config
-    orch_config = OrchestratorConfig(
+
+def build_response_cache(cfg: dict) -> Optional[ResponseCache]:
+    """On-disk cache of agent responses, if enabled."""
+    cache_cfg = cfg.get("response_cache", {})
+    if not cache_cfg.get("enabled"):
+        return None
+    return ResponseCache(
+        cache_cfg.get("path", "responses.db"),
+        ttl=cache_cfg.get("ttl_hours", 24) * 3600,
+        max_entries=cache_cfg.get("max_entries", 5000),
+    )
+
+
+def build_config(cfg: dict) -> OrchestratorConfig:
+    """OrchestratorConfig from the config dict."""
+    return OrchestratorConfig(
         api_key=cfg["workflowy"]["api_key"],
         backlog_node_id=cfg["workflowy"]["backlog_node_id"],
         review_node_id=cfg["workflowy"].get("review_node_id"),
         digest_node_id=cfg["workflowy"].get("digest_node_id"),
         poll_interval_seconds=cfg.get("poll_interval_seconds", 300),
+        adaptive_poll=cfg.get("adaptive_poll", False),
+        poll_min_seconds=cfg.get("poll_min_seconds", 30),
+        poll_max_seconds=cfg.get("poll_max_seconds", 1800),
+        poll_active_window_seconds=cfg.get("poll_active_window_seconds", 900),
+        wake_port=cfg.get("wake", {}).get("port"),
+        wake_file=cfg.get("wake", {}).get("file"),
+        wake_signal=cfg.get("wake", {}).get("signal", True),
         dialog_depth=cfg.get("dialog_depth", 5),
         stale_hours=cfg.get("stale_hours", 24),
+        incremental=cfg.get("incremental", False),
+        full_rescan_ticks=cfg.get("full_rescan_ticks", 12),
+        max_concurrent_tasks=cfg.get("max_concurrent_tasks", 4),
+        agent_concurrency=cfg.get("agent_concurrency", {}),
+        autonomy_rules=cfg.get("autonomy_rules", {}),
+        task_memo_size=cfg.get("task_memo_size", 10000),
+        scheduling=cfg.get("scheduling", {}),
+        state_path=cfg.get("state_path"),
+        lease_path=cfg.get("leases", {}).get("path"),
+        lease_ttl_seconds=cfg.get("leases", {}).get("ttl_seconds", 120),
+        node_id=cfg.get("leases", {}).get("node_id"),
+        stream_replies=cfg.get("stream_replies", False),
+        stream_edit_interval=cfg.get("stream_edit_interval", 2.0),
+        retry_base_seconds=cfg.get("retry_base_seconds", 30),
+        retry_max_seconds=cfg.get("retry_max_seconds", 3600),
+        coalesce_writes=cfg.get("coalesce_writes", True),
+        write_attempts=cfg.get("write_attempts", 3),
+        dialog_max_context_tokens=cfg.get("dialog_max_context_tokens", 8000),
+        batch_green=cfg.get("batch", {}).get("enabled", False),
+        batch_model=cfg.get("llm", {}).get("claude_model", "claude-sonnet-4-20250514"),
+        batch_system_prompt=cfg.get("llm", {}).get("system_prompt") or HEADLESS_SYSTEM_PROMPT,
+        batch_max_tokens=cfg.get("batch", {}).get("max_tokens", 1024),
+        batch_min_size=cfg.get("batch", {}).get("min_size", 10),
+        batch_max_wait_seconds=cfg.get("batch", {}).get("max_wait_minutes", 30) * 60,
+        wf_max_concurrency=cfg["workflowy"].get("max_concurrency", 8),
+        wf_requests_per_second=cfg["workflowy"].get("requests_per_second"),
+        wf_cache=cfg["workflowy"].get("cache", False),
+        use_tree_mirror=cfg["workflowy"].get("tree_mirror", False),
+        snapshot_interval_seconds=cfg["workflowy"].get("snapshot_interval_seconds", 3600),
     )
 
-    # Build agents
-    agents = AgentRegistry()
 
+def build_agents(
+    cfg: dict,
+    http: HttpPool,
+    cli_pool: Optional[CliPool] = None,
+    response_cache: Optional[ResponseCache] = None,
+) -> tuple[AgentRegistry, ProviderLimits, TokenUsage]:
+    """Agents with the rate limiters and token counter they share."""
+    agents = AgentRegistry()
     llm_cfg = cfg.get("llm", {})
+    claude_model = llm_cfg.get("claude_model", "claude-sonnet-4-20250514")
+    # AIMD concurrency per provider/model, shared by every agent using it
+    limits = ProviderLimits(cfg.get("rate_limits", {}))
+    usage = TokenUsage()   # input/output and prompt-cache tokens of API calls
 
+    # Backends by name; roles below pick from them
+    backends = {}
     if llm_cfg.get("claude_api_key"):
-        claude = make_claude_agent(
+        backends["claude"] = make_claude_agent(
             api_key=llm_cfg["claude_api_key"],
-            model=llm_cfg.get("claude_model", "claude-sonnet-4-20250514"),
+            model=claude_model,
             system_prompt=llm_cfg.get("system_prompt"),
+            client=http.client("anthropic"),
+            limiter=limits.get("anthropic", claude_model),
+            prompt_cache=llm_cfg.get("prompt_cache", True),
+            usage=usage,
+        )
+    if cli_pool:
+        # Headless mode on warm CLI workers
+        backends["claude-cli"] = make_claude_pool_agent(
+            cli_pool,
+            timeout=llm_cfg.get("cli_timeout", 120),
+            limiter=limits.get("claude-cli", claude_model),
         )
-        agents.register("default", claude)
-        agents.register("dev-agent", claude)
-        log.info("Registered Claude API agent as default + dev-agent")
     else:
         # Headless mode — use claude -p CLI, no API key needed
-        claude = make_claude_headless_agent(
-            model=llm_cfg.get("claude_model", "claude-sonnet-4-20250514"),
+        backends["claude-cli"] = make_claude_headless_agent(
+            model=claude_model,
             system_prompt=llm_cfg.get("system_prompt"),
+            timeout=llm_cfg.get("cli_timeout", 120),
+            runner=CliRunner(max_processes=llm_cfg.get("cli_max_processes", 4)),
+            limiter=limits.get("claude-cli", claude_model),
         )
-        agents.register("default", claude)
-        agents.register("dev-agent", claude)
-        log.info("Registered Claude headless (CLI) agent as default + dev-agent")
-
     if llm_cfg.get("yandex_api_key") and llm_cfg.get("yandex_folder_id"):
-        yandex = make_yandexgpt_agent(
+        yandex_model = llm_cfg.get("yandex_model", "yandexgpt-lite")
+        backends["yandex"] = make_yandexgpt_agent(
             api_key=llm_cfg["yandex_api_key"],
             folder_id=llm_cfg["yandex_folder_id"],
-            model=llm_cfg.get("yandex_model", "yandexgpt-lite"),
+            model=yandex_model,
+            client=http.client("yandex"),
+            limiter=limits.get("yandex", yandex_model),
         )
-        agents.register("comms-agent", yandex)
-        log.info("Registered YandexGPT agent as comms-agent")
+
+    roles = cfg.get("roles")
+    if roles:
+        # Each role is an ordered backend list with failover (and optional hedging)
+        failover_cfg = cfg.get("failover", {})
+        for role, names in roles.items():
+            chain = [(n, backends[n]) for n in names if n in backends]
+            if not chain:
+                log.warning("Role %s: none of %s is configured", role, names)
+                continue
+            agents.register_failover(
+                role, chain,
+                hedge=failover_cfg.get("hedge", False),
+                order_by=failover_cfg.get("order_by", "priority"),
+                attempt_timeout=failover_cfg.get("attempt_timeout"),
+            )
+            log.info("Registered %s → %s", role, " → ".join(n for n, _ in chain))
+    else:
+        claude = backends.get("claude") or backends["claude-cli"]
+        agents.register("default", claude)
+        agents.register("dev-agent", claude)
+        if "claude" in backends:
+            log.info("Registered Claude API agent as default + dev-agent")
+        elif cli_pool:
+            log.info("Registered Claude CLI pool agent (%d workers) as default + dev-agent", cli_pool.size)
+        else:
+            log.info("Registered Claude headless (CLI) agent as default + dev-agent")
+        if "yandex" in backends:
+            agents.register("comms-agent", backends["yandex"])
+            log.info("Registered YandexGPT agent as comms-agent")
 
     # Fallback if nothing was registered (shouldn't happen with headless)
     if not agents.agents:
         agents.register("default", echo_agent)
         log.warning("No agents registered — using echo agent")
 
-    return Orchestrator(orch_config, agents)
+    if response_cache:
+        for name, func in list(agents.agents.items()):
+            agents.register(name, cached_agent(func, response_cache, name))
+        log.info("Agent responses cached in %s", response_cache.path)
+
+    return agents, limits, usage
+
+
+def build_orchestrator(
+    cfg: dict,
+    http: HttpPool,
+    cli_pool: Optional[CliPool] = None,
+    response_cache: Optional[ResponseCache] = None,
+    shared: Optional[tuple[AgentRegistry, ProviderLimits, TokenUsage]] = None,
+    slots: Optional[FairSlots] = None,
+    tenant: str = "default",
+) -> Orchestrator:
+    """Wire everything together from config. `http`, `cli_pool` and `response_cache` are owned by the caller."""
+    orch_config = build_config(cfg)
+    agents, limits, usage = shared or build_agents(cfg, http, cli_pool, response_cache)
+    llm_cfg = cfg.get("llm", {})
+
+    # GREEN tasks of the default agent as message batches (API key only)
+    batches = None
+    if orch_config.batch_green:
+        if llm_cfg.get("claude_api_key"):
+            batches = MessageBatchClient(
+                llm_cfg["claude_api_key"],
+                base_url=cfg["batch"].get("base_url", API_URL),
+                client=http.client("anthropic"),
+            )
+            log.info("GREEN tasks go through message batches (min %d, max wait %ds)",
+                     orch_config.batch_min_size, orch_config.batch_max_wait_seconds)
+        else:
+            log.warning("batch.enabled needs llm.claude_api_key; GREEN tasks run directly")
+
+    return Orchestrator(orch_config, agents, http=http, response_cache=response_cache,
+                        limits=limits, batches=batches, usage=usage, slots=slots, tenant=tenant)
+
+
+def tenant_config(cfg: dict, tenant: dict) -> dict:
+    """Top-level config with one tenant's overrides; `workflowy` is merged key by key."""
+    merged = {k: v for k, v in cfg.items() if k != "tenants"}
+    merged.update({k: v for k, v in tenant.items() if k != "name"})
+    merged["workflowy"] = {**cfg.get("workflowy", {}), **tenant.get("workflowy", {})}
+    if "state_path" not in tenant and cfg.get("state_path"):
+        root, ext = os.path.splitext(cfg["state_path"])
+        merged["state_path"] = f"{root}.{tenant['name']}{ext}"   # one state file per tenant
+    merged["wake"] = {"signal": False}   # the supervisor owns the wake sources
+    return merged
+
+
+def build_supervisor(
+    cfg: dict,
+    http: HttpPool,
+    cli_pool: Optional[CliPool] = None,
+    response_cache: Optional[ResponseCache] = None,
+) -> Supervisor:
+    """One orchestrator per entry of `tenants`, sharing agents, limiters and agent slots."""
+    shared = build_agents(cfg, http, cli_pool, response_cache)
+    slots = FairSlots(cfg.get("shared_agent_slots", cfg.get("max_concurrent_tasks", 4)))
+    tenants = {
+        t["name"]: build_orchestrator(
+            tenant_config(cfg, t), http, cli_pool, response_cache,
+            shared=shared, slots=slots, tenant=t["name"],
+        )
+        for t in cfg["tenants"]
+    }
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(TenantLogFilter())
+    return Supervisor(
+        tenants, slots,
+        wake_port=cfg.get("wake", {}).get("port"),
+        wake_file=cfg.get("wake", {}).get("file"),
+    )
 
 
 async def main():
@@ -102,17 +300,33 @@ async def main():
     args = parser.parse_args()
 
     cfg = load_config(args.config)
-    orch = build_orchestrator(cfg)
+    http = HttpPool(PoolSettings.from_config(cfg.get("http", {})))
+    cli_pool = build_cli_pool(cfg)
+    response_cache = build_response_cache(cfg)
+    if cfg.get("tenants"):
+        orch = build_supervisor(cfg, http, cli_pool, response_cache)
+    else:
+        orch = build_orchestrator(cfg, http, cli_pool, response_cache)
 
-    if args.digest:
-        await orch.write_digest_to_wf()
-    elif args.once:
-        async with __import__("workflowy_client").WorkFlowyClient(cfg["workflowy"]["api_key"]) as wf:
+    try:
+        if args.digest:
+            await orch.write_digest_to_wf()
+        elif args.once:
             await orch.tick()
-        digest = await orch.generate_digest()
-        print(digest)
-    else:
-        await orch.run_forever()
+            digest = await orch.generate_digest()
+            print(digest)
+        else:
+            await orch.run_forever()
+    finally:
+        log.info("HTTP pools: %s", http.metrics())
+        await http.aclose()
+        if cli_pool:
+            log.info("CLI pool: %s", dict(cli_pool.stats))
+            await cli_pool.aclose()
+        if response_cache:
+            log.info("Response cache: %s", response_cache.stats())
+            response_cache.close()
+        orch.close()
 
 
 if __name__ == "__main__":
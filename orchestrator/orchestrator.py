@@ -12,16 +12,39 @@ Architecture:
 """
 
 import asyncio
+import contextlib
 import json
 import logging
+import os
+import socket
 import time
+from collections import Counter, OrderedDict
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Callable, Awaitable, Optional
+from typing import Callable, Awaitable, NamedTuple, Optional
+
+import httpx
 
 from workflowy_client import WorkFlowyClient, WFItem
-from dialog import DialogManager, Dialog, DialogState, Speaker
+from rate_limit import ProviderLimits, TokenBucket, RateLimited, backoff_delay, retry_after_of
+from tree_mirror import TreeMirror
+from work_queue import WorkQueue, WorkItem
+from state_store import StateStore
+from http_pool import HttpPool
+from response_cache import ResponseCache
+from dialog import DialogManager, DialogWatermarks, Dialog, DialogState, Speaker
+from stream_writer import CURSOR, ThrottledWriter
+from failover import BackendStats, make_failover_agent
+from batch_api import BatchResult, GreenBatcher, MessageBatchClient
+from prompt_cache import PromptContext, TokenUsage
+from context_builder import ContextBuilder
+from keyword_matcher import AHOCORASICK_AVAILABLE, KeywordMatcher
+from scheduler import SchedulingPolicy
+from poller import AdaptivePoller, wake_sources
+from supervisor import FairSlots
+from lease_store import LeaseLost, LeaseStore, SQLiteLeaseStore
+from write_coalescer import Mutation, WriteCoalescer, apply_mutation
 
 log = logging.getLogger("orchestrator")
 
@@ -40,7 +63,7 @@ class Autonomy(Enum):
 
 
 # Default classification rules.
-# Override via config or per-task tags.
+# Override via config (`autonomy_rules`) or per-task tags.
 AUTONOMY_RULES: dict[str, Autonomy] = {
     # By tag
     "#automate": Autonomy.GREEN,
@@ -69,17 +92,98 @@ AUTONOMY_RULES: dict[str, Autonomy] = {
 }
 
 
-def classify_autonomy(task_name: str, task_note: Optional[str] = None) -> Autonomy:
-    """Determine autonomy level from task name and note."""
-    text = f"{task_name} {task_note or ''}".lower()
+# Status tags, earlier wins; each matches as #status:<s> or #<s>
+STATUSES = ("backlog", "in-progress", "review", "done", "blocked")
+
+# Assignee tags; "agent" wins over "human" if both are present
+ASSIGNEE_TAGS = {"#agent": "agent", "#dev-agent": "agent", "#human": "human"}
 
-    # Explicit tags take priority
-    for keyword, level in AUTONOMY_RULES.items():
-        if keyword in text:
-            return level
 
-    # Default: yellow (do it but show me)
-    return Autonomy.YELLOW
+class Classification(NamedTuple):
+    autonomy: Autonomy
+    status: str
+    assignee: str
+
+
+class TaskClassifier:
+    """
+    Autonomy, status and assignee of a task from one scan of its name and
+    note. Every rule and tag is compiled into one KeywordMatcher up front;
+    the result is the same as checking the rules in order and taking the
+    first match. `overrides` ({keyword: "green"|"yellow"|"red"|None}) add
+    rules after the defaults, change a rule in place or, with None, remove it.
+    """
+
+    DEFAULTS = (Autonomy.YELLOW, "backlog", "unassigned")   # yellow: do it but show me
+
+    def __init__(
+        self,
+        rules: dict[str, Autonomy] = AUTONOMY_RULES,
+        overrides: Optional[dict[str, Optional[str]]] = None,
+        automaton: bool = AHOCORASICK_AVAILABLE,
+    ):
+        rules = {k.lower(): v for k, v in rules.items()}
+        for keyword, level in (overrides or {}).items():
+            if level is None:
+                rules.pop(keyword.lower(), None)
+            else:
+                rules[keyword.lower()] = Autonomy(level)
+        self.rules = rules
+
+        # keyword → what it votes for: (field index, rank, value), higher rank wins
+        self._votes: dict[str, list[tuple[int, int, object]]] = {}
+        for position, (keyword, level) in enumerate(rules.items()):   # first rule wins
+            self._vote(keyword, 0, len(rules) - position, level)
+        for position, status in enumerate(STATUSES):
+            for tag in (f"#status:{status}", f"#{status}"):
+                self._vote(tag, 1, len(STATUSES) - position, status)
+        for tag, assignee in ASSIGNEE_TAGS.items():
+            self._vote(tag, 2, 2 if assignee == "agent" else 1, assignee)
+
+        # Without the automaton: per field, (keyword, value) best rank first,
+        # checked in order until the first hit, as the old substring loops did
+        self._matcher = KeywordMatcher(self._votes) if automaton and AHOCORASICK_AVAILABLE else None
+        ordered = sorted(
+            (-rank, index, keyword, value)
+            for keyword, votes in self._votes.items() for index, rank, value in votes
+        )
+        self._ordered = [
+            [(keyword, value) for _, i, keyword, value in ordered if i == index]
+            for index in range(len(self.DEFAULTS))
+        ]
+
+    def _vote(self, keyword: str, index: int, rank: int, value):
+        self._votes.setdefault(keyword, []).append((index, rank, value))
+
+    @property
+    def engine(self) -> str:
+        return self._matcher.engine if self._matcher is not None else "loop"
+
+    def classify(self, name: str, note: Optional[str] = None) -> Classification:
+        text = f"{name} {note or ''}".lower()
+        values = list(self.DEFAULTS)
+        if self._matcher is None:
+            for index, candidates in enumerate(self._ordered):
+                for keyword, value in candidates:
+                    if keyword in text:
+                        values[index] = value
+                        break
+            return Classification(*values)
+        ranks = [0, 0, 0]
+        for keyword in self._matcher.find(text):
+            for index, rank, value in self._votes[keyword]:
+                if rank > ranks[index]:
+                    ranks[index] = rank
+                    values[index] = value
+        return Classification(*values)
+
+
+DEFAULT_CLASSIFIER = TaskClassifier()
+
+
+def classify_autonomy(task_name: str, task_note: Optional[str] = None) -> Autonomy:
+    """Determine autonomy level from task name and note."""
+    return DEFAULT_CLASSIFIER.classify(task_name, task_note).autonomy
 
 
 # ── TASK PARSING ─────────────────────────────────────────
@@ -94,27 +198,8 @@ class Task:
     dialog: Optional[Dialog] = None
 
     @classmethod
-    def from_item(cls, item: WFItem) -> "Task":
-        name = item.name.lower()
-        note = (item.note or "").lower()
-        text = f"{name} {note}"
-
-        # Parse status from tags
-        status = "backlog"
-        for s in ["backlog", "in-progress", "review", "done", "blocked"]:
-            if f"#status:{s}" in text or f"#{s}" in text:
-                status = s
-                break
-
-        # Parse assignee
-        assignee = "unassigned"
-        if "#agent" in text or "#dev-agent" in text:
-            assignee = "agent"
-        elif "#human" in text:
-            assignee = "human"
-
-        autonomy = classify_autonomy(item.name, item.note)
-
+    def from_item(cls, item: WFItem, classifier: Optional[TaskClassifier] = None) -> "Task":
+        autonomy, status, assignee = (classifier or DEFAULT_CLASSIFIER).classify(item.name, item.note)
         return cls(
             item=item,
             status=status,
@@ -123,9 +208,49 @@ class Task:
         )
 
 
+class TaskParser:
+    """
+    Task.from_item with a bounded LRU memo of classifications keyed by
+    (item id, modified_at): an unchanged task costs a dict lookup. Every
+    call returns a new Task around the given item, so callers can attach
+    a dialog without touching the memo. The stored name and note are
+    compared too, since modified_at only has one-second resolution.
+    """
+
+    def __init__(self, classifier: Optional[TaskClassifier] = None, max_entries: int = 10000):
+        self.classifier = classifier or DEFAULT_CLASSIFIER
+        self.max_entries = max_entries
+        self._memo: OrderedDict[tuple, tuple[str, Optional[str], Classification]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, item: WFItem) -> Task:
+        key = (item.id, item.modified_at)
+        entry = self._memo.get(key) if item.modified_at is not None else None
+        if entry is not None and entry[0] == item.name and entry[1] == item.note:
+            self._memo.move_to_end(key)
+            self.hits += 1
+            classification = entry[2]
+        else:
+            self.misses += 1
+            classification = self.classifier.classify(item.name, item.note)
+            if item.modified_at is not None:
+                self._memo[key] = (item.name, item.note, classification)
+                if len(self._memo) > self.max_entries:
+                    self._memo.popitem(last=False)
+        autonomy, status, assignee = classification
+        return Task(item=item, status=status, assignee=assignee, autonomy=autonomy)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
 # ── AGENT INTERFACE ──────────────────────────────────────
 
 # An agent is any async function: (task, dialog_context) -> response_text
+# It may also carry a `.stream(task, dialog_context)` attribute: an async
+# iterator of text chunks, used to write the reply while it is generated.
 AgentFunc = Callable[[Task, str], Awaitable[str]]
 
 
@@ -133,10 +258,19 @@ AgentFunc = Callable[[Task, str], Awaitable[str]]
 class AgentRegistry:
     """Registry of available agents."""
     agents: dict[str, AgentFunc] = field(default_factory=dict)
+    backend_stats: BackendStats = field(default_factory=BackendStats)  # shared by failover roles
 
     def register(self, name: str, func: AgentFunc):
         self.agents[name] = func
 
+    def register_failover(self, role: str, backends: list[tuple[str, AgentFunc]], **options):
+        """
+        Register `role` as an ordered list of (name, agent) backends with
+        automatic failover; options go to failover.make_failover_agent
+        (hedge, order_by, attempt_timeout).
+        """
+        self.agents[role] = make_failover_agent(backends, self.backend_stats, **options)
+
     def get(self, name: str) -> Optional[AgentFunc]:
         return self.agents.get(name)
 
@@ -150,169 +284,567 @@ class OrchestratorConfig:
     backlog_node_id: str           # UUID of the backlog/tasks parent node
     review_node_id: Optional[str] = None  # UUID of the review queue node
     digest_node_id: Optional[str] = None  # UUID where digests are written
-    poll_interval_seconds: int = 300       # 5 minutes
+    poll_interval_seconds: int = 300       # fixed cadence when adaptive_poll is off
+    adaptive_poll: bool = False            # opt-in: short interval while dialogs are active, back off when idle
+    poll_min_seconds: float = 30
+    poll_max_seconds: float = 1800
+    poll_active_window_seconds: float = 900  # a dialog message this recent keeps polling fast
+    wake_port: Optional[int] = None        # local HTTP /wake endpoint
+    wake_file: Optional[str] = None        # touching this file wakes the scanner
+    wake_signal: bool = True               # SIGUSR1 wakes the scanner (off under a Supervisor)
     dialog_depth: int = 5
     stale_hours: float = 24
+    wf_max_concurrency: int = 8            # parallel WorkFlowy requests per tick
+    wf_requests_per_second: Optional[float] = None  # per-host budget, None = unlimited
+    wf_cache: bool = False                 # per-tick read-through cache on the client
+    use_tree_mirror: bool = False          # serve reads from a list_all snapshot
+    snapshot_interval_seconds: int = 3600  # list_all is limited to 1 req/hour
+    incremental: bool = False              # skip dialogs whose task modified_at is unchanged
+    full_rescan_ticks: int = 12            # in incremental mode, re-read everything every N ticks
+    max_concurrent_tasks: int = 4          # agent calls running at once, across all agents
+    agent_concurrency: dict[str, int] = field(default_factory=dict)  # per-agent caps, by name
+    autonomy_rules: dict[str, Optional[str]] = field(default_factory=dict)  # keyword → level, None removes
+    task_memo_size: int = 10000            # parsed tasks remembered by (id, modified_at)
+    scheduling: dict = field(default_factory=dict)  # queue tiers and boosts, see SchedulingPolicy
+    state_path: Optional[str] = None       # SQLite state file; None = in-memory only
+    lease_path: Optional[str] = None       # SQLite lease file shared by nodes; None = single node
+    lease_ttl_seconds: float = 120         # renewed every third of it while an agent runs
+    node_id: Optional[str] = None          # lease owner; default host:pid
+    stream_replies: bool = False           # write streaming agents' replies as they arrive
+    stream_edit_interval: float = 2.0      # min seconds between edits of a streaming reply
+    retry_base_seconds: float = 30         # first retry delay after a failure, doubled per attempt
+    retry_max_seconds: float = 3600        # cap on the retry delay
+    coalesce_writes: bool = True           # write-back off the worker, ordered per task
+    write_attempts: int = 3                # tries per WorkFlowy write before the task is retried
+    dialog_max_context_tokens: Optional[int] = 8000  # dialog history budget; None = unlimited
+    batch_green: bool = False              # send GREEN tasks of the default agent as message batches
+    batch_model: str = "claude-sonnet-4-20250514"
+    batch_system_prompt: Optional[str] = None
+    batch_max_tokens: int = 1024
+    batch_min_size: int = 10               # submit once this many GREEN tasks are collected...
+    batch_max_wait_seconds: float = 1800   # ...or the oldest has waited this long
 
 
 class Orchestrator:
     """
     Main orchestration loop.
     
-    Lifecycle per tick:
+    A scanner polls the tree and feeds a work queue; long-lived workers
+    drain it, so poll cadence and agent latency are independent.
+
+    Scanner, per tick:
     1. Scan backlog for tasks assigned to agents
     2. For each task, check dialog state
-    3. If awaiting_agent → dispatch to agent
+    3. New task or awaiting_agent → enqueue (deduplicated by task id),
+       ordered by SchedulingPolicy: dialog replies and RED prep first
+
+    Worker, per item:
     4. Agent responds → write back to WorkFlowy
     5. Update task status based on autonomy level
-    6. Generate digest
+
+    Digest is generated from accumulated results.
     """
 
-    def __init__(self, config: OrchestratorConfig, agents: AgentRegistry):
+    def __init__(
+        self,
+        config: OrchestratorConfig,
+        agents: AgentRegistry,
+        http: Optional[HttpPool] = None,
+        response_cache: Optional[ResponseCache] = None,
+        limits: Optional[ProviderLimits] = None,
+        batches: Optional[MessageBatchClient] = None,
+        usage: Optional[TokenUsage] = None,
+        slots: Optional[FairSlots] = None,
+        tenant: str = "default",
+        leases: Optional[LeaseStore] = None,
+    ):
         self.config = config
         self.agents = agents
+        self.tenant = tenant
+        self.slots = slots                    # process-wide agent slots shared with other tenants
+        self.http = http  # shared pooled clients; None = a client per session
+        self.response_cache = response_cache  # only reported here; agents are wrapped by the caller
+        self.limits = limits                  # per-provider AIMD limiters held by the agents
+        self.usage = usage                    # token counts recorded by the Claude API agents
         self._running = False
         self._tick_count = 0
-        self._results: list[dict] = []  # accumulate for digest
-        self._in_flight: set[str] = set()  # task IDs currently being processed
-        self._failed: dict[str, float] = {}  # task_id → retry_after (unix timestamp)
+        self._last_activity = 0.0   # latest dialog message seen or agent reply written
+        self.poller = AdaptivePoller(config.poll_min_seconds, config.poll_max_seconds)
+        self.store = StateStore(config.state_path or ":memory:")  # digest entries, retries, dispatches
+        # task ownership across orchestrator nodes
+        self.leases = leases or (SQLiteLeaseStore(config.lease_path) if config.lease_path else None)
+        self.node_id = config.node_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_stats: Counter = Counter()
+        self._scan_started: Optional[float] = None
+        if self.leases:
+            log.info("Task leases as node %s (ttl %gs)", self.node_id, config.lease_ttl_seconds)
+        self._queue = WorkQueue()        # dedupe + retry backoff by task id
+        self._wf_budget = (
+            TokenBucket(config.wf_requests_per_second)
+            if config.wf_requests_per_second else None
+        )
+        self._mirror = (
+            TreeMirror(config.snapshot_interval_seconds)
+            if config.use_tree_mirror else None
+        )
+        self._watermarks = DialogWatermarks() if config.incremental else None
+        self._context = ContextBuilder(config.dialog_max_context_tokens)
+        self.classifier = TaskClassifier(overrides=config.autonomy_rules)
+        log.info("Autonomy classifier: %d rules, %s", len(self.classifier.rules), self.classifier.engine)
+        self.tasks = TaskParser(self.classifier, config.task_memo_size)
+        self.schedule = SchedulingPolicy.from_config(config.scheduling)
+        # max_concurrent_tasks is the worker count; agents with their own cap gate items
+        self._agent_sems = {
+            name: asyncio.Semaphore(limit)
+            for name, limit in config.agent_concurrency.items()
+        }
+        self._wf = None  # reader used by workers: the client or the tree mirror
+        self.writes = WriteCoalescer(attempts=config.write_attempts) if config.coalesce_writes else None
+        self._pending_writes: dict[str, tuple] = {}   # task_id → (future, done, failed), handed off by a worker
+        self._settling: set[asyncio.Task] = set()
+        self._stopping = False   # workers are being cancelled: a cancel is a shutdown, not a lost lease
+        self.batcher = GreenBatcher(
+            batches, self.store,
+            model=config.batch_model,
+            system_prompt=config.batch_system_prompt,
+            max_tokens=config.batch_max_tokens,
+            min_size=config.batch_min_size,
+            max_wait=config.batch_max_wait_seconds,
+        ) if config.batch_green and batches else None
+
+        # Restore state from a previous run
+        self._interrupted_streams: dict[str, dict] = {}   # task_id → dispatch, settled on the first scan
+        for record in self.store.recover():
+            if record["phase"] == "streaming":
+                self._interrupted_streams[record["task_id"]] = record
+                log.warning("Task %s was interrupted mid-stream; will settle its reply on next scan",
+                            record["task_id"][:8])
+            else:
+                log.warning("Task %s was interrupted mid-write; will finish on next pickup", record["task_id"][:8])
+        for tid, retry_after in self.store.pending_retries().items():
+            self._queue.defer(tid, retry_after - time.time())
+
+    def close(self):
+        self.store.close()
+        if self.leases:
+            self.leases.close()
+
+    def _record(self, entry: dict):
+        """Append a digest entry."""
+        self.store.record_result(entry)
+
+    def _defer(self, task_id: str, seconds: float):
+        """Back off a failed task, in memory and in the store; other nodes wait too."""
+        self._queue.defer(task_id, seconds)
+        self.store.set_retry(task_id, time.time() + seconds)
+        if self.leases:
+            self.leases.renew(task_id, self.node_id, seconds)   # the lease expires at the retry time
+
+    def _retry_delay(self, task_id: str, error: BaseException) -> float:
+        """
+        Jittered exponential backoff by attempt number, never shorter than
+        what the provider asked for in retry-after.
+        """
+        delay = backoff_delay(
+            self.store.attempts(task_id) + 1,
+            base=self.config.retry_base_seconds,
+            cap=self.config.retry_max_seconds,
+        )
+        return max(delay, retry_after_of(error) or 0.0)
+
+    def _wf_client(self) -> WorkFlowyClient:
+        return WorkFlowyClient(
+            self.config.api_key,
+            max_concurrency=self.config.wf_max_concurrency,
+            budget=self._wf_budget,
+            cache=self.config.wf_cache,
+            http_client=self.http.client(
+                "workflowy", max_connections=self.config.wf_max_concurrency, timeout=30.0,
+            ) if self.http else None,
+        )
+
+    async def _reader(self, wf: WorkFlowyClient):
+        """The tree mirror bound to this tick's client, or the client itself."""
+        if self._mirror and await self._mirror.sync(
+            wf, watch=[self.config.backlog_node_id], depth=self.config.dialog_depth + 1,   # tasks + dialogs
+        ):
+            return self._mirror
+        return wf
 
     async def run_forever(self):
-        """Main loop — poll and process."""
+        """Main loop — scanner polls on an adaptive cadence or when woken, workers drain the queue."""
         self._running = True
-        log.info("Orchestrator starting. Poll interval: %ds", self.config.poll_interval_seconds)
-
-        while self._running:
+        if self.config.adaptive_poll:
+            log.info("Orchestrator starting. Poll interval: %g–%gs, workers: %d",
+                     self.config.poll_min_seconds, self.config.poll_max_seconds,
+                     self.config.max_concurrent_tasks)
+        else:
+            log.info("Orchestrator starting. Poll interval: %ds, workers: %d",
+                     self.config.poll_interval_seconds, self.config.max_concurrent_tasks)
+
+        async with self._wf_client() as client, wake_sources(
+            self.poller.wake, port=self.config.wake_port, wake_file=self.config.wake_file,
+            sigusr1=self.config.wake_signal,
+        ):
+            workers = self._start_workers()
             try:
-                await self.tick()
-            except Exception as e:
-                log.error("Tick failed: %s", e, exc_info=True)
-
-            await asyncio.sleep(self.config.poll_interval_seconds)
+                while self._running:
+                    started = time.monotonic()
+                    try:
+                        await self.scan(client)
+                    except Exception as e:
+                        log.error("Tick failed: %s", e, exc_info=True)
+
+                    if self.config.adaptive_poll:
+                        active = time.time() - self._last_activity < self.config.poll_active_window_seconds
+                        interval = self.poller.update(active)
+                        log.info("Next scan in %gs (%s)", interval, "active" if active else "idle")
+                    else:
+                        interval = self.config.poll_interval_seconds
+                    elapsed = time.monotonic() - started
+                    reason = await self.poller.sleep(interval - elapsed)
+                    if reason and self._running:
+                        log.info("Woken by %s", reason)
+                        self._last_activity = time.time()
+            finally:
+                await self._stop_workers(workers)
+
+    def stop(self):
+        self._running = False
+        self.poller.wake("stop")
 
     async def tick(self):
-        """Single orchestration cycle."""
+        """Single orchestration cycle: scan, then wait until the queue drains."""
+        async with self._wf_client() as client:
+            workers = self._start_workers()
+            try:
+                await self.scan(client)
+                await self._queue.join()
+            finally:
+                await self._stop_workers(workers)
+
+    async def scan(self, client: WorkFlowyClient):
+        """Producer: find actionable work and enqueue it as soon as it's seen."""
         self._tick_count += 1
+        self._scan_started = time.time()
         log.info("─── Tick #%d ───", self._tick_count)
-
-        async with WorkFlowyClient(self.config.api_key) as wf:
-            dm = DialogManager(wf)
-
-            # 1. Scan for actionable tasks
-            tasks = await self._scan_tasks(wf)
-            log.info("Found %d tasks total", len(tasks))
-
-            agent_tasks = [t for t in tasks if t.assignee == "agent" and t.status == "backlog"]
-            log.info("  → %d assigned to agent in backlog", len(agent_tasks))
-
-            # 2. Check dialogs awaiting agent response
-            dialog_pending = await dm.find_pending_dialogs(
-                self.config.backlog_node_id,
-                depth=self.config.dialog_depth,
-            )
-            log.info("  → %d dialogs awaiting agent", len(dialog_pending))
-
-            # 3. Process new tasks
-            for task in agent_tasks:
-                await self._process_new_task(wf, dm, task)
-
-            # 4. Process pending dialogs (human replied, agent should act)
-            for dialog in dialog_pending:
-                task = Task.from_item(
-                    await wf.get_item(dialog.task_id)
-                )
-                task.dialog = dialog
-                await self._process_dialog(wf, dm, task)
-
-            # 5. Check for stale dialogs
-            stale = await dm.find_stale_dialogs(
-                self.config.backlog_node_id,
-                stale_hours=self.config.stale_hours,
-                depth=self.config.dialog_depth,
-            )
-            if stale:
-                log.warning("%d stale dialogs (>%dh)", len(stale), self.config.stale_hours)
-                for d in stale:
-                    self._results.append({
-                        "type": "stale",
-                        "task": d.task_name,
-                        "task_id": d.task_id,
-                        "last_speaker": d.last_speaker.value if d.last_speaker else "?",
-                    })
+        requests_before, hits_before = client.request_count, client.cache_hits
+        parsed_before = (self.tasks.hits, self.tasks.misses)
+        client.reset_cache()
+
+        if self._watermarks and self._tick_count % self.config.full_rescan_ticks == 0:
+            log.info("Full rescan: dropping dialog watermarks")
+            self._watermarks.clear()
+
+        wf = await self._reader(client)
+        self._wf = wf
+        if self._interrupted_streams:
+            await self._settle_streams(wf)
+        dm = DialogManager(wf, watermarks=self._watermarks)
+
+        # 1. Scan for actionable tasks
+        tasks = await self._scan_tasks(wf)
+        log.info("Found %d tasks total", len(tasks))
+
+        agent_tasks = [t for t in tasks if t.assignee == "agent" and t.status == "backlog"]
+        direct = agent_tasks
+        if self.batcher:
+            batched = sum(self._collect_for_batch(t) for t in agent_tasks if self._batchable(t))
+            direct = [t for t in agent_tasks if not self.batcher.owns(t.item.id)]
+            log.info("  → %d GREEN tasks collected for batch", batched)
+        queued = sum(self._queue.put(self._work_item("task", t.item.id, t)) for t in direct)
+        log.info("  → %d assigned to agent in backlog (%d queued)", len(agent_tasks), queued)
+
+        if self.batcher:
+            await self.batcher.submit_due()
+            results = await self.batcher.poll()
+            queued = sum(self._queue.put(self._work_item("batch", r.task_id, r)) for r in results)
+            if results:
+                log.info("  → %d batch results (%d queued)", len(results), queued)
+
+        # 2. Classify dialogs: one subtree fetch per task
+        scan = await dm.scan_dialogs(
+            self.config.backlog_node_id,
+            depth=self.config.dialog_depth,
+            stale_hours=self.config.stale_hours,
+        )
+        queued = sum(self._queue.put(self._work_item("dialog", d.task_id, d)) for d in scan.pending)
+        for d in scan.dialogs:
+            last = d.last_message
+            if d.state != DialogState.RESOLVED and last and last.timestamp:
+                self._last_activity = max(self._last_activity, last.timestamp.timestamp())
+        log.info("  → %d dialogs awaiting agent (%d queued)", len(scan.pending), queued)
+
+        # 3. Report stale dialogs (pending ones are being answered)
+        stale = [d for d in scan.stale if d.state != DialogState.AWAITING_AGENT]
+        if stale:
+            log.warning("%d stale dialogs (>%dh)", len(stale), self.config.stale_hours)
+            for d in stale:
+                self._record({
+                    "type": "stale",
+                    "task": d.task_name,
+                    "task_id": d.task_id,
+                    "last_speaker": d.last_speaker.value if d.last_speaker else "?",
+                })
+
+        hits, misses = self.tasks.hits - parsed_before[0], self.tasks.misses - parsed_before[1]
+        log.info("Tick #%d: %d WorkFlowy requests, %d cache hits, queue %d/%d active (%d parked), "
+                 "tasks parsed %d (memo %d/%d, %.0f%% total)",
+                 self._tick_count, client.request_count - requests_before,
+                 client.cache_hits - hits_before, self._queue.depth, self._queue.active, self._queue.parked,
+                 misses, hits, hits + misses, self.tasks.hit_rate() * 100)
+        if self._watermarks:
+            log.info("  watermarks (total): %d hits, %d misses",
+                     self._watermarks.hits, self._watermarks.misses)
+        if self.http:
+            log.info("  http: %s", self.http.metrics())
+        if self.response_cache:
+            log.info("  response cache: %s", self.response_cache.stats())
+        if self.limits:
+            log.info("  rate limits: %s", self.limits.snapshot())
+        if self.slots:
+            log.info("  shared agent slots: %s", self.slots.snapshot())
+        if self.leases:
+            log.info("  leases (node %s): %s", self.node_id, dict(self.lease_stats))
+        if self.writes and self.writes.stats:
+            log.info("  writes: %s", self.writes.snapshot())
+        backends = self.agents.backend_stats
+        if backends.snapshot():
+            log.info("  backends: %s (failovers %d, hedges %d)",
+                     backends.snapshot(), backends.failovers, backends.hedges)
+        if self.batcher:
+            log.info("  batches: %s", self.batcher.snapshot())
+        if self._context.trimmed:
+            log.info("  dialog context: %s", self._context.snapshot())
+        if self.usage and self.usage.models:
+            log.info("  tokens: %s", self.usage.snapshot())
+
+    # ── WORKERS ──────────────────────────────────────────
+
+    def _start_workers(self) -> list[asyncio.Task]:
+        self._stopping = False
+        return [
+            asyncio.create_task(self._worker(n))
+            for n in range(self.config.max_concurrent_tasks)
+        ]
+
+    async def _stop_workers(self, workers: list[asyncio.Task]):
+        if self._settling:
+            await asyncio.gather(*self._settling, return_exceptions=True)   # let write-backs land
+        self._stopping = True
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _worker(self, n: int):
+        """Consumer: process queued items until cancelled."""
+        while True:
+            item = await self._queue.get()
+            log.debug("Worker %d: %s %s after %.1fs in queue", n, item.kind, item.task_id[:8],
+                      time.time() - item.enqueued_at)
+            agent_name = self._item_agent(item)
+            sem = self._agent_sems.get(agent_name)
+            if sem is not None and sem.locked():
+                self._queue.park(item, agent_name)   # take the next item; back when a slot frees
+                continue
+            stopped = False   # half-way: nothing more is written, the lease is not finished
+            try:
+                if not self._claim(item.task_id, self.config.lease_ttl_seconds, item.seen_at):
+                    if item.kind == "batch":
+                        self.batcher.finish(item.task_id)   # the other node owns the write-back
+                    continue
+                dm = DialogManager(self._wf, watermarks=self._watermarks)
+                async with self._heartbeat(item.task_id):
+                    if item.kind == "task":
+                        await self._process_new_task(self._wf, dm, item.payload)
+                    elif item.kind == "batch":
+                        await self._process_batch_result(self._wf, dm, item.payload)
+                    else:
+                        await self._dispatch_dialog(self._wf, dm, item.payload)
+                if item.kind != "batch":
+                    self._last_activity = time.time()   # a reply was written; expect an answer
+            except LeaseLost:
+                stopped = True
+            except asyncio.CancelledError:
+                stopped = True
+                raise
+            except Exception as e:
+                log.error("Worker %d failed on %s: %s", n, item.task_id[:8], e, exc_info=True)
+                self._defer(item.task_id, self._retry_delay(item.task_id, e))
+            finally:
+                pending = self._pending_writes.pop(item.task_id, None)
+                if stopped:
+                    if pending:
+                        pending[0].cancel()   # writes not yet applied are dropped
+                    self._release_unfinished(item)
+                elif pending:
+                    settle = asyncio.create_task(self._settle(item, *pending))
+                    self._settling.add(settle)
+                    settle.add_done_callback(self._settling.discard)
+                else:
+                    self._finish_item(item)
+
+    def _claim(self, task_id: str, ttl: float, seen_at: Optional[float] = None) -> bool:
+        """Take the task's lease; False if another node has it or finished it after seen_at."""
+        if not self.leases:
+            return True
+        if self.leases.claim(task_id, self.node_id, ttl, seen_at):
+            self.lease_stats["claimed"] += 1
+            return True
+        self.lease_stats["skipped"] += 1
+        log.debug("Skipping %s: leased by %s", task_id[:8],
+                  self.leases.owner(task_id) or "a node that finished it after this scan")
+        return False
+
+    @contextlib.asynccontextmanager
+    async def _heartbeat(self, task_id: str):
+        """
+        Renew the task's lease while the body runs. If the lease is lost the
+        body is cancelled and LeaseLost raised in its place.
+        """
+        if not self.leases:
+            yield
+            return
+        ttl = self.config.lease_ttl_seconds
+        body = asyncio.current_task()
+        lost = False
+
+        async def beat():
+            nonlocal lost
+            while True:
+                await asyncio.sleep(ttl / 3)
+                if not self.leases.renew(task_id, self.node_id, ttl):
+                    self.lease_stats["lost"] += 1
+                    log.warning("Lease on %s lost to another node, stopping", task_id[:8])
+                    lost = True
+                    body.cancel()
+                    return
+
+        beating = asyncio.create_task(beat())
+        try:
+            yield
+        except asyncio.CancelledError:
+            if lost and not self._stopping:   # our own cancel, not a shutdown
+                raise LeaseLost(task_id) from None
+            raise
+        finally:
+            beating.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await beating
 
     async def _scan_tasks(self, wf: WorkFlowyClient) -> list[Task]:
         """Scan the backlog node for tasks."""
         children = await wf.list_children(self.config.backlog_node_id)
-        return [Task.from_item(c) for c in children if not c.is_completed]
+        return [self.tasks.parse(c) for c in children if not c.is_completed]
 
     async def _process_new_task(
         self, wf: WorkFlowyClient, dm: DialogManager, task: Task
     ):
         """Process a new task that hasn't been started yet."""
         tid = task.item.id
-        if tid in self._in_flight:
-            return
-        retry_after = self._failed.get(tid, 0)
-        if time.time() < retry_after:
-            return
-        self._in_flight.add(tid)
-        log.info("Processing new task: %s [%s]", task.item.name, task.autonomy.value)
-
-        agent_func = self._select_agent(task)
+        agent_name = self._select_agent_name(task)
+        agent_func = self.agents.get(agent_name) if agent_name else None
         if not agent_func:
             log.warning("No agent available for: %s", task.item.name)
             return
 
-        # Build context from task name + note + any existing children
-        context = f"Task: {task.item.name}"
-        if task.item.note:
-            context += f"\nNote: {task.item.note}"
+        record = self.store.dispatch(tid)
+        if record and record["kind"] == "task" and record["phase"] == "writing":
+            if await self._finish_interrupted(wf, dm, task):
+                return
+
+        log.info("Processing new task: %s [%s]", task.item.name, task.autonomy.value)
+
+        context = self._task_context(task)
 
+        # RED: the agent prepares materials and asks for a decision
+        header = "Подготовил материал. Нужно твоё решение:\n" if task.autonomy == Autonomy.RED else ""
+        writer = self._stream_writer(dm, agent_func, tid, tid, header)
+
+        self.store.begin_dispatch(tid, "task", agent_name, task.autonomy.value,
+                                  reply_parent=writer.parent_id if writer else None)
         try:
-            # Run agent
-            response = await agent_func(task, context)
+            # Run agent (a streaming agent writes its reply as it goes)
+            response = await self._call_agent(agent_name, agent_func, task, context, writer)
 
             # Write response based on autonomy level
-            if task.autonomy == Autonomy.GREEN:
-                # Do it, mark done
-                await dm.agent_start(task.item.id, response)
-                await wf.edit_item(task.item.id, name=_set_tag(task.item.name, "status", "done"))
-                await wf.complete_item(task.item.id)
-                log.info("  🟢 Auto-completed: %s", task.item.name)
-
-            elif task.autonomy == Autonomy.YELLOW:
-                # Do it, put on review
-                await dm.agent_start(task.item.id, response)
-                await wf.edit_item(task.item.id, name=_set_tag(task.item.name, "status", "review"))
-                log.info("  🟡 On review: %s", task.item.name)
-
-            elif task.autonomy == Autonomy.RED:
-                # Prepare, ask for decision
-                question = f"Подготовил материал. Нужно твоё решение:\n{response}"
-                await dm.agent_start(task.item.id, question)
-                await wf.edit_item(task.item.id, name=_set_tag(task.item.name, "status", "blocked"))
-                log.info("  🔴 Escalated: %s", task.item.name)
-
-            self._results.append({
-                "type": "processed",
-                "task": task.item.name,
-                "autonomy": task.autonomy.value,
-            })
+            self.store.set_phase(tid, "writing")
+            mutations = [] if writer else [Mutation.create(tid, f"{Speaker.AGENT.value} {header}{response}")]
+            await self._write_back(
+                wf, tid, mutations + _status_mutations(task),
+                done=lambda: self._task_written(task),
+                failed=lambda e: self._task_failed(task, e),
+            )
 
+        except (LeaseLost, asyncio.CancelledError):
+            # stopped: leave no half-written reply; the retry or the new owner answers
+            if writer and self.store.dispatch(tid)["phase"] == "streaming":
+                self.store.set_phase(tid, "failed")
+                await writer.discard()
+            raise
         except Exception as e:
-            err_msg = str(e)
-            log.error("Agent failed on %s: %s", task.item.name, err_msg)
-            # Backoff: 60s for rate limits, 30s for other errors
-            backoff = 60 if "limit" in err_msg.lower() else 30
-            self._failed[tid] = time.time() + backoff
-            log.info("Will retry %s in %ds", task.item.name[:40], backoff)
-            self._results.append({
-                "type": "error",
-                "task": task.item.name,
-                "error": err_msg[:200],
-            })
+            if self.store.dispatch(tid)["phase"] in ("running", "streaming"):
+                self.store.set_phase(tid, "failed")
+                if writer:
+                    await writer.discard()
+            self._task_failed(task, e)
+
+    def _task_written(self, task: Task, via: str = ""):
+        """Bookkeeping once a task's reply and status are in the tree."""
+        log.info("  %s%s: %s", STATUS_LOG[task.autonomy], via, task.item.name)
+        self.store.set_phase(task.item.id, "done")
+        self.store.clear_retry(task.item.id)
+        self._record({
+            "type": "processed",
+            "task": task.item.name,
+            "autonomy": task.autonomy.value,
+        })
+
+    def _task_failed(self, task: Task, error: Exception):
+        err_msg = str(error)
+        log.error("Agent failed on %s: %s", task.item.name, err_msg)
+        backoff = self._retry_delay(task.item.id, error)
+        self._defer(task.item.id, backoff)
+        log.info("Will retry %s in %ds%s", task.item.name[:40], backoff,
+                 " (rate limited)" if isinstance(error, RateLimited) else "")
+        self._record({
+            "type": "error",
+            "task": task.item.name,
+            "error": err_msg[:200],
+        })
+
+    async def _process_batch_result(self, wf: WorkFlowyClient, dm: DialogManager, result: BatchResult):
+        """Write back a GREEN task answered in a message batch."""
+        tid = result.task_id
+        try:
+            task = self.tasks.parse(await wf.get_item(tid))
+            if task.item.is_completed or task.status != "backlog" or not self._batchable(task):
+                log.info("Dropping batch result for %s: task changed meanwhile", task.item.name[:40])
+                return
+
+            record = self.store.dispatch(tid)
+            if record and record["kind"] == "task" and record["phase"] == "writing":
+                if await self._finish_interrupted(wf, dm, task):
+                    return
+
+            if result.error:
+                log.error("Batch failed on %s: %s", task.item.name, result.error)
+                backoff = self._retry_delay(tid, RuntimeError(result.error))
+                self._defer(tid, backoff)
+                self._record({"type": "error", "task": task.item.name, "error": f"batch: {result.error}"[:200]})
+                return
+
+            log.info("Processing batch result: %s", task.item.name)
+            self.store.begin_dispatch(tid, "task", "batch", task.autonomy.value)
+            self.store.set_phase(tid, "writing")
+            await self._write_back(
+                wf, tid, [Mutation.create(tid, f"{Speaker.AGENT.value} {result.response}")] + _status_mutations(task),
+                done=lambda: self._task_written(task, " (batch)"),
+                failed=lambda e: self._task_failed(task, e),
+            )
         finally:
-            self._in_flight.discard(tid)
+            # handled either way: written, dropped, or back to collection after backoff
+            self.batcher.finish(tid)
 
     async def _process_dialog(
         self, wf: WorkFlowyClient, dm: DialogManager, task: Task
@@ -322,64 +854,338 @@ class Orchestrator:
         if not dialog:
             return
         tid = dialog.task_id
-        if tid in self._in_flight:
-            return
-        if time.time() < self._failed.get(tid, 0):
-            return
-        self._in_flight.add(tid)
-        log.info("Processing dialog reply for: %s", dialog.task_name)
-
-        agent_func = self._select_agent(task)
+        agent_name = self._select_agent_name(task)
+        agent_func = self.agents.get(agent_name) if agent_name else None
         if not agent_func:
             return
 
-        # Build full context: task + dialog history
-        context = f"Task: {dialog.task_name}\n\nDialog history:\n{dialog.context_for_agent()}"
+        log.info("Processing dialog reply for: %s", dialog.task_name)
+
+        context = self._dialog_context(dialog, getattr(agent_func, "system_prompt", None) or "")
 
-        last_human_msg = dialog.last_message
-        if last_human_msg:
-            context += f"\n\nLatest human message: {last_human_msg.text}"
-            context += "\n\nRespond to the human's latest message."
+        writer = self._stream_writer(dm, agent_func, tid, dm.reply_parent(dialog))
 
+        self.store.begin_dispatch(tid, "dialog", agent_name,
+                                  reply_parent=writer.parent_id if writer else None)
         try:
-            response = await agent_func(task, context)
-            await dm.agent_reply(dialog, response)
+            response = await self._call_agent(agent_name, agent_func, task, context, writer)
+            self.store.set_phase(tid, "writing")
+            mutations = [] if writer else [
+                Mutation.create(dm.reply_parent(dialog), f"{Speaker.AGENT.value} {response}")
+            ]
+            await self._write_back(
+                wf, tid, mutations,
+                done=lambda: self._dialog_written(dialog),
+                failed=lambda e: self._dialog_failed(dialog, e),
+            )
+        except (LeaseLost, asyncio.CancelledError):
+            # stopped: leave no half-written reply; the retry or the new owner answers
+            if writer and self.store.dispatch(tid)["phase"] == "streaming":
+                self.store.set_phase(tid, "failed")
+                await writer.discard()
+            raise
+        except Exception as e:
+            if self.store.dispatch(tid)["phase"] in ("running", "streaming"):
+                self.store.set_phase(tid, "failed")
+                if writer:
+                    await writer.discard()
+            self._dialog_failed(dialog, e)
+
+    def _dialog_written(self, dialog: Dialog):
+        self.store.set_phase(dialog.task_id, "done")
+        self.store.clear_retry(dialog.task_id)
+        self._record({
+            "type": "dialog_reply",
+            "task": dialog.task_name,
+        })
+
+    def _dialog_failed(self, dialog: Dialog, error: Exception):
+        log.error("Agent dialog failed on %s: %s", dialog.task_name[:40], error)
+        self._defer(dialog.task_id, self._retry_delay(dialog.task_id, error))
+
+    async def _write_back(
+        self, wf, task_id: str, mutations: list[Mutation],
+        done: Callable[[], None], failed: Callable[[Exception], None],
+    ):
+        """
+        Apply a task's writes, then `done()`; `failed(error)` if one fails.
+        With the coalescer the worker returns at once and the item stays
+        active (queue, lease) until the writes land; without it they are
+        applied here, in order. Nothing is written once the lease is gone.
+        """
+        if self.leases and not self.leases.renew(task_id, self.node_id, self.config.lease_ttl_seconds):
+            self.lease_stats["lost"] += 1
+            log.warning("Lease on %s lost to another node, not writing back", task_id[:8])
+            raise LeaseLost(task_id)
+        if self.writes is None:
+            for m in mutations:
+                await apply_mutation(wf, m)
+            self._written(task_id)
+            done()
+            return
+        self._pending_writes[task_id] = (self.writes.submit(wf, task_id, mutations), done, failed)
+
+    def _written(self, task_id: str):
+        if self._watermarks:
+            self._watermarks.invalidate(task_id)   # our reply changed the dialog
 
-            self._results.append({
-                "type": "dialog_reply",
-                "task": dialog.task_name,
-            })
+    async def _settle(self, item: WorkItem, writes: asyncio.Future, done, failed):
+        """Wait for an item's write-back off the worker, then let the task go."""
+        try:
+            async with self._heartbeat(item.task_id):
+                await writes
+            self._written(item.task_id)
+            done()
+        except LeaseLost:
+            writes.cancel()   # writes not yet applied are dropped
+            self._release_unfinished(item)
+            return
+        except asyncio.CancelledError:
+            writes.cancel()
+            self._release_unfinished(item)
+            raise
         except Exception as e:
-            err_msg = str(e)
-            log.error("Agent dialog failed on %s: %s", dialog.task_name[:40], err_msg)
-            backoff = 60 if "limit" in err_msg.lower() else 30
-            self._failed[tid] = time.time() + backoff
+            failed(e)
+        self._finish_item(item)
+
+    def _finish_item(self, item: WorkItem):
+        if self.leases and not self._queue.backing_off(item.task_id):
+            self.leases.release(item.task_id, self.node_id, finished=True)
+        self._queue.done(item)
+
+    def _release_unfinished(self, item: WorkItem):
+        """Let go of an item stopped half-way, so another node (or a restart) takes it up."""
+        if self.leases:
+            self.leases.release(item.task_id, self.node_id, finished=False)
+        self._queue.done(item)
+
+    async def _call_agent(
+        self,
+        agent_name: str,
+        agent_func: AgentFunc,
+        task: Task,
+        context: str,
+        writer: Optional[ThrottledWriter] = None,
+    ) -> str:
+        """
+        Run the agent in its slot and record its latency. With a writer,
+        the agent's stream is fed into it and the reply is already posted
+        when this returns.
+        """
+        async with self._agent_slot(agent_name):
+            started = time.monotonic()
+            ok = False
+            try:
+                if writer is None:
+                    response = await agent_func(task, context)
+                else:
+                    async for chunk in agent_func.stream(task, context):
+                        await writer.feed(chunk)
+                    response = await writer.finish()
+                    log.info("  streamed reply: first output after %.1fs, %d edits",
+                             writer.first_write_at - started, writer.edits)
+                ok = True
+                return response
+            finally:
+                self.store.record_latency(agent_name, time.monotonic() - started, ok)
+
+    def _stream_writer(
+        self, dm: DialogManager, agent_func: AgentFunc, task_id: str, parent_id: str, header: str = "",
+    ) -> Optional[ThrottledWriter]:
+        """A writer for the reply if streaming is enabled and the agent can stream."""
+        if not (self.config.stream_replies and getattr(agent_func, "stream", None)):
+            return None
+        return dm.stream_reply(
+            task_id, parent_id, header, self.config.stream_edit_interval,
+            on_create=lambda item_id: self.store.set_reply(task_id, item_id),
+        )
+
+    async def _settle_streams(self, wf):
+        """
+        Dispatches a crash cut off mid-stream. A reply that streamed to the
+        end is kept: the task gets its status on pickup, a dialog is done.
+        A partial reply (still ending in the cursor) is removed, so the
+        task or dialog is answered again with exactly one reply.
+        """
+        for tid, record in list(self._interrupted_streams.items()):
+            try:
+                reply = await self._streamed_reply(wf, record)
+                if reply is not None and not reply.name.endswith(CURSOR):
+                    self.store.set_phase(tid, "writing" if record["kind"] == "task" else "done")
+                    log.info("  ↺ Kept streamed reply of %s", tid[:8])
+                else:
+                    if reply is not None:
+                        await wf.delete_item(reply.id)
+                        log.info("  ↺ Removed partial streamed reply of %s", tid[:8])
+                    self.store.set_phase(tid, "failed")
+                self._written(tid)
+                del self._interrupted_streams[tid]
+            except Exception as e:
+                log.warning("Could not settle interrupted stream of %s: %s", tid[:8], e)
+
+    @staticmethod
+    async def _streamed_reply(wf, record: dict) -> Optional[WFItem]:
+        """The 🤖 node a dispatch streamed into: by its recorded id, else a partial one under its parent."""
+        if record["reply_id"]:
+            try:
+                return await wf.get_item(record["reply_id"])
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    return None
+                raise
+        # created, but the crash came before its id was recorded
+        for child in await wf.list_children(record["reply_parent"]):
+            if child.name.startswith(Speaker.AGENT.value) and child.name.endswith(CURSOR):
+                return child
+        return None
+
+    async def _finish_interrupted(self, wf: WorkFlowyClient, dm: DialogManager, task: Task) -> bool:
+        """
+        A previous run crashed between the agent reply and the status write.
+        If the 🤖 reply is already under the task, finish the status write
+        instead of calling the agent again. Returns False if nothing was written.
+        """
+        tid = task.item.id
+        dialog = await dm.read_dialog(tid, depth=1)
+        if not any(m.speaker == Speaker.AGENT for m in dialog.messages):
+            return False
+
+        status = STATUS_AFTER[task.autonomy]
+        for m in _status_mutations(task):
+            await apply_mutation(wf, m)
+        self.store.set_phase(tid, "done")
+        log.info("  ↺ Finished interrupted write-back: %s [%s]", task.item.name, status)
+        self._record({
+            "type": "processed",
+            "task": task.item.name,
+            "autonomy": task.autonomy.value,
+        })
+        return True
+
+    async def _dispatch_dialog(
+        self, wf: WorkFlowyClient, dm: DialogManager, dialog: Dialog
+    ):
+        task = self.tasks.parse(await wf.get_item(dialog.task_id))
+        task.dialog = dialog
+        await self._process_dialog(wf, dm, task)
+
+    @contextlib.asynccontextmanager
+    async def _agent_slot(self, agent_name: str):
+        """Hold the agent's own slot if capped, and a shared slot if supervised."""
+        sem = self._agent_sems.get(agent_name)
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                if sem is not None:
+                    await stack.enter_async_context(sem)
+                if self.slots:
+                    await stack.enter_async_context(self.slots.slot(self.tenant))
+                yield
         finally:
-            self._in_flight.discard(tid)
+            if sem is not None:
+                self._queue.release(agent_name)   # items parked while the agent was full
 
-    def _select_agent(self, task: Task) -> Optional[AgentFunc]:
-        """Select the right agent for a task. Extend with routing logic."""
+    def _task_context(self, task: Task) -> str:
+        """Context for a new task: its name and note."""
+        context = f"Task: {task.item.name}"
+        if task.item.note:
+            context += f"\nNote: {task.item.note}"
+        return context
+
+    def _dialog_context(self, dialog: Dialog, system: str = "") -> PromptContext:
+        """
+        Task + dialog history within the token budget, less the agent's
+        system prompt. The header and the history lines form the stable,
+        cacheable prefix: the next turn only appends to it. The latest
+        message is the last history line, so it isn't repeated.
+        """
+        return self._context.build(
+            dialog,
+            header=f"Task: {dialog.task_name}\n\nDialog history:\n",
+            instruction="\nRespond to the latest message (the last line of the history above).",
+            system=system,
+        )
+
+    def _work_item(self, kind: str, task_id: str, payload) -> WorkItem:
+        """WorkItem with its scheduling key: tier, then waiting since minus boosts."""
+        since, autonomy, name = time.time(), None, ""
+        if kind == "task":
+            created = payload.item.created_at
+            since = created.timestamp() if created else since
+            autonomy, name = payload.autonomy.value, payload.item.name
+        elif kind == "dialog":
+            last = payload.last_message
+            since = last.timestamp.timestamp() if last and last.timestamp else since
+            name = payload.task_name
+        priority = self.schedule.key(kind, since, autonomy, name)
+        return WorkItem(kind, task_id, payload, priority=priority, seen_at=self._scan_started)
+
+    def _batchable(self, task: Task) -> bool:
+        """GREEN tasks for the default agent go through message batches when enabled."""
+        return (
+            self.batcher is not None
+            and task.autonomy == Autonomy.GREEN
+            and self._select_agent_name(task) == "default"
+        )
+
+    def _collect_for_batch(self, task: Task) -> bool:
+        """Hand a batchable task to the batcher unless it's queued, backing off or half-written."""
+        tid = task.item.id
+        if self._queue.is_active(tid) or self._queue.backing_off(tid):
+            return False
+        record = self.store.dispatch(tid)
+        if record and record["phase"] == "writing":
+            return False   # the direct path finishes the interrupted write
+        if not self._claim(tid, self._batch_lease_ttl(), self._scan_started):
+            return False
+        return self.batcher.collect(tid, self._task_context(task))
+
+    def _batch_lease_ttl(self) -> float:
+        """Leases of batched tasks are renewed once per tick, so they outlive the longest sleep."""
+        longest = self.config.poll_max_seconds if self.config.adaptive_poll else self.config.poll_interval_seconds
+        return 2 * longest + self.config.lease_ttl_seconds
+
+    def _select_agent_name(self, task: Task) -> Optional[str]:
+        """Pick the registry name of the agent for a task. Extend with routing logic."""
+        return self._agent_for_name(task.item.name)
+
+    def _item_agent(self, item: WorkItem) -> Optional[str]:
+        """Agent a queued item will call; None for batch results, which call none."""
+        if item.kind == "task":
+            return self._select_agent_name(item.payload)
+        if item.kind == "dialog":
+            return self._agent_for_name(item.payload.task_name)
+        return None
+
+    def _agent_for_name(self, task_name: str) -> Optional[str]:
         # For now: try specific agent tag, fallback to default
-        name_lower = task.item.name.lower()
+        name_lower = task_name.lower()
         for agent_name in self.agents.agents:
             if f"#{agent_name}" in name_lower:
-                return self.agents.get(agent_name)
+                return agent_name
 
         # Fallback to "default" agent
-        return self.agents.get("default")
+        return "default" if "default" in self.agents.agents else None
 
-    async def generate_digest(self) -> str:
+    async def generate_digest(self, since: Optional[float] = None, until: Optional[float] = None) -> str:
         """
-        Generate a morning digest from accumulated results.
+        Generate a morning digest from recorded results.
         Call this on schedule (e.g., every morning).
+
+        Without `since`, covers everything after the previous digest and
+        moves that marker forward; an explicit window leaves it alone.
         """
-        if not self._results:
+        advance = since is None
+        until = until if until is not None else time.time()
+        if since is None:
+            since = float(self.store.get_meta("last_digest_at") or 0)
+        results = self.store.results_between(since, until)
+        if not results:
             return "Ничего нового."
 
-        processed = [r for r in self._results if r["type"] == "processed"]
-        dialogs = [r for r in self._results if r["type"] == "dialog_reply"]
-        errors = [r for r in self._results if r["type"] == "error"]
-        stale = [r for r in self._results if r["type"] == "stale"]
+        processed = [r for r in results if r["type"] == "processed"]
+        dialogs = [r for r in results if r["type"] == "dialog_reply"]
+        errors = [r for r in results if r["type"] == "error"]
+        stale = [r for r in results if r["type"] == "stale"]
 
         lines = [f"📊 Дайджест — {datetime.now().strftime('%Y-%m-%d %H:%M')}"]
         lines.append("")
@@ -417,9 +1223,10 @@ class Orchestrator:
             for r in stale:
                 lines.append(f"  • {r['task']} (последний: {r['last_speaker']})")
 
-        # Clear results after digest
+        # Move the digest window past these results
         digest_text = "\n".join(lines)
-        self._results = []
+        if advance:
+            self.store.set_meta("last_digest_at", repr(until))
         return digest_text
 
     async def write_digest_to_wf(self):
@@ -429,7 +1236,7 @@ class Orchestrator:
             log.warning("No digest_node_id configured")
             return
 
-        async with WorkFlowyClient(self.config.api_key) as wf:
+        async with self._wf_client() as wf:
             await wf.create_item(
                 parent_id=self.config.digest_node_id,
                 name=digest.split("\n")[0],  # first line as title
@@ -441,6 +1248,19 @@ class Orchestrator:
 
 # ── HELPERS ──────────────────────────────────────────────
 
+# Status tag a task gets once its result is written, and how that's logged
+STATUS_AFTER = {Autonomy.GREEN: "done", Autonomy.YELLOW: "review", Autonomy.RED: "blocked"}
+STATUS_LOG = {Autonomy.GREEN: "🟢 Auto-completed", Autonomy.YELLOW: "🟡 On review", Autonomy.RED: "🔴 Escalated"}
+
+
+def _status_mutations(task: Task) -> list[Mutation]:
+    """GREEN: done and completed; YELLOW: on review; RED: blocked until a human decides."""
+    mutations = [Mutation.edit(task.item.id, name=_set_tag(task.item.name, "status", STATUS_AFTER[task.autonomy]))]
+    if task.autonomy == Autonomy.GREEN:
+        mutations.append(Mutation.complete(task.item.id))
+    return mutations
+
+
 def _set_tag(name: str, tag_key: str, tag_value: str) -> str:
     """Set or replace a #key:value tag in item name."""
     import re
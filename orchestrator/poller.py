@@ -0,0 +1,140 @@
+"""
+Adaptive scan cadence with external wake signals.
+
+The interval drops to `min_interval` while dialogs are active (a message
+within the active window, or a reply just written by an agent) and
+doubles after every idle tick up to `max_interval`. The sleep between
+scans ends early on a wake signal:
+
+  - SIGUSR1                      kill -USR1 <pid>
+  - a local HTTP endpoint        curl -X POST http://127.0.0.1:<port>/wake
+  - touching a file              touch <wake_file>
+
+Usage:
+    poller = AdaptivePoller(min_interval=30, max_interval=1800)
+    async with wake_sources(poller.wake, port=8765, wake_file="/tmp/orch.wake"):
+        while True:
+            await scan()
+            reason = await poller.sleep(poller.update(active))
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+from collections import Counter
+from typing import Callable, Optional
+
+log = logging.getLogger("poller")
+
+
+class AdaptivePoller:
+    """Next scan interval from recent activity; `wake()` cuts the sleep short."""
+
+    def __init__(self, min_interval: float = 30, max_interval: float = 1800):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = min_interval
+        self.wakes: Counter = Counter()
+        self._event = asyncio.Event()
+        self._reason: Optional[str] = None
+
+    def update(self, active: bool) -> float:
+        """Interval after a tick: the minimum if active, else doubled up to the maximum."""
+        if active:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return self.interval
+
+    def wake(self, reason: str = "manual"):
+        self.wakes[reason] += 1
+        self._reason = reason
+        self._event.set()
+
+    async def sleep(self, seconds: float) -> Optional[str]:
+        """Sleep up to `seconds`; the wake reason if woken early, else None."""
+        if not self._event.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._event.wait(), timeout=max(0.0, seconds))
+        if not self._event.is_set():
+            return None
+        self._event.clear()   # wakes that arrive during the next scan trigger one more
+        return self._reason
+
+
+async def _handle_http(wake: Callable[[str], None], reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readline(), timeout=5)
+        while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+            pass   # headers
+        parts = request.decode("latin-1").split()
+        if len(parts) >= 2 and parts[1].split("?")[0] == "/wake":
+            wake("http")
+            status, body = "200 OK", b"ok\n"
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _watch_file(wake: Callable[[str], None], path: str, check_every: float):
+    def mtime() -> Optional[float]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    seen = mtime()
+    while True:
+        await asyncio.sleep(check_every)
+        current = mtime()
+        if current is not None and current != seen:
+            wake("file")
+        seen = current
+
+
+@contextlib.asynccontextmanager
+async def wake_sources(
+    wake: Callable[[str], None],
+    port: Optional[int] = None,
+    wake_file: Optional[str] = None,
+    sigusr1: bool = True,
+    host: str = "127.0.0.1",
+    file_check_seconds: float = 1.0,
+):
+    """Wire SIGUSR1, an HTTP /wake endpoint and a wake file to `wake(reason)` while active."""
+    loop = asyncio.get_running_loop()
+    server = watcher = None
+    signalled = False
+    if sigusr1 and hasattr(signal, "SIGUSR1"):
+        try:
+            loop.add_signal_handler(signal.SIGUSR1, wake, "signal")
+            signalled = True
+        except (NotImplementedError, RuntimeError):
+            log.warning("SIGUSR1 wake-ups are not available in this event loop")
+    if port is not None:
+        server = await asyncio.start_server(
+            lambda r, w: _handle_http(wake, r, w), host, port)
+        log.info("Wake endpoint: http://%s:%d/wake", host, port)
+    if wake_file:
+        watcher = asyncio.create_task(_watch_file(wake, wake_file, file_check_seconds))
+        log.info("Wake file: %s", wake_file)
+    try:
+        yield
+    finally:
+        if watcher:
+            watcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await watcher
+        if server:
+            server.close()
+            await server.wait_closed()
+        if signalled:
+            loop.remove_signal_handler(signal.SIGUSR1)
@@ -0,0 +1,96 @@
+"""
+Prompt-prefix caching for the Claude API.
+
+A dialog prompt is the task, the whole dialog history and the latest
+human message; every turn resends all of it. With prompt caching the
+API reuses the processed prefix of an earlier request, so only the new
+part is paid in full (cache reads cost a tenth of input tokens).
+
+The orchestrator passes a PromptContext — still a plain str for agents
+that don't care — that knows which parts are stable (task header, one
+part per older dialog message) and which part is new on this turn. The
+Claude agent sends the stable parts as separate content blocks with a
+cache breakpoint on the last one; since the next turn only appends
+blocks, the API finds the previous turn's prefix among them. Once a long
+dialog is trimmed to its token budget, only a leading part of the
+history stays the same from turn to turn; `pinned` marks how many parts
+that is, and they get a breakpoint of their own.
+
+Usage:
+    context = PromptContext(["Task: ...\\n", "🤖 ...\\n", "👤 ...\\n"], "Respond to ...")
+    body["system"] = system_blocks(system_prompt)
+    body["messages"] = [{"role": "user", "content": message_content(context)}]
+    usage.record(model, data["usage"])
+"""
+
+from collections import Counter
+from typing import Union
+
+EPHEMERAL = {"type": "ephemeral"}
+
+
+class PromptContext(str):
+    """Context text that also remembers its stable prefix parts and volatile suffix."""
+
+    def __new__(cls, stable: list[str], volatile: str = "", pinned: int = 0):
+        context = super().__new__(cls, "".join(stable) + volatile)
+        context.stable = tuple(stable)
+        context.volatile = volatile
+        context.pinned = pinned   # leading stable parts that don't change between turns
+        return context
+
+
+def system_blocks(system_prompt: str, cache: bool = True) -> Union[str, list[dict]]:
+    """The system prompt as a cacheable block."""
+    if not cache:
+        return system_prompt
+    return [{"type": "text", "text": system_prompt, "cache_control": EPHEMERAL}]
+
+
+def message_content(context: str, cache: bool = True) -> Union[str, list[dict]]:
+    """
+    User message content: plain text, or for a PromptContext one block per
+    stable part (breakpoint on the last, and on the last pinned one)
+    followed by the volatile part.
+    """
+    parts = getattr(context, "stable", ())
+    stable = [part for part in parts if part]
+    if not cache or not stable:
+        return str(context)
+    blocks = [{"type": "text", "text": part} for part in stable]
+    pinned = sum(1 for part in parts[:getattr(context, "pinned", 0)] if part)
+    if pinned:
+        blocks[pinned - 1]["cache_control"] = EPHEMERAL
+    blocks[-1]["cache_control"] = EPHEMERAL
+    if context.volatile:
+        blocks.append({"type": "text", "text": context.volatile})
+    return blocks
+
+
+class TokenUsage:
+    """Input/output and cache-read/cache-write token totals per model."""
+
+    FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+    def __init__(self):
+        self.models: dict[str, Counter] = {}
+
+    def record(self, model: str, usage: dict):
+        totals = self.models.setdefault(model, Counter())
+        totals["calls"] += 1
+        for key in self.FIELDS:
+            totals[key] += usage.get(key) or 0
+
+    def snapshot(self) -> dict[str, dict]:
+        out = {}
+        for model, t in self.models.items():
+            prompt = t["input_tokens"] + t["cache_creation_input_tokens"] + t["cache_read_input_tokens"]
+            out[model] = {
+                "calls": t["calls"],
+                "input": t["input_tokens"],
+                "output": t["output_tokens"],
+                "cache_write": t["cache_creation_input_tokens"],
+                "cache_read": t["cache_read_input_tokens"],
+                "cache_hit": round(t["cache_read_input_tokens"] / prompt, 2) if prompt else 0.0,
+            }
+        return out
@@ -0,0 +1,252 @@
+"""
+Rate limiting primitives shared by the WorkFlowy client and agents.
+
+TokenBucket paces requests to one host. For LLM providers, agents hold an
+AdaptiveLimiter slot per call and report 429s as RateLimited; the
+orchestrator retries failed tasks with jittered exponential backoff.
+"""
+
+import asyncio
+import contextlib
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` requests per second, bursting up to `burst`.
+
+    Usage:
+        budget = TokenBucket(rate=5, burst=10)   # ~5 req/s per host
+        await budget.acquire()
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until `tokens` are available, then take them."""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+# ── PROVIDER RATE LIMITS ─────────────────────────────────
+
+class RateLimited(Exception):
+    """The provider refused the call (429/529, quota); retry after `retry_after` s if known."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class RateLimitInfo:
+    """What a provider's response headers say about its limits."""
+    retry_after: Optional[float] = None      # seconds, from retry-after
+    exhausted_for: Optional[float] = None    # seconds until a limit at 0 remaining resets
+    remaining: dict[str, int] = field(default_factory=dict)
+
+
+def _header_seconds(value: Optional[str]) -> Optional[float]:
+    """retry-after is either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _seconds_until(timestamp: Optional[str]) -> Optional[float]:
+    """anthropic-ratelimit-*-reset is an RFC 3339 timestamp."""
+    if not timestamp:
+        return None
+    try:
+        when = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def parse_rate_limit_headers(headers) -> RateLimitInfo:
+    """Read retry-after and anthropic-ratelimit-{requests,tokens,...}-{remaining,reset}."""
+    info = RateLimitInfo(retry_after=_header_seconds(headers.get("retry-after")))
+    for kind in ("requests", "tokens", "input-tokens", "output-tokens"):
+        remaining = headers.get(f"anthropic-ratelimit-{kind}-remaining")
+        if remaining is None or not remaining.isdigit():
+            continue
+        info.remaining[kind] = int(remaining)
+        if int(remaining) == 0:
+            reset = _seconds_until(headers.get(f"anthropic-ratelimit-{kind}-reset"))
+            if reset is not None:
+                info.exhausted_for = max(info.exhausted_for or 0.0, reset)
+    return info
+
+
+def retry_after_of(error: BaseException) -> Optional[float]:
+    """Server-requested delay carried by an error, if any."""
+    if isinstance(error, RateLimited):
+        return error.retry_after
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code in (429, 503, 529):
+        return parse_rate_limit_headers(error.response.headers).retry_after
+    return None
+
+
+def backoff_delay(attempt: int, base: float = 30.0, cap: float = 3600.0) -> float:
+    """
+    Exponential backoff with equal jitter for retry number `attempt` (1, 2, ...):
+    somewhere in [d/2, d] where d = min(cap, base * 2**(attempt-1)), so
+    tasks that failed together don't all come back at the same moment.
+    """
+    d = min(cap, base * 2 ** max(0, attempt - 1))
+    return d / 2 + random.uniform(0, d / 2)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for one provider/model, shared by every call to it.
+
+    Each success raises the limit by 1/limit (about +1 per round of calls);
+    a rate-limit response halves it and pauses new calls until the
+    provider's retry-after or reset time. Optionally also paced by a
+    requests-per-second TokenBucket.
+
+    Usage:
+        limiter = AdaptiveLimiter("anthropic/claude-sonnet", initial=4, maximum=16)
+        async with limiter.slot():
+            resp = await http.post(...)
+            limiter.observe(parse_rate_limit_headers(resp.headers))
+            if resp.status_code == 429:
+                raise RateLimited("429", limiter.retry_after)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float = 4,
+        minimum: float = 1,
+        maximum: float = 16,
+        decrease: float = 0.5,
+        requests_per_second: Optional[float] = None,
+    ):
+        self.name = name
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self.bucket = TokenBucket(requests_per_second) if requests_per_second else None
+        self.stats: Counter = Counter()
+        self._paused_until = 0.0
+        self._cond = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot; success/RateLimited adjust the limit."""
+        await self._acquire()
+        try:
+            yield
+        except RateLimited as e:
+            self.on_rate_limited(e.retry_after)
+            raise
+        else:
+            self.on_success()
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    async def _acquire(self):
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                self.stats["paused"] += 1
+                await asyncio.sleep(pause)
+                continue
+            async with self._cond:
+                if self.in_flight < max(1, int(self.limit)):
+                    self.in_flight += 1
+                    break
+                await self._cond.wait()
+        if self.bucket:
+            await self.bucket.acquire()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def on_success(self):
+        self.stats["ok"] += 1
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        self.stats["limited"] += 1
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self.pause(retry_after if retry_after is not None else 1.0)
+
+    def observe(self, info: RateLimitInfo):
+        """Pause ahead of time when the headers say a limit is used up."""
+        if info.exhausted_for:
+            self.pause(info.exhausted_for)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 1),
+            "in_flight": self.in_flight,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            **self.stats,
+        }
+
+
+class ProviderLimits:
+    """
+    One AdaptiveLimiter per (provider, model), configured per provider:
+
+        {"anthropic": {"initial": 4, "maximum": 16, "requests_per_second": 1}}
+    """
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = config or {}
+        self._limiters: dict[tuple[str, str], AdaptiveLimiter] = {}
+
+    def get(self, provider: str, model: str = "") -> AdaptiveLimiter:
+        key = (provider, model)
+        if key not in self._limiters:
+            settings = self.config.get(provider, {})
+            self._limiters[key] = AdaptiveLimiter(
+                f"{provider}/{model}" if model else provider,
+                initial=settings.get("initial", 4),
+                minimum=settings.get("minimum", 1),
+                maximum=settings.get("maximum", 16),
+                requests_per_second=settings.get("requests_per_second"),
+            )
+        return self._limiters[key]
+
+    def snapshot(self) -> dict[str, dict]:
+        return {limiter.name: limiter.snapshot() for limiter in self._limiters.values()}
@@ -0,0 +1,165 @@
+"""
+Content-addressed cache for agent responses (SQLite).
+
+The same context reaches the LLM again after a crash, after a failed
+task's backoff expires, or when a dialog is re-detected because its
+write-back failed. Responses are stored under a hash of (agent name,
+model, system prompt, context), expire after `ttl` seconds, and the
+least recently used entries are evicted past `max_entries`.
+
+Usage:
+    cache = ResponseCache("responses.db", ttl=24 * 3600)
+    agent = cached_agent(make_claude_agent(key), cache, "default")
+    ...
+    log.info("response cache: %s", cache.stats())
+"""
+
+import hashlib
+import json
+import logging
+import math
+import re
+import sqlite3
+import time
+from typing import Optional
+
+log = logging.getLogger("response_cache")
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    response    TEXT NOT NULL,
+    tokens      INTEGER NOT NULL,
+    created_at  REAL NOT NULL,
+    last_used   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used);
+"""
+
+
+_CYRILLIC = re.compile("[\u0400-\u04ff]")
+_ASTRAL = re.compile("[\U00010000-\U0010ffff]")   # emoji and the like
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token estimate by character class: ~4 ASCII characters per
+    token, ~1.4 Cyrillic characters per token, one token for any other
+    character and two for emoji. Errs high rather than low.
+    """
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    cyrillic = len(_CYRILLIC.findall(text))
+    astral = len(_ASTRAL.findall(text))
+    other = len(text) - ascii_chars - cyrillic - astral
+    return math.ceil(ascii_chars / 4 + cyrillic * 0.7 + other + astral * 2)
+
+
+def cache_key(agent_name: str, model: str, system_prompt: str, context: str) -> str:
+    raw = json.dumps([agent_name, model, system_prompt, context], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """TTL + LRU response store; pass ":memory:" for a per-process cache."""
+
+    def __init__(self, path: str = ":memory:", ttl: float = 24 * 3600, max_entries: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._db = sqlite3.connect(path)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self._db.execute(
+            "SELECT response, tokens, created_at FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[2] > self.ttl:
+            if row is not None:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+            self.misses += 1
+            return None
+        self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        self.hits += 1
+        self.tokens_saved += row[1]
+        return row[0]
+
+    def put(self, key: str, response: str, tokens: int):
+        """Store a response; `tokens` is what a hit on it saves (prompt + completion)."""
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, response, tokens, now, now),
+        )
+        self._evict(now)
+        self._db.commit()
+
+    def _evict(self, now: float):
+        self._db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        self._db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self) -> dict:
+        size = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses,
+                "tokens_saved": self.tokens_saved, "entries": size}
+
+    def close(self):
+        self._db.close()
+
+
+def cached_agent(agent, cache: ResponseCache, name: str):
+    """
+    Wrap an AgentFunc so identical calls are answered from `cache`.
+
+    The key uses the agent's `model` and `system_prompt` attributes when
+    the factory sets them. Error replies ("[ОШИБКА] ...") are not cached.
+    A streaming agent keeps its `.stream`; a hit is yielded as one chunk.
+    """
+    model = getattr(agent, "model", "")
+    system_prompt = getattr(agent, "system_prompt", "")
+
+    def store(key: str, context: str, response: str):
+        if response.strip() and not response.startswith("[ОШИБКА]"):
+            cache.put(key, response, estimate_tokens(system_prompt + context + response))
+
+    async def wrapper(task, context: str) -> str:
+        key = cache_key(name, model, system_prompt, context)
+        response = cache.get(key)
+        if response is None:
+            response = await agent(task, context)
+            store(key, context, response)
+        return response
+
+    wrapper.model = model
+    wrapper.system_prompt = system_prompt
+
+    stream = getattr(agent, "stream", None)
+    if stream is not None:
+        async def cached_stream(task, context: str):
+            key = cache_key(name, model, system_prompt, context)
+            response = cache.get(key)
+            if response is not None:
+                yield response
+                return
+            chunks = []
+            async for chunk in stream(task, context):
+                chunks.append(chunk)
+                yield chunk
+            store(key, context, "".join(chunks))
+
+        wrapper.stream = cached_stream
+
+    return wrapper
@@ -0,0 +1,66 @@
+"""
+Scheduling policy for the work queue.
+
+Every work item gets a sort key (tier, effective timestamp). The tier
+comes from its kind: a human waiting on a dialog reply is in tier 0 and
+goes ahead of every backlog task, however old. Within a tier the key is
+when somebody started waiting for the item (the task's created_at, the
+human's last dialog message) minus boosts, in seconds, for its kind, its
+autonomy level and an explicit #priority: tag. The queue serves the
+lowest key first.
+
+Because waiting time is part of the key, an older item overtakes a newer
+one in its tier with the same boosts, and a boost of 3600 means "as if it
+had waited an hour longer". The key is fixed at enqueue time, so the
+ready queue is an ordinary heap.
+
+Usage:
+    policy = SchedulingPolicy.from_config({"autonomy": {"red": 3600}})
+    key = policy.key("task", since=created_at, autonomy="red", name=task_name)
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+PRIORITY_TAG = re.compile(r"#priority:(\S+)", re.IGNORECASE)
+PRIORITY_LEVELS = {"urgent": 2, "high": 1, "normal": 0, "low": -1}
+
+
+def priority_level(name: str) -> float:
+    """Level of a #priority:urgent|high|normal|low (or numeric) tag; 0 without one."""
+    match = PRIORITY_TAG.search(name)
+    if not match:
+        return 0.0
+    value = match.group(1).lower()
+    if value in PRIORITY_LEVELS:
+        return PRIORITY_LEVELS[value]
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+@dataclass
+class SchedulingPolicy:
+    # A human waiting on a dialog reply goes ahead of the whole backlog
+    tiers: dict[str, int] = field(default_factory=lambda: {"dialog": 0, "task": 1, "batch": 1})
+    kinds: dict[str, float] = field(default_factory=lambda: {"dialog": 0.0, "task": 0.0, "batch": 0.0})
+    # RED tasks only prepare materials for a human decision: start them first
+    autonomy: dict[str, float] = field(default_factory=lambda: {"red": 1800.0, "yellow": 600.0, "green": 0.0})
+    priority: float = 3600.0   # per #priority level
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "SchedulingPolicy":
+        policy = cls()
+        policy.tiers.update(cfg.get("tiers", {}))
+        policy.kinds.update(cfg.get("kinds", {}))
+        policy.autonomy.update(cfg.get("autonomy", {}))
+        policy.priority = cfg.get("priority", policy.priority)
+        return policy
+
+    def key(self, kind: str, since: float, autonomy: Optional[str] = None, name: str = "") -> tuple[int, float]:
+        """(tier, effective timestamp) of a work item; lower is served first."""
+        boost = self.kinds.get(kind, 0.0) + self.autonomy.get(autonomy, 0.0)
+        boost += priority_level(name) * self.priority
+        return self.tiers.get(kind, max(self.tiers.values(), default=0)), since - boost
@@ -0,0 +1,260 @@
+"""
+Durable orchestrator state (SQLite).
+
+Keeps what used to live only in memory so a restart doesn't lose it:
+  - dispatch records: which task is being processed and how far it got
+  - retry-after times for failed tasks
+  - agent latencies
+  - digest entries, queryable by time window
+  - submitted message batches and the tasks in them
+
+WAL mode; ordinary writes are committed in batches, while dispatch phase
+changes are committed immediately because crash recovery depends on them.
+
+Usage:
+    store = StateStore("state.db")
+    store.record_result({"type": "processed", "task": "...", "autonomy": "green"})
+    entries = store.results_between(since, until)
+"""
+
+import json
+import sqlite3
+import time
+from typing import Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dispatches (
+    task_id     TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    agent       TEXT,
+    autonomy    TEXT,
+    phase       TEXT NOT NULL,   -- running | streaming | writing | done | failed
+    started_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    reply_parent TEXT,           -- where a streamed reply goes
+    reply_id    TEXT             -- the streamed 🤖 node, once created
+);
+CREATE TABLE IF NOT EXISTS retries (
+    task_id     TEXT PRIMARY KEY,
+    retry_after REAL NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS latencies (
+    id          INTEGER PRIMARY KEY,
+    agent       TEXT NOT NULL,
+    seconds     REAL NOT NULL,
+    ok          INTEGER NOT NULL,
+    at          REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id          INTEGER PRIMARY KEY,
+    at          REAL NOT NULL,
+    type        TEXT NOT NULL,
+    payload     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_at ON results(at);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id    TEXT PRIMARY KEY,
+    submitted_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_items (
+    task_id     TEXT PRIMARY KEY,
+    batch_id    TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key         TEXT PRIMARY KEY,
+    value       TEXT
+);
+"""
+
+
+class StateStore:
+    """SQLite-backed store; pass ":memory:" for a throwaway in-process store."""
+
+    def __init__(self, path: str = ":memory:", commit_every: int = 50, commit_interval: float = 5.0):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._db = sqlite3.connect(path)
+        self._db.row_factory = sqlite3.Row
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._migrate()
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def _migrate(self):
+        """Add columns that state files from older versions lack."""
+        columns = {r["name"] for r in self._db.execute("PRAGMA table_info(dispatches)")}
+        for column in ("reply_parent", "reply_id"):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE dispatches ADD COLUMN {column} TEXT")
+
+    def _write(self, sql: str, params: tuple = (), durable: bool = False):
+        self._db.execute(sql, params)
+        self._uncommitted += 1
+        if (
+            durable
+            or self._uncommitted >= self.commit_every
+            or time.monotonic() - self._last_commit >= self.commit_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """Commit any batched writes."""
+        if self._uncommitted:
+            self._db.commit()
+            self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    # ── DISPATCHES ────────────────────────────────────────
+
+    def begin_dispatch(
+        self, task_id: str, kind: str, agent: Optional[str], autonomy: Optional[str] = None,
+        reply_parent: Optional[str] = None,
+    ):
+        """Start a dispatch; with reply_parent the reply is streamed there and it starts 'streaming'."""
+        now = time.time()
+        self._write(
+            "INSERT OR REPLACE INTO dispatches "
+            "(task_id, kind, agent, autonomy, phase, started_at, updated_at, reply_parent) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (task_id, kind, agent, autonomy, "streaming" if reply_parent else "running", now, now, reply_parent),
+            durable=True,
+        )
+
+    def set_reply(self, task_id: str, reply_id: str):
+        """Remember the streamed reply node as soon as it exists."""
+        self._write(
+            "UPDATE dispatches SET reply_id = ?, updated_at = ? WHERE task_id = ?",
+            (reply_id, time.time(), task_id),
+            durable=True,
+        )
+
+    def set_phase(self, task_id: str, phase: str):
+        self._write(
+            "UPDATE dispatches SET phase = ?, updated_at = ? WHERE task_id = ?",
+            (phase, time.time(), task_id),
+            durable=True,
+        )
+
+    def dispatch(self, task_id: str) -> Optional[dict]:
+        row = self._db.execute("SELECT * FROM dispatches WHERE task_id = ?", (task_id,)).fetchone()
+        return dict(row) if row else None
+
+    def recover(self) -> list[dict]:
+        """
+        Call once at startup. Dispatches left 'running' never wrote anything
+        and are dropped. Those left 'writing' may be half-written, and those
+        left 'streaming' may have a partial 🤖 node under reply_parent: both
+        are returned (and kept) so the caller can finish them instead of
+        re-running.
+        """
+        self._write("DELETE FROM dispatches WHERE phase = 'running'", durable=True)
+        rows = self._db.execute("SELECT * FROM dispatches WHERE phase IN ('writing', 'streaming')").fetchall()
+        return [dict(r) for r in rows]
+
+    # ── RETRIES ───────────────────────────────────────────
+
+    def set_retry(self, task_id: str, retry_after: float):
+        self._write(
+            "INSERT INTO retries VALUES (?, ?, 1) ON CONFLICT(task_id) DO UPDATE "
+            "SET retry_after = excluded.retry_after, attempts = attempts + 1",
+            (task_id, retry_after),
+        )
+
+    def clear_retry(self, task_id: str):
+        self._write("DELETE FROM retries WHERE task_id = ?", (task_id,))
+
+    def attempts(self, task_id: str) -> int:
+        row = self._db.execute("SELECT attempts FROM retries WHERE task_id = ?", (task_id,)).fetchone()
+        return row["attempts"] if row else 0
+
+    def pending_retries(self) -> dict[str, float]:
+        """task_id → retry_after for retries still in the future."""
+        rows = self._db.execute(
+            "SELECT task_id, retry_after FROM retries WHERE retry_after > ?", (time.time(),)
+        ).fetchall()
+        return {r["task_id"]: r["retry_after"] for r in rows}
+
+    # ── LATENCIES ─────────────────────────────────────────
+
+    def record_latency(self, agent: str, seconds: float, ok: bool = True):
+        self._write(
+            "INSERT INTO latencies (agent, seconds, ok, at) VALUES (?, ?, ?, ?)",
+            (agent, seconds, int(ok), time.time()),
+        )
+
+    def latency_stats(self, since: float = 0) -> dict[str, dict]:
+        """Per-agent call count, error count and mean latency since `since`."""
+        rows = self._db.execute(
+            "SELECT agent, COUNT(*) AS calls, SUM(1 - ok) AS errors, AVG(seconds) AS mean "
+            "FROM latencies WHERE at >= ? GROUP BY agent",
+            (since,),
+        ).fetchall()
+        return {r["agent"]: {"calls": r["calls"], "errors": r["errors"], "mean": r["mean"]} for r in rows}
+
+    # ── DIGEST ENTRIES ────────────────────────────────────
+
+    def record_result(self, entry: dict):
+        self._write(
+            "INSERT INTO results (at, type, payload) VALUES (?, ?, ?)",
+            (time.time(), entry["type"], json.dumps(entry, ensure_ascii=False)),
+        )
+
+    def results_between(self, since: float = 0, until: Optional[float] = None) -> list[dict]:
+        self.flush()
+        rows = self._db.execute(
+            "SELECT payload FROM results WHERE at >= ? AND at < ? ORDER BY id",
+            (since, until if until is not None else float("inf")),
+        ).fetchall()
+        return [json.loads(r["payload"]) for r in rows]
+
+    # ── MESSAGE BATCHES ───────────────────────────────────
+
+    def add_batch(self, batch_id: str, task_ids: list[str]):
+        # durable: a lost batch id means paying for the same tasks twice
+        self._db.executemany(
+            "INSERT OR REPLACE INTO batch_items VALUES (?, ?)", [(tid, batch_id) for tid in task_ids]
+        )
+        self._write("INSERT INTO batches VALUES (?, ?)", (batch_id, time.time()), durable=True)
+
+    def open_batches(self) -> dict[str, float]:
+        """batch_id → submitted_at for batches whose results aren't all handled."""
+        rows = self._db.execute("SELECT batch_id, submitted_at FROM batches").fetchall()
+        return {r["batch_id"]: r["submitted_at"] for r in rows}
+
+    def batch_tasks(self, batch_id: Optional[str] = None) -> list[str]:
+        if batch_id is None:
+            rows = self._db.execute("SELECT task_id FROM batch_items").fetchall()
+        else:
+            rows = self._db.execute("SELECT task_id FROM batch_items WHERE batch_id = ?", (batch_id,)).fetchall()
+        return [r["task_id"] for r in rows]
+
+    def finish_batch_item(self, task_id: str):
+        """Drop a handled task; the batch goes too once it has none left."""
+        row = self._db.execute("SELECT batch_id FROM batch_items WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            return
+        self._db.execute("DELETE FROM batch_items WHERE task_id = ?", (task_id,))
+        self._write(
+            "DELETE FROM batches WHERE batch_id = ? AND NOT EXISTS "
+            "(SELECT 1 FROM batch_items WHERE batch_id = ?)",
+            (row["batch_id"], row["batch_id"]),
+            durable=True,
+        )
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self._write("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value), durable=True)
@@ -0,0 +1,108 @@
+"""
+Throttled write-back of a streaming agent reply.
+
+The 🤖 node is created as soon as the first text arrives, then edited
+as more text streams in — at most once per `min_interval` seconds, so a
+fast token stream turns into a handful of edit_item calls rather than
+hundreds. A cursor marks the node as still being written; the final
+edit removes it. `on_create` gets the node id as soon as it exists, so a
+crash mid-stream can be cleaned up after a restart.
+
+Usage:
+    writer = ThrottledWriter(wf, parent_id, prefix="🤖", min_interval=2.0)
+    async for chunk in agent.stream(task, context):
+        await writer.feed(chunk)
+    text = await writer.finish()
+"""
+
+import logging
+import time
+from typing import Callable, Optional
+
+from workflowy_client import WorkFlowyClient
+
+log = logging.getLogger("stream_writer")
+
+CURSOR = " ▍"
+
+
+class ThrottledWriter:
+    """Streams text into one WorkFlowy node with rate-limited edits."""
+
+    def __init__(
+        self,
+        wf: WorkFlowyClient,
+        parent_id: str,
+        prefix: str = "",
+        header: str = "",
+        min_interval: float = 2.0,
+        on_create: Optional[Callable[[str], None]] = None,
+    ):
+        self.wf = wf
+        self.parent_id = parent_id
+        self.prefix = prefix
+        self.header = header
+        self.min_interval = min_interval
+        self.on_create = on_create
+        self.item_id: Optional[str] = None
+        self.edits = 0
+        self.finished = False
+        self.first_write_at: Optional[float] = None  # monotonic, for time-to-first-output
+        self._text = ""
+        self._written = ""
+        self._last_write = 0.0
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def _render(self, cursor: bool) -> str:
+        body = (self.header + self._text).strip()
+        return f"{self.prefix} {body}{CURSOR if cursor else ''}".lstrip()
+
+    async def feed(self, chunk: str):
+        """Append streamed text; writes only if the throttle interval has passed."""
+        self._text += chunk
+        if not self._text.strip():
+            return
+        if self.item_id is None:
+            name = self._render(cursor=True)
+            await self._create(name)
+            self._written = name
+            self._last_write = self.first_write_at = time.monotonic()
+        elif time.monotonic() - self._last_write >= self.min_interval:
+            await self._edit(self._render(cursor=True))
+
+    async def finish(self) -> str:
+        """Write the complete text (without cursor) and return it."""
+        if not self._text.strip():
+            raise RuntimeError("Пустой ответ от агента")
+        name = self._render(cursor=False)
+        if self.item_id is None:
+            await self._create(name)
+            self.first_write_at = time.monotonic()
+        elif name != self._written:
+            await self._edit(name)
+        self.finished = True
+        return self._text
+
+    async def discard(self):
+        """Remove a partially written node after the stream failed."""
+        if self.item_id is None or self.finished:
+            return
+        try:
+            await self.wf.delete_item(self.item_id)
+        except Exception as e:
+            log.warning("Could not remove partial reply %s: %s", self.item_id[:8], e)
+        self.item_id = None
+
+    async def _create(self, name: str):
+        self.item_id = await self.wf.create_item(self.parent_id, name, position="bottom")
+        if self.on_create:
+            self.on_create(self.item_id)
+
+    async def _edit(self, name: str):
+        await self.wf.edit_item(self.item_id, name=name)
+        self._written = name
+        self._last_write = time.monotonic()
+        self.edits += 1
@@ -0,0 +1,196 @@
+"""
+Several backlogs (tenants) in one process.
+
+Each tenant is a full Orchestrator with its own WorkFlowy key, backlog,
+digest node, state file and concurrency quota (`max_concurrent_tasks`).
+Agents, provider rate limiters, HTTP pools and the CLI pool are built
+once and shared. On top of each tenant's quota, agent calls take one of
+`FairSlots` process-wide slots, granted round-robin between tenants that
+are waiting, so a tenant with a deep queue can't starve the others.
+
+Log lines from a tenant's scanner and workers are prefixed with its name.
+
+Usage:
+    slots = FairSlots(8)
+    supervisor = Supervisor({
+        "team-a": Orchestrator(config_a, agents, slots=slots, tenant="team-a"),
+        "team-b": Orchestrator(config_b, agents, slots=slots, tenant="team-b"),
+    }, slots)
+    await supervisor.run_forever()
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+from collections import Counter, OrderedDict, deque
+from typing import Optional
+
+from poller import wake_sources
+
+log = logging.getLogger("supervisor")
+
+TENANT: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("tenant", default=None)
+
+
+class TenantLogFilter(logging.Filter):
+    """Prefixes records logged inside a tenant's tasks with [tenant]."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        tenant = TENANT.get()
+        if tenant and not getattr(record, "tenant", None):
+            record.tenant = tenant
+            record.msg = f"[{tenant}] {record.msg}"
+        return True
+
+
+class FairSlots:
+    """`total` concurrent agent calls shared by all tenants, granted round-robin."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.in_use = 0
+        self.granted: Counter = Counter()
+        self._waiters: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, tenant: str):
+        await self._acquire(tenant)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, tenant: str):
+        if self.in_use < self.total and not self._waiters:
+            self.in_use += 1
+            self.granted[tenant] += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(tenant, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                self._release()   # granted, but cancelled before it could run
+            else:
+                waiting = self._waiters.get(tenant)
+                if waiting is not None and future in waiting:
+                    waiting.remove(future)
+                    if not waiting:
+                        del self._waiters[tenant]
+            raise
+
+    def _release(self):
+        self.in_use -= 1
+        self._grant()
+
+    def _grant(self):
+        while self.in_use < self.total and self._waiters:
+            tenant, waiting = next(iter(self._waiters.items()))
+            future = waiting.popleft()
+            if waiting:
+                self._waiters.move_to_end(tenant)   # next grant goes to another tenant
+            else:
+                del self._waiters[tenant]
+            future.set_result(None)
+            self.in_use += 1
+            self.granted[tenant] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "in_use": self.in_use,
+            "total": self.total,
+            "waiting": {t: len(w) for t, w in self._waiters.items()},
+            "granted": dict(self.granted),
+        }
+
+
+class Supervisor:
+    """
+    Runs every tenant's scan loop concurrently and restarts one that
+    crashes (with doubling delay) without touching the others. Wake
+    signals are wired once and wake every tenant.
+    """
+
+    def __init__(
+        self,
+        tenants: dict,
+        slots: Optional[FairSlots] = None,
+        wake_port: Optional[int] = None,
+        wake_file: Optional[str] = None,
+        restart_base_seconds: float = 30,
+        restart_max_seconds: float = 900,
+    ):
+        self.tenants = tenants   # name → Orchestrator
+        self.slots = slots
+        self.wake_port = wake_port
+        self.wake_file = wake_file
+        self.restart_base_seconds = restart_base_seconds
+        self.restart_max_seconds = restart_max_seconds
+        self.restarts: Counter = Counter()
+        self._running = False
+
+    def wake(self, reason: str = "manual"):
+        for orch in self.tenants.values():
+            orch.poller.wake(reason)
+
+    async def run_forever(self):
+        self._running = True
+        log.info("Supervising %d tenants: %s", len(self.tenants), ", ".join(self.tenants))
+        async with wake_sources(self.wake, port=self.wake_port, wake_file=self.wake_file):
+            await asyncio.gather(*(self._supervise(name, orch) for name, orch in self.tenants.items()))
+
+    async def _supervise(self, name: str, orch):
+        TENANT.set(name)
+        delay = self.restart_base_seconds
+        while self._running:
+            try:
+                await orch.run_forever()
+                return
+            except Exception as e:
+                if not self._running:
+                    return
+                self.restarts[name] += 1
+                log.error("Tenant crashed: %s; restarting in %ds", e, delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.restart_max_seconds)
+
+    def stop(self):
+        self._running = False
+        for orch in self.tenants.values():
+            orch.stop()
+
+    async def _each(self, method: str) -> dict:
+        async def call(name: str, orch):
+            TENANT.set(name)
+            return await getattr(orch, method)()
+
+        names = list(self.tenants)
+        results = await asyncio.gather(
+            *(call(name, self.tenants[name]) for name in names), return_exceptions=True,
+        )
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                log.error("Tenant %s: %s failed: %s", name, method, result)
+        return dict(zip(names, results))
+
+    async def tick(self):
+        """One tick of every tenant, concurrently."""
+        await self._each("tick")
+
+    async def generate_digest(self) -> str:
+        digests = await self._each("generate_digest")
+        return "\n\n".join(
+            f"## {name}\n{digest}" for name, digest in digests.items() if isinstance(digest, str)
+        )
+
+    async def write_digest_to_wf(self):
+        """Each tenant's digest under its own digest node."""
+        await self._each("write_digest_to_wf")
+
+    def close(self):
+        if self.slots:
+            log.info("Agent slots: %s", self.slots.snapshot())
+        for orch in self.tenants.values():
+            orch.close()
@@ -0,0 +1,247 @@
+"""
+Tree Mirror
+In-memory copy of the WorkFlowy tree built from a single list_all snapshot.
+
+list_all is rate limited to 1 req/hour, so between snapshots the mirror
+is kept fresh with targeted fetches: one list_children per watched root,
+plus a subtree re-fetch only for children whose modified_at moved since
+the mirror last saw them. Edits deep inside a child whose own
+modified_at did not move are picked up by the next snapshot.
+
+Reads (list_children / get_subtree / get_item) are served locally.
+Writes go through to the client and are applied to the mirror, so the
+mirror can stand in for WorkFlowyClient anywhere (e.g. DialogManager).
+
+Usage:
+    mirror = TreeMirror()
+    async with WorkFlowyClient(api_key) as wf:
+        await mirror.sync(wf, watch=[backlog_id], depth=5)
+        tasks = await mirror.list_children(backlog_id)   # no HTTP
+"""
+
+import dataclasses
+import logging
+import time
+from datetime import datetime
+from typing import Optional
+
+import httpx
+
+from workflowy_client import WorkFlowyClient, WFItem
+
+log = logging.getLogger("tree_mirror")
+
+
+class TreeMirror:
+    """Parent → children index over a list_all snapshot, with delta refresh."""
+
+    def __init__(self, snapshot_interval: float = 3600):
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_at: Optional[float] = None   # unix time of last list_all
+        self.wf: Optional[WorkFlowyClient] = None
+        self._next_snapshot = 0.0
+        self._items: dict[str, WFItem] = {}
+        self._children: dict[Optional[str], list[str]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot_at is not None
+
+    # ── SYNC ──────────────────────────────────────────────
+
+    async def sync(self, wf: WorkFlowyClient, watch: list[str], depth: int = 2) -> bool:
+        """
+        Bind to `wf` for this tick and bring the mirror up to date.
+
+        Takes a fresh list_all snapshot when the previous one is older than
+        snapshot_interval; otherwise refreshes only the watched roots.
+        Returns False if no snapshot is available (caller should crawl).
+        """
+        self.wf = wf
+        if time.time() >= self._next_snapshot:
+            try:
+                await self.snapshot()
+                return True
+            except httpx.HTTPError as e:
+                self._next_snapshot = time.time() + self.snapshot_interval
+                log.warning("list_all failed (%s), next snapshot in %ds", e, self.snapshot_interval)
+
+        if not self.ready:
+            return False
+        for root in watch:
+            await self.refresh(root, depth)
+        return True
+
+    async def snapshot(self):
+        """Rebuild the whole index from one list_all call."""
+        items = await self.wf.list_all()
+        self.load(items)
+        self.snapshot_at = time.time()
+        self._next_snapshot = self.snapshot_at + self.snapshot_interval
+        log.info("Tree snapshot: %d nodes", len(self._items))
+
+    def load(self, items: list[WFItem]):
+        """Index a flat list_all payload by parent id."""
+        self._items = {}
+        self._children = {}
+        for item in items:
+            item.children = []
+            self._items[item.id] = item
+            self._children.setdefault(item.parent_id, []).append(item.id)
+        self._sort_all()
+
+    async def refresh(self, root: str, depth: int = 2):
+        """
+        Targeted delta for one root: list its children (1 request) and
+        re-fetch subtrees only for children that are new or modified.
+        `depth` counts levels below the root, children included.
+        """
+        fresh = await self.wf.list_children(root)
+        changed = [
+            c for c in fresh
+            if c.id not in self._items
+            or self._items[c.id].modified_at != c.modified_at
+        ]
+        fresh_ids = {c.id for c in fresh}
+        for old_id in self._children.get(root, []):
+            if old_id not in fresh_ids:
+                self._drop(old_id)
+        self._children[root] = [c.id for c in fresh]
+        for child in fresh:
+            self._put(child, root)
+
+        for child in changed:
+            if depth > 1:
+                subtree = await self.wf.get_subtree(child.id, depth=depth - 1)
+                self._replace_children(child.id, subtree, depth - 1)
+        if changed:
+            log.info("Mirror delta under %s: %d changed", root[:8], len(changed))
+
+    # ── LOCAL READS ───────────────────────────────────────
+
+    async def get_item(self, item_id: str) -> WFItem:
+        item = self._items.get(item_id)
+        if item is None:
+            item = await self.wf.get_item(item_id)
+            if item.parent_id in self._items or (item.parent_id is None and self.ready):
+                self._put(item, item.parent_id)   # else it would be an orphan outside the mirror
+        return self._copy(item)
+
+    async def list_children(self, item_id: Optional[str]) -> list[WFItem]:
+        return [self._copy(self._items[c]) for c in self._children.get(item_id, [])]
+
+    async def get_subtree(self, item_id: Optional[str], depth: int = 2) -> list[WFItem]:
+        return self._subtree(item_id, depth)
+
+    async def list_all(self) -> list[WFItem]:
+        return [self._copy(i) for i in self._items.values()]
+
+    async def find_node_by_name(
+        self, name_fragment: str, parent_id: Optional[str] = None
+    ) -> Optional[WFItem]:
+        for child in await self.list_children(parent_id):
+            if name_fragment.lower() in child.name.lower():
+                return child
+        return None
+
+    def _subtree(self, item_id: Optional[str], depth: int) -> list[WFItem]:
+        children = [self._copy(self._items[c]) for c in self._children.get(item_id, [])]
+        if depth > 1:
+            for child in children:
+                child.children = self._subtree(child.id, depth - 1)
+        return children
+
+    # ── WRITE-THROUGH ─────────────────────────────────────
+
+    async def create_item(
+        self,
+        parent_id: Optional[str],
+        name: str,
+        note: Optional[str] = None,
+        position: str = "bottom",
+    ) -> str:
+        new_id = await self.wf.create_item(parent_id, name, note=note, position=position)
+        siblings = [self._items[c].priority for c in self._children.get(parent_id, [])]
+        if position == "top":
+            priority = min(siblings, default=0) - 1
+        else:
+            priority = max(siblings, default=-1) + 1
+        now = datetime.now()
+        self._put(WFItem(
+            id=new_id, name=name, note=note, priority=priority,
+            created_at=now, modified_at=now, parent_id=parent_id,
+        ), parent_id)
+        return new_id
+
+    async def edit_item(
+        self,
+        item_id: str,
+        name: Optional[str] = None,
+        note: Optional[str] = None,
+    ) -> None:
+        await self.wf.edit_item(item_id, name=name, note=note)
+        item = self._items.get(item_id)
+        if item:
+            if name is not None:
+                item.name = name
+            if note is not None:
+                item.note = note
+            item.modified_at = datetime.now()
+
+    async def complete_item(self, item_id: str) -> None:
+        await self.wf.complete_item(item_id)
+        if item_id in self._items:
+            self._items[item_id].completed_at = datetime.now()
+
+    async def uncomplete_item(self, item_id: str) -> None:
+        await self.wf.uncomplete_item(item_id)
+        if item_id in self._items:
+            self._items[item_id].completed_at = None
+
+    async def delete_item(self, item_id: str) -> None:
+        await self.wf.delete_item(item_id)
+        if item_id in self._items:
+            self._drop(item_id)
+
+    # ── INDEX MAINTENANCE ─────────────────────────────────
+
+    @staticmethod
+    def _copy(item: WFItem) -> WFItem:
+        return dataclasses.replace(item, children=[])
+
+    def _put(self, item: WFItem, parent_id: Optional[str]):
+        item = self._copy(item)
+        item.parent_id = parent_id
+        self._items[item.id] = item
+        siblings = self._children.setdefault(parent_id, [])
+        if item.id not in siblings:
+            siblings.append(item.id)
+        siblings.sort(key=lambda c: self._items[c].priority)
+
+    def _replace_children(self, parent_id: str, subtree: list[WFItem], levels: int):
+        """
+        Swap everything under parent_id for a freshly fetched subtree that
+        is `levels` deep. Below the fetched levels the mirror is left as is.
+        """
+        fresh_ids = {c.id for c in subtree}
+        for old_id in self._children.get(parent_id, []):
+            if old_id not in fresh_ids:
+                self._drop(old_id, unlink=False)
+        self._children[parent_id] = []
+        for child in subtree:
+            self._put(child, parent_id)
+            if levels > 1:
+                self._replace_children(child.id, child.children, levels - 1)
+
+    def _drop(self, item_id: str, unlink: bool = True):
+        item = self._items.pop(item_id, None)
+        for child_id in self._children.pop(item_id, []):
+            self._drop(child_id, unlink=False)
+        if unlink and item is not None:
+            siblings = self._children.get(item.parent_id, [])
+            if item_id in siblings:
+                siblings.remove(item_id)
+
+    def _sort_all(self):
+        for siblings in self._children.values():
+            siblings.sort(key=lambda c: self._items[c].priority)
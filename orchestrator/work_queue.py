@@ -0,0 +1,94 @@
+"""
+Work queue between the scanner and agent workers.
+
+The scanner puts work items as it finds them; long-lived workers drain
+the queue. Items are served lowest `priority` first (a heap; keys come
+from scheduler.SchedulingPolicy), ties in arrival order. A task id is
+accepted once until its item is done, and a failed task can be deferred
+until a retry time. A worker can park an item it can't run yet (its
+agent is at its cap) and take the next one; parked items go back into
+the heap when the gate is released.
+"""
+
+import asyncio
+import itertools
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+@dataclass
+class WorkItem:
+    """One unit of agent work: a new task or a dialog awaiting reply."""
+    kind: str                      # "task" | "dialog" | "batch"
+    task_id: str
+    payload: Any                   # Task for "task", Dialog for "dialog", BatchResult for "batch"
+    priority: tuple[int, float] = (0, 0.0)   # (tier, effective timestamp); lower is served first
+    seen_at: Optional[float] = None  # start of the scan that found it (lease fencing)
+    enqueued_at: float = field(default_factory=time.time)
+
+
+class WorkQueue:
+    """Priority queue of WorkItems, deduplicated by task id, with retry backoff."""
+
+    def __init__(self):
+        self._queue: asyncio.PriorityQueue[tuple[tuple[int, float], int, WorkItem]] = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._active: set[str] = set()          # queued or being processed
+        self._retry_after: dict[str, float] = {}  # task_id → unix timestamp
+        self._parked: dict[str, list[WorkItem]] = {}  # gate → items set aside
+
+    def put(self, item: WorkItem) -> bool:
+        """Enqueue unless the task is already active or backing off."""
+        if item.task_id in self._active:
+            return False
+        if time.time() < self._retry_after.get(item.task_id, 0):
+            return False
+        self._retry_after.pop(item.task_id, None)
+        self._active.add(item.task_id)
+        self._queue.put_nowait((item.priority, next(self._seq), item))
+        return True
+
+    async def get(self) -> WorkItem:
+        _, _, item = await self._queue.get()
+        return item
+
+    def done(self, item: WorkItem):
+        """Mark an item finished; its task id may be enqueued again."""
+        self._active.discard(item.task_id)
+        self._queue.task_done()
+
+    def park(self, item: WorkItem, gate: str):
+        """Set a taken item aside until `gate` is released; it stays active."""
+        self._parked.setdefault(gate, []).append(item)
+
+    def release(self, gate: str):
+        """Put items parked on `gate` back in the queue, in their original order."""
+        for item in self._parked.pop(gate, []):
+            self._queue.put_nowait((item.priority, next(self._seq), item))
+            self._queue.task_done()   # the re-put replaces the get that parked it
+
+    def defer(self, task_id: str, seconds: float):
+        """Don't accept task_id again for `seconds`."""
+        self._retry_after[task_id] = time.time() + seconds
+
+    def is_active(self, task_id: str) -> bool:
+        return task_id in self._active
+
+    def backing_off(self, task_id: str) -> bool:
+        return time.time() < self._retry_after.get(task_id, 0)
+
+    async def join(self):
+        await self._queue.join()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def parked(self) -> int:
+        return sum(len(items) for items in self._parked.values())
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
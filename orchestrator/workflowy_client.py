@@ -8,6 +8,9 @@ import asyncio
 from dataclasses import dataclass, field
 from typing import Optional
 from datetime import datetime
+from urllib.parse import urlsplit
+
+from rate_limit import TokenBucket
 
 
 @dataclass
@@ -21,6 +24,7 @@ class WFItem:
     created_at: Optional[datetime] = None
     modified_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
+    parent_id: Optional[str] = None  # present in list_all payloads
     children: list["WFItem"] = field(default_factory=list)
 
     @classmethod
@@ -34,6 +38,7 @@ class WFItem:
             created_at=_ts(data.get("createdAt")),
             modified_at=_ts(data.get("modifiedAt")),
             completed_at=_ts(data.get("completedAt")),
+            parent_id=data.get("parent_id") or data.get("parentId"),
         )
 
     @property
@@ -84,51 +89,147 @@ class WorkFlowyClient:
             root_children = await wf.list_children(None)
             item = await wf.get_item("some-uuid")
             new_id = await wf.create_item(parent_id, "Hello", position="bottom")
+
+    At most `max_concurrency` requests are in flight at once. Pass a shared
+    `budget` (TokenBucket) to cap the request rate per host across clients.
+
+    Pass `http_client` to reuse a long-lived pooled AsyncClient; it is then
+    left open on exit (its owner closes it).
+
+    With cache=True, get_item / list_children are read-through cached for
+    the lifetime of one `async with` session: identical in-flight requests
+    are deduplicated, and writes drop the affected item and parent entries.
     """
 
     BASE_URL = "https://beta.workflowy.com/api/beta"
 
-    def __init__(self, api_key: str):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 8,
+        budget: Optional[TokenBucket] = None,
+        cache: bool = False,
+        http_client: Optional[httpx.AsyncClient] = None,
+    ):
         self.api_key = api_key
-        self._client: Optional[httpx.AsyncClient] = None
+        self.base_url = (base_url or self.BASE_URL).rstrip("/")
+        self.host = urlsplit(self.base_url).netloc
+        self.budget = budget
+        self.request_count = 0
+        self.max_concurrency = max_concurrency
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = http_client
+        self._owns_client = http_client is None
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self.cache_enabled = cache
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache: dict[tuple[str, Optional[str]], asyncio.Future] = {}
+        self._parents: dict[str, Optional[str]] = {}  # item_id → parent_id, as seen
 
     async def __aenter__(self):
-        self._client = httpx.AsyncClient(
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json",
-            },
-            timeout=30.0,
-        )
+        self.reset_cache()
+        if self._owns_client:
+            self._client = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
         return self
 
     async def __aexit__(self, *args):
-        if self._client:
+        self.reset_cache()
+        if self._client and self._owns_client:
             await self._client.aclose()
 
-    async def _post(self, endpoint: str, payload: dict) -> dict:
-        resp = await self._client.post(
-            f"{self.BASE_URL}/{endpoint}/",
-            json=payload,
-        )
+    async def _request(self, method: str, endpoint: str, payload: Optional[dict] = None) -> dict:
+        if self.budget:
+            await self.budget.acquire()
+        async with self._sem:
+            self.request_count += 1
+            resp = await self._client.request(
+                method,
+                f"{self.base_url}/{endpoint}/",
+                json=payload,
+                headers=self._headers,
+            )
         resp.raise_for_status()
         return resp.json()
 
+    async def _post(self, endpoint: str, payload: dict) -> dict:
+        return await self._request("POST", endpoint, payload)
+
     async def _get(self, endpoint: str) -> dict:
-        resp = await self._client.get(f"{self.BASE_URL}/{endpoint}/")
-        resp.raise_for_status()
-        return resp.json()
+        return await self._request("GET", endpoint)
+
+    # ── READ CACHE ────────────────────────────────────────
+
+    def reset_cache(self):
+        self._cache.clear()
+        self._parents.clear()
+
+    async def _cached_post(self, endpoint: str, item_id: Optional[str], payload: dict) -> dict:
+        """POST through the session cache; concurrent identical calls share one request."""
+        if not self.cache_enabled:
+            return await self._post(endpoint, payload)
+        key = (endpoint, item_id)
+        fut = self._cache.get(key)
+        if fut is None:
+            self.cache_misses += 1
+            fut = asyncio.ensure_future(self._post(endpoint, payload))
+            self._cache[key] = fut
+            fut.add_done_callback(lambda f: self._drop_failed(key, f))
+        else:
+            self.cache_hits += 1
+        # shield: one cancelled caller must not cancel the shared request
+        return await asyncio.shield(fut)
+
+    def _drop_failed(self, key: tuple, fut: asyncio.Future):
+        if (fut.cancelled() or fut.exception()) and self._cache.get(key) is fut:
+            del self._cache[key]
+
+    def _prime(self, parent_id: Optional[str], raw_items: list[dict]):
+        """Remember list_children results as get_item answers and parent links."""
+        if not self.cache_enabled:
+            return
+        loop = asyncio.get_running_loop()
+        for raw in raw_items:
+            self._parents[raw["id"]] = parent_id
+            key = ("get-item", raw["id"])
+            if key not in self._cache:
+                fut = loop.create_future()
+                fut.set_result({"item": raw})
+                self._cache[key] = fut
+
+    def _invalidate(self, item_id: Optional[str] = None, parent_id: Optional[str] = None):
+        if not self.cache_enabled:
+            return
+        if item_id is not None:
+            self._cache.pop(("get-item", item_id), None)
+            if item_id in self._parents:
+                parent_id = self._parents[item_id]
+            else:
+                # Parent unknown: drop every listing to stay correct
+                self._cache = {k: v for k, v in self._cache.items() if k[0] != "list-children"}
+        self._cache.pop(("list-children", parent_id), None)
 
     # ── CRUD ──────────────────────────────────────────────
 
     async def get_item(self, item_id: str) -> WFItem:
-        data = await self._post("get-item", {"item_id": item_id})
+        data = await self._cached_post("get-item", item_id, {"item_id": item_id})
         return WFItem.from_api(data["item"])
 
     async def list_children(self, item_id: Optional[str]) -> list[WFItem]:
         """Pass None for root."""
         raw_id = item_id if item_id else "None"
-        data = await self._post("list-children", {"item_id": raw_id})
+        data = await self._cached_post("list-children", item_id, {"item_id": raw_id})
+        self._prime(item_id, data.get("items", []))
         items = [WFItem.from_api(i) for i in data.get("items", [])]
         return sorted(items, key=lambda x: x.priority)
 
@@ -147,7 +248,11 @@ class WorkFlowyClient:
         }
         if note:
             payload["note"] = note
-        data = await self._post("create-item", payload)
+        try:
+            data = await self._post("create-item", payload)
+        finally:
+            self._invalidate(parent_id=parent_id)   # a failed create may still have landed
+        self._parents[data["item_id"]] = parent_id
         return data["item_id"]
 
     async def edit_item(
@@ -162,15 +267,20 @@ class WorkFlowyClient:
         if note is not None:
             payload["note"] = note
         await self._post("edit-item", payload)
+        self._invalidate(item_id)
 
     async def complete_item(self, item_id: str) -> None:
         await self._post("complete-item", {"item_id": item_id})
+        self._invalidate(item_id)
 
     async def uncomplete_item(self, item_id: str) -> None:
         await self._post("uncomplete-item", {"item_id": item_id})
+        self._invalidate(item_id)
 
     async def delete_item(self, item_id: str) -> None:
         await self._post("delete-item", {"item_id": item_id})
+        self._invalidate(item_id)
+        self._cache.pop(("list-children", item_id), None)
 
     async def list_all(self) -> list[WFItem]:
         """Flat list of ALL items. Rate limited: 1 req/hour."""
@@ -181,13 +291,23 @@ class WorkFlowyClient:
 
     async def get_subtree(self, item_id: Optional[str], depth: int = 2) -> list[WFItem]:
         """
-        Recursively fetch a subtree up to `depth` levels.
+        Fetch a subtree up to `depth` levels, breadth-first.
         depth=1 means just direct children.
+
+        Each level is fetched concurrently (bounded by max_concurrency),
+        so latency grows with depth rather than with node count.
         """
         children = await self.list_children(item_id)
-        if depth > 1:
-            for child in children:
-                child.children = await self.get_subtree(child.id, depth - 1)
+        level = children
+        for _ in range(depth - 1):
+            if not level:
+                break
+            fetched = await asyncio.gather(*(self.list_children(n.id) for n in level))
+            next_level = []
+            for node, kids in zip(level, fetched):
+                node.children = kids
+                next_level.extend(kids)
+            level = next_level
         return children
 
     async def find_node_by_name(
@@ -0,0 +1,189 @@
+"""
+Write-back of agent results, off the worker.
+
+Finishing a task used to take the worker through two or three sequential
+WorkFlowy calls (reply, status tag, complete) before it could pick up
+the next item. Now the worker hands them over as a list of Mutations and
+moves on. The coalescer keeps one ordered chain per key (the task id):
+mutations of one task are applied in submission order, chains of
+different tasks run concurrently (the client's max_concurrency still
+caps requests in flight), so one slow write stalls only its own task.
+
+A failed write is retried with backoff: 429s and edits/completes as is,
+and a create whose outcome is unknown (timeout, 5xx) only after checking
+that the item didn't land under its parent. A write that still
+fails aborts the rest of its chain, so later mutations never overtake it.
+Cancelling the future submit() returned drops the writes not yet started.
+
+Usage:
+    writes = WriteCoalescer()
+    done = writes.submit(wf, task_id, [
+        Mutation.create(task_id, "🤖 reply"),
+        Mutation.edit(task_id, name="Task #status:done"),
+        Mutation.complete(task_id),
+    ])
+    await done   # raises the first failure
+"""
+
+import asyncio
+import logging
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+from rate_limit import backoff_delay, retry_after_of
+
+log = logging.getLogger("write_coalescer")
+
+
+class WriteAborted(Exception):
+    """An earlier write in the same chain failed, so this one was not applied."""
+
+
+@dataclass
+class Mutation:
+    """One WorkFlowy write: create (item_id is the parent), edit or complete."""
+    op: str                        # "create" | "edit" | "complete"
+    item_id: str
+    name: Optional[str] = None
+    note: Optional[str] = None
+    position: str = "bottom"
+
+    @classmethod
+    def create(cls, parent_id: str, name: str, note: Optional[str] = None, position: str = "bottom") -> "Mutation":
+        return cls("create", parent_id, name, note, position)
+
+    @classmethod
+    def edit(cls, item_id: str, name: Optional[str] = None, note: Optional[str] = None) -> "Mutation":
+        return cls("edit", item_id, name, note)
+
+    @classmethod
+    def complete(cls, item_id: str) -> "Mutation":
+        return cls("complete", item_id)
+
+
+async def apply_mutation(wf, m: Mutation):
+    """Issue one mutation against a WorkFlowyClient (or the tree mirror)."""
+    if m.op == "create":
+        return await wf.create_item(m.item_id, m.name, note=m.note, position=m.position)
+    if m.op == "edit":
+        return await wf.edit_item(m.item_id, name=m.name, note=m.note)
+    if m.op == "complete":
+        return await wf.complete_item(m.item_id)
+    raise ValueError(f"unknown mutation {m.op!r}")
+
+
+def _ambiguous(error: BaseException) -> bool:
+    """The request may have been applied even though it failed."""
+    if isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code >= 500
+
+
+def _retriable(error: BaseException) -> bool:
+    if _ambiguous(error):
+        return True
+    return isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429
+
+
+@dataclass
+class _Pending:
+    wf: object
+    mutation: Mutation
+    future: asyncio.Future
+
+
+class WriteCoalescer:
+    """Ordered per-key chains of WorkFlowy writes, applied concurrently across keys."""
+
+    def __init__(self, attempts: int = 3, retry_base_seconds: float = 1.0, retry_max_seconds: float = 30.0):
+        self.attempts = attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.stats: Counter = Counter()
+        self._chains: dict[str, deque[_Pending]] = {}
+        self._runners: dict[str, asyncio.Task] = {}
+
+    def submit(self, wf, key: str, mutations: list[Mutation]) -> asyncio.Future:
+        """Queue mutations on `key`'s chain; the future resolves when all are applied."""
+        loop = asyncio.get_running_loop()
+        chain = self._chains.setdefault(key, deque())
+        futures = []
+        for m in mutations:
+            self.stats["submitted"] += 1
+            pending = _Pending(wf, m, loop.create_future())
+            chain.append(pending)
+            futures.append(pending.future)
+        if key not in self._runners:
+            self._runners[key] = asyncio.create_task(self._run(key))
+        return asyncio.gather(*futures)
+
+    async def _run(self, key: str):
+        chain = self._chains[key]
+        try:
+            while chain:
+                pending = chain[0]
+                if pending.future.cancelled():   # the submitter gave up on it
+                    chain.popleft()
+                    self.stats["cancelled"] += 1
+                    continue
+                try:
+                    result = await self._apply(pending.wf, pending.mutation)
+                except Exception as e:
+                    chain.popleft()
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                    for rest in chain:   # never applied out of order
+                        if not rest.future.done():
+                            rest.future.set_exception(WriteAborted(f"{pending.mutation.op} {key[:8]} failed: {e}"))
+                    self.stats["aborted"] += len(chain)
+                    chain.clear()
+                    break
+                chain.popleft()
+                if not pending.future.done():
+                    pending.future.set_result(result)
+        finally:
+            del self._chains[key]
+            del self._runners[key]
+
+    async def _apply(self, wf, m: Mutation):
+        attempt = 1
+        while True:
+            try:
+                result = await apply_mutation(wf, m)
+                self.stats["applied"] += 1
+                return result
+            except Exception as e:
+                if attempt >= self.attempts or not _retriable(e):
+                    self.stats["failed"] += 1
+                    log.warning("%s %s failed after %d attempts: %s", m.op, m.item_id[:8], attempt, e)
+                    raise
+                delay = max(backoff_delay(attempt, self.retry_base_seconds, self.retry_max_seconds),
+                            retry_after_of(e) or 0.0)
+                self.stats["retries"] += 1
+                log.info("%s %s failed (%s); retry %d in %.1fs", m.op, m.item_id[:8], e, attempt, delay)
+                await asyncio.sleep(delay)
+                if m.op == "create" and _ambiguous(e) and await self._landed(wf, m):
+                    self.stats["deduplicated"] += 1
+                    return None
+                attempt += 1
+
+    @staticmethod
+    async def _landed(wf, m: Mutation) -> bool:
+        """Whether a create that failed ambiguously is already under its parent."""
+        client = getattr(wf, "wf", None) or wf   # read past the tree mirror
+        return any(child.name == m.name for child in await client.list_children(m.item_id))
+
+    async def drain(self):
+        """Wait for every chain submitted so far."""
+        while self._runners:
+            await asyncio.gather(*self._runners.values(), return_exceptions=True)
+
+    @property
+    def pending(self) -> int:
+        return sum(len(chain) for chain in self._chains.values())
+
+    def snapshot(self) -> dict:
+        return {"pending": self.pending, "chains": len(self._chains), **self.stats}
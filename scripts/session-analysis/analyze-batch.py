@@ -16,10 +16,12 @@ import json
 import os
 import subprocess
 import sys
-import tempfile
 import time
 from collections import defaultdict
 
+import claude_cli
+from claude_cli import CLAUDE_BIN, call_claude_cli, open_cli_pool, open_response_cache
+
 # Ensure output is not buffered (critical when running as subprocess)
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
@@ -161,104 +163,6 @@ def group_into_batches(index_rows: list[dict], digests_dir: str,
     return batches
 
 
-def find_claude_cli() -> str:
-    """Find claude CLI binary, resolving full path to avoid PATH issues in subprocess."""
-    import shutil
-    path = shutil.which("claude")
-    if path:
-        return path
-    # Common locations
-    for candidate in [
-        os.path.expanduser("~/.nvm/versions/node/v23.11.0/bin/claude"),
-        "/usr/local/bin/claude",
-        "/usr/bin/claude",
-    ]:
-        if os.path.isfile(candidate):
-            return candidate
-    return "claude"  # fallback, hope PATH works
-
-
-CLAUDE_BIN = find_claude_cli()
-
-
-def call_claude_cli(model: str, prompt: str, timeout: int = 120, max_retries: int = 3) -> dict | None:
-    """Call claude -p CLI. Returns parsed JSON dict or None on failure."""
-    # Write prompt to temp file to avoid shell escaping issues
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False, encoding="utf-8") as f:
-        f.write(prompt)
-        prompt_file = f.name
-
-    try:
-        for attempt in range(max_retries):
-            # Build env without CLAUDECODE to allow nested invocation
-            env = {k: v for k, v in os.environ.items() if k != "CLAUDECODE"}
-
-            cmd = [
-                CLAUDE_BIN, "-p",
-                "--model", model,
-                "--output-format", "text",
-                "--no-session-persistence",
-            ]
-
-            try:
-                result = subprocess.run(
-                    cmd,
-                    stdin=open(prompt_file, "r", encoding="utf-8"),
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout,
-                    env=env,
-                )
-            except subprocess.TimeoutExpired:
-                print(f"    Timeout after {timeout}s (attempt {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-                return None
-
-            # claude -p writes response to stderr (not stdout)
-            text = result.stderr.strip() or result.stdout.strip()
-
-            if result.returncode != 0 and not text:
-                print(f"    CLI error (exit {result.returncode}): {result.stderr[:200]}", file=sys.stderr)
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-                return None
-
-            if not text:
-                print(f"    Empty response from CLI", file=sys.stderr)
-                return None
-
-            # Extract JSON from response
-            json_text = text
-            if "```json" in json_text:
-                json_text = json_text.split("```json")[1].split("```")[0]
-            elif "```" in json_text:
-                parts = json_text.split("```")
-                if len(parts) >= 3:
-                    json_text = parts[1]
-
-            try:
-                return json.loads(json_text.strip())
-            except json.JSONDecodeError:
-                # Try to find JSON object in the text
-                start = text.find("{")
-                end = text.rfind("}") + 1
-                if start >= 0 and end > start:
-                    try:
-                        return json.loads(text[start:end])
-                    except json.JSONDecodeError:
-                        pass
-                print(f"    Failed to parse JSON from response ({len(text)} chars)", file=sys.stderr)
-                print(f"    First 200 chars: {text[:200]}", file=sys.stderr)
-                return None
-
-        return None
-    finally:
-        os.unlink(prompt_file)
-
-
 def main():
     parser = argparse.ArgumentParser(description="Batch-analyze session digests with Claude API")
     parser.add_argument("--digests-dir", default="/mnt/db/claude/sessions/digests",
@@ -279,6 +183,12 @@ def main():
                         help="Skip batches whose output file already exists")
     parser.add_argument("--start-batch", type=int, default=1,
                         help="Start from batch N (1-indexed, for resuming)")
+    parser.add_argument("--pool", type=int, default=0,
+                        help="Keep N warm CLI workers instead of starting claude per batch")
+    parser.add_argument("--cache", default="",
+                        help="SQLite file caching CLI responses by prompt (reruns skip finished batches)")
+    parser.add_argument("--cache-ttl-hours", type=float, default=24 * 7,
+                        help="Cached response lifetime (default: 168)")
     args = parser.parse_args()
 
     # Load index
@@ -332,6 +242,11 @@ def main():
     # Process batches
     successful_batches = 0
 
+    if args.pool:
+        open_cli_pool(args.model, args.pool)
+    if args.cache:
+        open_response_cache(args.cache, args.cache_ttl_hours, namespace="analyze-batch")
+
     print(f"\nProcessing {len(batches)} batches with model {args.model} via claude CLI...")
     print()
 
@@ -409,7 +324,12 @@ def main():
     print(f"{'='*60}")
     print(f"Batches: {successful_batches}/{len(batches)} successful")
     print(f"Output directory:    {args.output_dir}")
+    if claude_cli.CLI_POOL is not None:
+        print(f"CLI pool:            {dict(claude_cli.CLI_POOL.stats)}")
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        claude_cli.close()
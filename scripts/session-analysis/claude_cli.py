@@ -0,0 +1,212 @@
+"""
+Claude CLI calls shared by analyze-batch.py and report.py.
+
+Runs a prompt through `claude -p` (or a warm worker pool, --pool N) and
+parses the JSON object out of the response. With a response cache
+(--cache PATH) a repeated prompt is answered from disk.
+
+Usage:
+    from claude_cli import call_claude_cli, open_cli_pool, open_response_cache
+    open_cli_pool("sonnet", 4)                                # optional
+    open_response_cache("cache.db", 168, namespace="report")  # optional
+    result = call_claude_cli("sonnet", prompt, timeout=300, max_retries=2)
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def find_claude_cli() -> str:
+    """Find claude CLI binary, resolving full path to avoid PATH issues in subprocess."""
+    import shutil
+    path = shutil.which("claude")
+    if path:
+        return path
+    # Common locations
+    for candidate in [
+        os.path.expanduser("~/.nvm/versions/node/v23.11.0/bin/claude"),
+        "/usr/local/bin/claude",
+        "/usr/bin/claude",
+    ]:
+        if os.path.isfile(candidate):
+            return candidate
+    return "claude"  # fallback, hope PATH works
+
+
+CLAUDE_BIN = find_claude_cli()
+
+
+# Optional warm worker pool (--pool N), see orchestrator/cli_pool.py
+CLI_POOL = None
+# Optional response cache (--cache PATH), see orchestrator/response_cache.py
+RESPONSE_CACHE = None
+CACHE_NAMESPACE = ""   # the calling script: keeps its cache keys apart from the other's
+
+
+def use_orchestrator_modules():
+    """Make orchestrator/ importable (cli_pool, response_cache)."""
+    orchestrator_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "orchestrator")
+    if os.path.normpath(orchestrator_dir) not in sys.path:
+        sys.path.insert(0, os.path.normpath(orchestrator_dir))
+
+
+def open_cli_pool(model: str, size: int):
+    """Start `size` warm CLI workers; run_claude_cli uses them from then on."""
+    global CLI_POOL
+    use_orchestrator_modules()
+    from cli_pool import SyncCliPool
+    CLI_POOL = SyncCliPool(model=model, size=size, claude_bin=CLAUDE_BIN)
+    return CLI_POOL
+
+
+def open_response_cache(path: str, ttl_hours: float, namespace: str):
+    """Answer repeated prompts from an on-disk cache instead of the CLI."""
+    global RESPONSE_CACHE, CACHE_NAMESPACE
+    use_orchestrator_modules()
+    from response_cache import ResponseCache
+    RESPONSE_CACHE = ResponseCache(path, ttl=ttl_hours * 3600)
+    CACHE_NAMESPACE = namespace
+    return RESPONSE_CACHE
+
+
+def close():
+    """Stop the worker pool and close the response cache, if opened."""
+    global CLI_POOL, RESPONSE_CACHE
+    if CLI_POOL is not None:
+        CLI_POOL.close()
+        CLI_POOL = None
+    if RESPONSE_CACHE is not None:
+        print(f"Response cache: {RESPONSE_CACHE.stats()}")
+        RESPONSE_CACHE.close()
+        RESPONSE_CACHE = None
+
+
+def call_claude_cli(model: str, prompt: str, timeout: int = 120, max_retries: int = 3) -> dict | None:
+    """Call claude -p CLI. Returns parsed JSON dict or None on failure."""
+    if RESPONSE_CACHE is None:
+        return run_claude_cli(model, prompt, timeout, max_retries)
+
+    from response_cache import cache_key, estimate_tokens
+    key = cache_key(CACHE_NAMESPACE, model, "", prompt)
+    cached = RESPONSE_CACHE.get(key)
+    if cached is not None:
+        print(f"    Cache hit (~{estimate_tokens(prompt + cached):,} tokens saved)")
+        return json.loads(cached)
+
+    result = run_claude_cli(model, prompt, timeout, max_retries)
+    if result is not None:
+        text = json.dumps(result, ensure_ascii=False)
+        RESPONSE_CACHE.put(key, text, estimate_tokens(prompt + text))
+    return result
+
+
+def call_claude_pool(prompt: str, timeout: int, max_retries: int) -> dict | None:
+    """run_claude_cli on a warm worker from CLI_POOL."""
+    from cli_pool import CliPoolError
+    from cli_runner import CliTimeout
+
+    for attempt in range(max_retries):
+        try:
+            text = CLI_POOL.call(prompt, timeout).strip()
+        except (CliTimeout, CliPoolError) as e:
+            print(f"    {e} (attempt {attempt + 1}/{max_retries})", file=sys.stderr)
+            if attempt < max_retries - 1:
+                time.sleep(2 ** attempt)
+                continue
+            return None
+
+        if not text:
+            print(f"    Empty response from CLI", file=sys.stderr)
+            return None
+        return parse_json_response(text)
+
+    return None
+
+
+def run_claude_cli(model: str, prompt: str, timeout: int = 120, max_retries: int = 3) -> dict | None:
+    """Run the prompt through CLI_POOL or a fresh `claude -p`, without caching."""
+    if CLI_POOL is not None:
+        return call_claude_pool(prompt, timeout, max_retries)
+
+    # Write prompt to temp file to avoid shell escaping issues
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False, encoding="utf-8") as f:
+        f.write(prompt)
+        prompt_file = f.name
+
+    try:
+        for attempt in range(max_retries):
+            # Build env without CLAUDECODE to allow nested invocation
+            env = {k: v for k, v in os.environ.items() if k != "CLAUDECODE"}
+
+            cmd = [
+                CLAUDE_BIN, "-p",
+                "--model", model,
+                "--output-format", "text",
+                "--no-session-persistence",
+            ]
+
+            try:
+                result = subprocess.run(
+                    cmd,
+                    stdin=open(prompt_file, "r", encoding="utf-8"),
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout,
+                    env=env,
+                )
+            except subprocess.TimeoutExpired:
+                print(f"    Timeout after {timeout}s (attempt {attempt + 1}/{max_retries})")
+                if attempt < max_retries - 1:
+                    time.sleep(2 ** attempt)
+                    continue
+                return None
+
+            # claude -p writes response to stderr (not stdout)
+            text = result.stderr.strip() or result.stdout.strip()
+
+            if result.returncode != 0 and not text:
+                print(f"    CLI error (exit {result.returncode}): {result.stderr[:200]}", file=sys.stderr)
+                if attempt < max_retries - 1:
+                    time.sleep(2 ** attempt)
+                    continue
+                return None
+
+            if not text:
+                print(f"    Empty response from CLI", file=sys.stderr)
+                return None
+
+            return parse_json_response(text)
+
+        return None
+    finally:
+        os.unlink(prompt_file)
+
+
+def parse_json_response(text: str) -> dict | None:
+    """Parse the JSON object out of a CLI response (fenced or bare)."""
+    json_text = text
+    if "```json" in json_text:
+        json_text = json_text.split("```json")[1].split("```")[0]
+    elif "```" in json_text:
+        parts = json_text.split("```")
+        if len(parts) >= 3:
+            json_text = parts[1]
+
+    try:
+        return json.loads(json_text.strip())
+    except json.JSONDecodeError:
+        # Try to find JSON object in the text
+        start = text.find("{")
+        end = text.rfind("}") + 1
+        if start >= 0 and end > start:
+            try:
+                return json.loads(text[start:end])
+            except json.JSONDecodeError:
+                pass
+        print(f"    Failed to parse JSON from response ({len(text)} chars)", file=sys.stderr)
+        print(f"    First 200 chars: {text[:200]}", file=sys.stderr)
+        return None
@@ -10,110 +10,18 @@ Usage:
 import argparse
 import json
 import os
-import subprocess
 import sys
-import tempfile
 import time
 from collections import Counter, defaultdict
 from datetime import datetime
 
+import claude_cli
+from claude_cli import call_claude_cli, open_cli_pool, open_response_cache
+
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
 
 
-def find_claude_cli() -> str:
-    """Find claude CLI binary, resolving full path to avoid PATH issues in subprocess."""
-    import shutil
-    path = shutil.which("claude")
-    if path:
-        return path
-    for candidate in [
-        os.path.expanduser("~/.nvm/versions/node/v23.11.0/bin/claude"),
-        "/usr/local/bin/claude",
-        "/usr/bin/claude",
-    ]:
-        if os.path.isfile(candidate):
-            return candidate
-    return "claude"
-
-
-CLAUDE_BIN = find_claude_cli()
-
-
-def call_claude_cli(model: str, prompt: str, timeout: int = 300, max_retries: int = 2) -> dict | None:
-    """Call claude -p CLI. Returns parsed JSON dict or None on failure."""
-    with tempfile.NamedTemporaryFile(mode="w", suffix=".txt", delete=False, encoding="utf-8") as f:
-        f.write(prompt)
-        prompt_file = f.name
-
-    try:
-        for attempt in range(max_retries):
-            env = {k: v for k, v in os.environ.items() if k != "CLAUDECODE"}
-
-            cmd = [
-                CLAUDE_BIN, "-p",
-                "--model", model,
-                "--output-format", "text",
-                "--no-session-persistence",
-            ]
-
-            try:
-                result = subprocess.run(
-                    cmd,
-                    stdin=open(prompt_file, "r", encoding="utf-8"),
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout,
-                    env=env,
-                )
-            except subprocess.TimeoutExpired:
-                print(f"    Timeout after {timeout}s (attempt {attempt + 1}/{max_retries})")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-                return None
-
-            text = result.stderr.strip() or result.stdout.strip()
-
-            if result.returncode != 0 and not text:
-                print(f"    CLI error (exit {result.returncode}): {result.stderr[:200]}", file=sys.stderr)
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    continue
-                return None
-
-            if not text:
-                print(f"    Empty response from CLI", file=sys.stderr)
-                return None
-
-            # Extract JSON from response
-            json_text = text
-            if "```json" in json_text:
-                json_text = json_text.split("```json")[1].split("```")[0]
-            elif "```" in json_text:
-                parts = json_text.split("```")
-                if len(parts) >= 3:
-                    json_text = parts[1]
-
-            try:
-                return json.loads(json_text.strip())
-            except json.JSONDecodeError:
-                start = text.find("{")
-                end = text.rfind("}") + 1
-                if start >= 0 and end > start:
-                    try:
-                        return json.loads(text[start:end])
-                    except json.JSONDecodeError:
-                        pass
-                print(f"    Failed to parse JSON from response ({len(text)} chars)", file=sys.stderr)
-                print(f"    First 200 chars: {text[:200]}", file=sys.stderr)
-                return None
-
-        return None
-    finally:
-        os.unlink(prompt_file)
-
-
 def safe_int(val, default=0) -> int:
     """Convert to int, returning default for non-numeric values."""
     try:
@@ -558,7 +466,7 @@ Sort each list by total_count descending. Merge aggressively — prefer fewer gr
 
     print(f"  Section 6: calling LLM for semantic pattern grouping ({len(frequent)} patterns)...")
     t0 = time.time()
-    result = call_claude_cli(model, prompt)
+    result = call_claude_cli(model, prompt, timeout=300, max_retries=2)
     elapsed = time.time() - t0
 
     if result is None:
@@ -797,7 +705,7 @@ Return JSON with this exact structure:
 
     print("  Section 9: calling LLM for recommendation synthesis...")
     t0 = time.time()
-    result = call_claude_cli(model, prompt)
+    result = call_claude_cli(model, prompt, timeout=300, max_retries=2)
     elapsed = time.time() - t0
 
     if result is None:
@@ -872,9 +780,19 @@ def main():
                         help="Skip LLM calls, use pure heuristics (for offline/fast runs)")
     parser.add_argument("--model", default="sonnet",
                         help="Model for LLM sections (default: sonnet)")
+    parser.add_argument("--pool", type=int, default=0,
+                        help="Keep N warm CLI workers for the LLM sections")
+    parser.add_argument("--cache", default="",
+                        help="SQLite file caching CLI responses by prompt")
+    parser.add_argument("--cache-ttl-hours", type=float, default=24 * 7,
+                        help="Cached response lifetime (default: 168)")
     args = parser.parse_args()
 
     use_llm = not args.no_llm
+    if use_llm and args.pool:
+        open_cli_pool(args.model, args.pool)
+    if use_llm and args.cache:
+        open_response_cache(args.cache, args.cache_ttl_hours, namespace="report")
 
     batches = load_batch_files(args.analysis_dir)
     if not batches:
@@ -900,4 +818,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        claude_cli.close()